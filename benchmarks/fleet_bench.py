@@ -0,0 +1,236 @@
+"""Нагрузочный прогон флота VolumePumpBot против локальной заглушки биржи.
+
+    python -m benchmarks.fleet_bench --fleets 1 10 100 1000 --duration 30
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from collections import defaultdict
+from loguru import logger
+from src.AsyncArkhamAPI import AsyncArkhamAPI
+from src.MarketDataCache import MarketDataCache
+from src.OrderEngine import OrderEngine
+from src.OrderStore import OrderStore
+from src.RateLimiter import RateLimiter
+from src.SymbolSelector import SymbolSelector
+from src.InstrumentCache import InstrumentCache
+from src.Metrics import ID_SEGMENT_RE
+from src.VolumePumpBot import VolumePumpBot
+from benchmarks.mock_exchange import MockExchange
+
+SYMBOLS = {"ETH_USDT_PERP": {"rounding_step": 0.001}}
+PRICES = {"ETH_USDT_PERP": 2500.0, "BTC_USDT_PERP": 60000.0, "SOL_USDT_PERP": 150.0}
+# --mixed-liquidity: торгуем всеми символами, стаканы сильно различаются по глубине
+MIXED_SYMBOLS = {"ETH_USDT_PERP": {"rounding_step": 0.001}, "BTC_USDT_PERP": {"rounding_step": 0.00001}, "SOL_USDT_PERP": {"rounding_step": 0.001}}
+LIQUIDITY = {"ETH_USDT_PERP": 1.0, "BTC_USDT_PERP": 0.4, "SOL_USDT_PERP": 0.1}
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, name, seconds):
+        self.samples[name].append(seconds)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class BenchArkhamAPI(AsyncArkhamAPI):
+    recorder = None
+
+    async def _request(self, method, path, body=None, params=None, timeout=None):
+        name = ID_SEGMENT_RE.sub("/{id}", path.split("?")[0])
+        started = time.perf_counter()
+        try:
+            status, data = await super()._request(method, path, body, params, timeout)
+        except Exception:
+            self.recorder.errors[name] += 1
+            raise
+        self.recorder.record(name, time.perf_counter() - started)
+        if status != 200:
+            self.recorder.errors[name] += 1
+        return status, data
+
+
+class BenchOrderStore(OrderStore):
+    recorder = None
+
+    async def _write(self, sql, params):
+        started = time.perf_counter()
+        await super()._write(sql, params)
+        self.recorder.record("db_write", time.perf_counter() - started)
+
+
+async def monitor_loop_lag(recorder, interval=0.1):
+    """Насколько позже запланированного просыпается event loop."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        recorder.record("loop_lag", loop.time() - started - interval)
+
+
+async def run_fleet(size, args, workdir):
+    recorder = Recorder()
+    BenchArkhamAPI.recorder = recorder
+    BenchOrderStore.recorder = recorder
+
+    symbols = MIXED_SYMBOLS if args.mixed_liquidity else SYMBOLS
+    exchange = MockExchange(
+        PRICES, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, fill_rate=args.fill_rate,
+        rate_limit=args.exchange_rate_limit, seed=size, liquidity=LIQUIDITY if args.mixed_liquidity else None
+    )
+    base_url = await exchange.start()
+
+    limiter = RateLimiter() if args.limiter else None
+    store = BenchOrderStore(os.path.join(workdir, f"orders_{size}.db"))
+    engine = OrderEngine(limit_hold_time=args.limit_hold_time, poll_interval=1)
+    apis = []
+    bots = []
+    market_data = None
+    selector = None
+    for i in range(size):
+        api = BenchArkhamAPI(f"bench-key-{i}", "c2VjcmV0", pool_limit=2, timeout=10, limiter=limiter)
+        api.base_url = base_url
+        apis.append(api)
+        if market_data is None:
+            market_data = MarketDataCache(api, ttl=3)
+            if args.selector == "liquidity":
+                selector = SymbolSelector(market_data, symbols, limit_hold_time=args.limit_hold_time)
+        bots.append(VolumePumpBot(
+            api=api,
+            symbols=symbols,
+            spot_target_volume=1e12,
+            perp_target_volume=1e12,
+            max_check_price=3,
+            slippage=0.001,
+            is_perpetual=1,
+            leverage=1,
+            hold_time=args.hold_time,
+            limit_order_diff=0.0001,
+            limit_hold_time=args.limit_hold_time,
+            store=store,
+            market_data=market_data,
+            engine=engine,
+            selector=selector,
+            cycle_delay=(1, 2)
+        ))
+
+    instruments = await InstrumentCache(apis[0], path=os.path.join(workdir, f"instruments_{size}.json"), fallback=symbols).load()
+    for api in apis:
+        api.instruments = instruments
+
+    lag_task = asyncio.ensure_future(monitor_loop_lag(recorder))
+    tasks = [asyncio.ensure_future(bot.run()) for bot in bots]
+    started = time.perf_counter()
+    await asyncio.wait(tasks, timeout=args.duration)
+    elapsed = time.perf_counter() - started
+
+    for task in tasks + [lag_task]:
+        task.cancel()
+    await asyncio.gather(*tasks, lag_task, return_exceptions=True)
+    await engine.close()
+    await asyncio.gather(*(api.close() for api in apis))
+    await store.close()
+    await exchange.stop()
+
+    endpoints = {
+        name: {
+            "count": len(values),
+            "errors": recorder.errors[name],
+            "p50_ms": percentile(values, 0.5) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000
+        }
+        for name, values in sorted(recorder.samples.items())
+        if name not in ("loop_lag", "db_write")
+    }
+    total_requests = sum(item["count"] for item in endpoints.values())
+    volume = sum(exchange.volume.values())
+    return {
+        "bots": size,
+        "seconds": elapsed,
+        "requests": total_requests,
+        "requests_per_sec": total_requests / elapsed,
+        "volume": volume,
+        # бот отменяет отдельные ордера только при перевыставлении
+        "requotes": endpoints.get("/orders/cancel", {}).get("count", 0),
+        "bot_seconds_per_1k_volume": size * elapsed / volume * 1000 if volume else None,
+        "requotes_per_1k_volume": endpoints.get("/orders/cancel", {}).get("count", 0) / volume * 1000 if volume else None,
+        "volume_by_symbol": dict(exchange.volume_by_symbol),
+        "loop_lag_p50_ms": percentile(recorder.samples["loop_lag"], 0.5) * 1000,
+        "loop_lag_p99_ms": percentile(recorder.samples["loop_lag"], 0.99) * 1000,
+        "db_write_p50_ms": percentile(recorder.samples["db_write"], 0.5) * 1000,
+        "db_write_p99_ms": percentile(recorder.samples["db_write"], 0.99) * 1000,
+        "limiter": limiter.snapshot() if limiter else None,
+        "endpoints": endpoints
+    }
+
+
+def print_report(result):
+    print(
+        f"\n== {result['bots']} bots, {result['seconds']:.1f}s: "
+        f"{result['requests']} requests ({result['requests_per_sec']:.1f}/s), volume {result['volume']:.0f}"
+    )
+    per_1k = result["bot_seconds_per_1k_volume"]
+    if per_1k:
+        print(f"   requotes: {result['requotes']} ({result['requotes_per_1k_volume']:.2f} per 1k volume), bot-seconds per 1k volume: {per_1k:.2f}")
+    else:
+        print(f"   requotes: {result['requotes']}")
+    if len(result["volume_by_symbol"]) > 1:
+        print("   volume by symbol: " + ", ".join(f"{symbol} {volume:.0f}" for symbol, volume in sorted(result["volume_by_symbol"].items())))
+    print(f"   loop lag p50/p99: {result['loop_lag_p50_ms']:.1f}/{result['loop_lag_p99_ms']:.1f} ms")
+    print(f"   db write p50/p99: {result['db_write_p50_ms']:.1f}/{result['db_write_p99_ms']:.1f} ms")
+    if result["limiter"]:
+        print(f"   limiter: {result['limiter']}")
+    print(f"   {'endpoint':<45}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, item in result["endpoints"].items():
+        print(f"   {name:<45}{item['count']:>8}{item['errors']:>8}{item['p50_ms']:>10.1f}{item['p99_ms']:>10.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Fleet load test against a local mock Arkham exchange")
+    parser.add_argument("--fleets", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--duration", type=float, default=30, help="seconds per fleet size")
+    parser.add_argument("--latency", type=float, default=0.02, help="mock response latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--exchange-rate-limit", type=float, help="mock 429s above this many requests/sec per key")
+    parser.add_argument("--no-limiter", dest="limiter", action="store_false", help="disable the client-side rate limiter")
+    parser.add_argument("--fill-rate", type=float, default=0.2, help="limit order fill probability per second")
+    parser.add_argument("--hold-time", type=float, default=0.1, help="position hold time, minutes")
+    parser.add_argument("--limit-hold-time", type=float, default=3)
+    parser.add_argument("--mixed-liquidity", action="store_true", help="trade three symbols with deep, medium and thin mock books")
+    parser.add_argument("--selector", choices=["random", "liquidity"], default="random", help="how bots pick the next symbol")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    # логи и orders.db ботов пишутся во временный каталог, а не в рабочий
+    workdir = tempfile.mkdtemp(prefix="arkham_bench_")
+    os.chdir(workdir)
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    results = []
+    for size in args.fleets:
+        result = await run_fleet(size, args, workdir)
+        print_report(result)
+        results.append(result)
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+"""Память и таймеры флота в простое: корутина на бота против планировщика циклов.
+
+    python -m benchmarks.memory_bench --accounts 1000 10000 50000
+
+Каждый замер идет в отдельном процессе, чтобы RSS не накапливался между прогонами.
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+from loguru import logger
+from src.Fleet import Fleet
+
+SYMBOLS = {"ETH_USDT_PERP": {"rounding_step": 0.001}}
+CONFIG = {
+    "hold_time": 5,
+    "spot_target_volume": 240000,
+    "max_check_price": 3,
+    "slippage": 0.003,
+    "is_perpetual": 1,
+    "leverage": 8,
+    "perp_target_volume": 1000000,
+    "limit_order_diff": 0.0001,
+    "limit_hold_time": 30,
+    "use_websocket": 0
+}
+
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def measure(accounts, mode, workers):
+    """Собрать флот и поставить всех ботов на паузу между циклами, как в момент простоя."""
+    accounts_list = [{"alias": f"acc{i}", "api_key": f"key{i:08d}", "api_secret": "c2VjcmV0", "proxy": ""} for i in range(accounts)]
+    config = {**CONFIG, "scheduler_workers": workers if mode == "scheduler" else 0}
+    loop = asyncio.get_running_loop()
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    fleet = Fleet(accounts_list, config, SYMBOLS, db_path=os.path.join(tempfile.mkdtemp(), "orders.db")).build()
+    for account in accounts_list:
+        fleet.make_bot(account)
+    built = tracemalloc.get_traced_memory()[0]
+
+    if mode == "scheduler":
+        for bot in fleet.bots:
+            fleet.scheduler.add(bot, delay=3600)
+        tasks = [asyncio.ensure_future(fleet.scheduler.run())]
+    else:
+        tasks = [asyncio.ensure_future(bot._idle(3600)) for bot in fleet.bots]
+    await asyncio.sleep(0.5)
+    idle = tracemalloc.get_traced_memory()[0]
+    timers = len(loop._scheduled)
+    tracemalloc.stop()
+
+    result = {
+        "accounts": accounts,
+        "mode": mode,
+        "objects_mb": (built - base) / 2 ** 20,
+        "waiting_mb": (idle - built) / 2 ** 20,
+        "per_account_kb": (idle - base) / accounts / 1024,
+        "tasks": len(asyncio.all_tasks()) - 1,
+        "timers": timers,
+        "rss_mb": rss_mb()
+    }
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await fleet.store.close()
+    return result
+
+
+def run_case(accounts, mode, workers):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.memory_bench", "--case", str(accounts), mode, "--workers", str(workers)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--workers", type=int, default=100, help="scheduler worker pool size")
+    parser.add_argument("--case", nargs=2, metavar=("ACCOUNTS", "MODE"), help=argparse.SUPPRESS)
+    parser.add_argument("--json", help="save results to this file")
+    args = parser.parse_args()
+
+    logger.remove()
+    if args.case:
+        print(json.dumps(asyncio.run(measure(int(args.case[0]), args.case[1], args.workers))))
+        return
+
+    results = []
+    print(f"{'accounts':>8} {'mode':>10} {'objects MB':>11} {'waiting MB':>11} {'KB/account':>11} {'tasks':>7} {'timers':>7} {'RSS MB':>8}")
+    for accounts in args.accounts:
+        for mode in ("tasks", "scheduler"):
+            result = run_case(accounts, mode, args.workers)
+            results.append(result)
+            print(
+                f"{accounts:>8} {mode:>10} {result['objects_mb']:>11.1f} {result['waiting_mb']:>11.1f} "
+                f"{result['per_account_kb']:>11.2f} {result['tasks']:>7} {result['timers']:>7} {result['rss_mb']:>8.0f}"
+            )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+import json
+import time
+import random
+import asyncio
+import itertools
+from collections import defaultdict
+from aiohttp import web
+from src.RateLimiter import TokenBucket
+
+class MockExchange:
+    """Локальная заглушка эндпоинтов Arkham, которые использует ArkhamAPI.
+
+    latency/jitter - задержка ответа в секундах, error_rate - доля ответов 500,
+    fill_rate - вероятность исполнения лимитного ордера за секунду,
+    rate_limit - запросов в секунду на ключ, сверх лимита ответ 429 с Retry-After,
+    liquidity - множитель ликвидности по символу: масштабирует вероятность исполнения
+    и оборот за 24ч, спред обратно пропорционален ему.
+    slow_order_rate - доля /orders/new, которые принимаются сразу, а отвечают через slow_order_delay
+    (проверка сроков и хеджированных попыток). Повтор clientOrderId отклоняется, как на бирже.
+    /ws - push-фид с каналами ticker и order_statuses; drop_streams() рвет соединения,
+    а ws_enabled = False отказывает в новых (проверка переподключения и опроса вместо стрима).
+    """
+
+    def __init__(
+            self, symbols, latency=0.02, jitter=0.01, error_rate=0.0, fill_rate=0.2, rate_limit=None, balance=1000.0, seed=None, liquidity=None,
+            slow_order_rate=0.0, slow_order_delay=10.0
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_order_rate = slow_order_rate
+        self.slow_order_delay = slow_order_delay
+        self.fill_rate = fill_rate
+        self.rate_limit = rate_limit
+        self._limits = {}
+        self.balance = balance
+        self.random = random.Random(seed)
+        self.prices = {symbol: price for symbol, price in symbols.items()}
+        self.liquidity = {symbol: (liquidity or {}).get(symbol, 1.0) for symbol in symbols}
+        self.orders = defaultdict(dict)
+        self.by_client_id = defaultdict(dict)
+        # все ордера, включая исполненные и отмененные, - для /orders/{id}
+        self.placed = defaultdict(dict)
+        self.volume = defaultdict(float)
+        self.volume_by_symbol = defaultdict(float)
+        self.fills = defaultdict(list)
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self._ids = itertools.count(1)
+        self._runner = None
+        self._ticker = None
+        self.base_url = None
+        self.ws_url = None
+        self.ws_enabled = True
+        self.ws_connections = 0
+        self.ws_subscribes = 0
+        # открытые соединения фида: ws -> (аккаунт, подписки на тикеры, подписка на ордера)
+        self._streams = {}
+        self._pushes = set()
+
+    def _account(self, request):
+        return request.headers.get("Arkham-Api-Key", "")
+
+    async def _rate_limited(self, name, account):
+        """429 до каких-либо изменений состояния, как у настоящей биржи."""
+        if not self.rate_limit:
+            return None
+        bucket = self._limits.get(account)
+        if bucket is None:
+            bucket = self._limits[account] = TokenBucket(self.rate_limit)
+        if bucket.try_take():
+            return None
+        self.requests[name] += 1
+        self.errors[name] += 1
+        await asyncio.sleep(max(0.0, self.random.gauss(self.latency, self.jitter)))
+        return web.Response(status=429, text="rate limited", headers={"Retry-After": "1"})
+
+    async def _respond(self, name, payload):
+        self.requests[name] += 1
+        await asyncio.sleep(max(0.0, self.random.gauss(self.latency, self.jitter)))
+        if self.random.random() < self.error_rate:
+            self.errors[name] += 1
+            return web.Response(status=500, text="mock error")
+        return web.json_response(payload)
+
+    def _ticker_payload(self, symbol):
+        price = self.prices[symbol]
+        liquidity = self.liquidity[symbol]
+        half_spread = 0.0001 / liquidity
+        return {
+            "symbol": symbol,
+            "price": f"{price:.8f}",
+            "bestBidPrice": f"{price * (1 - half_spread):.8f}",
+            "bestAskPrice": f"{price * (1 + half_spread):.8f}",
+            "volume24h": f"{1000000 * liquidity:.2f}",
+            "usdVolume24h": f"{price * 1000000 * liquidity:.2f}"
+        }
+
+    def _instrument_payload(self, symbol):
+        price = self.prices[symbol]
+        return {
+            "symbol": symbol,
+            "minTickPrice": "0.1" if price > 10000 else "0.01",
+            "minLotSize": "0.00001" if price > 10000 else "0.001",
+            "minNotional": "5"
+        }
+
+    def _fill(self, account, order):
+        del self.orders[account][order["orderId"]]
+        price = float(order["price"]) or self.prices.get(order["symbol"], 0)
+        order.update(status="closed", executedSize=order["size"], avgPrice=f"{price:.8f}")
+        self._order_event(account, order)
+        self.volume[account] += float(order["size"]) * price
+        self.volume_by_symbol[order["symbol"]] += float(order["size"]) * price
+        self.fills[account].append({
+            "orderId": order["orderId"],
+            "symbol": order["symbol"],
+            "side": order["side"],
+            "size": order["size"],
+            "price": f"{price:.8f}",
+            "time": int(time.time() * 1000000)
+        })
+
+    def expire(self, account, order_id, executed="0"):
+        """Биржа сама снимает ордер (истек, отклонен), исполнив из него executed."""
+        order = self.orders[account].pop(order_id)
+        order.update(status="cancelled", executedSize=executed)
+        self._order_event(account, order)
+
+    async def _send(self, ws, channel, data):
+        try:
+            await ws.send_str(json.dumps({"channel": channel, "type": "update", "data": data}))
+        except (ConnectionError, RuntimeError):
+            # соединение закрывается - клиент переподключится и получит снимок заново
+            pass
+
+    def _push(self, ws, channel, data):
+        task = asyncio.ensure_future(self._send(ws, channel, data))
+        self._pushes.add(task)
+        task.add_done_callback(self._pushes.discard)
+
+    def _order_event(self, account, order):
+        for ws, (stream_account, _, orders) in list(self._streams.items()):
+            if orders and stream_account == account:
+                self._push(ws, "order_statuses", dict(order))
+
+    async def _tick(self):
+        """Случайное блуждание цен и вероятностное исполнение лимитных ордеров."""
+        while True:
+            await asyncio.sleep(0.1)
+            for symbol in self.prices:
+                self.prices[symbol] *= 1 + self.random.gauss(0, 0.0005)
+            for ws, (_, symbols, _) in list(self._streams.items()):
+                for symbol in symbols:
+                    self._push(ws, "ticker", self._ticker_payload(symbol))
+            for account, orders in self.orders.items():
+                for order in list(orders.values()):
+                    if self.random.random() < self.fill_rate * self.liquidity.get(order["symbol"], 1.0) * 0.1:
+                        self._fill(account, order)
+
+    async def ticker(self, request):
+        symbol = request.query.get("symbol")
+        if symbol not in self.prices:
+            return web.Response(status=404, text="unknown symbol")
+        return await self._respond("/public/ticker", self._ticker_payload(symbol))
+
+    async def tickers(self, request):
+        return await self._respond("/public/tickers", [self._ticker_payload(symbol) for symbol in self.prices])
+
+    async def pairs(self, request):
+        return await self._respond("/public/pairs", [self._instrument_payload(symbol) for symbol in self.prices if not symbol.endswith("_PERP")])
+
+    async def contracts(self, request):
+        return await self._respond("/public/contracts", [self._instrument_payload(symbol) for symbol in self.prices if symbol.endswith("_PERP")])
+
+    async def open_orders(self, request):
+        account = self._account(request)
+        return await self._rate_limited("/orders", account) or await self._respond("/orders", list(self.orders[account].values()))
+
+    async def trades_history(self, request):
+        account = self._account(request)
+        limit = int(request.query.get("limit", 100))
+        return await self._rate_limited("/trades/history", account) or await self._respond("/trades/history", self.fills[account][::-1][:limit])
+
+    async def new_order(self, request):
+        body = json.loads(await request.text())
+        account = self._account(request)
+        limited = await self._rate_limited("/orders/new", account)
+        if limited:
+            return limited
+        client_order_id = body.get("clientOrderId")
+        if client_order_id and client_order_id in self.by_client_id[account]:
+            self.requests["/orders/new"] += 1
+            self.errors["/orders/new"] += 1
+            return web.Response(status=400, text="duplicate clientOrderId")
+        order = {
+            "orderId": next(self._ids),
+            "clientOrderId": body.get("clientOrderId"),
+            "symbol": body["symbol"],
+            "side": body["side"],
+            "size": body["size"],
+            "price": body["price"],
+            "type": body["type"],
+            "executedSize": "0",
+            "status": "booked"
+        }
+        self.orders[account][order["orderId"]] = order
+        self.placed[account][order["orderId"]] = order
+        self._order_event(account, order)
+        if client_order_id:
+            self.by_client_id[account][client_order_id] = order
+        if body["type"] == "market":
+            self._fill(account, order)
+        if self.random.random() < self.slow_order_rate:
+            await asyncio.sleep(self.slow_order_delay)
+        return await self._respond("/orders/new", {"orderId": order["orderId"], "clientOrderId": order["clientOrderId"]})
+
+    async def cancel_order(self, request):
+        body = json.loads(await request.text())
+        account = self._account(request)
+        limited = await self._rate_limited("/orders/cancel", account)
+        if limited:
+            return limited
+        order = self.orders[account].pop(body.get("orderId"), None)
+        if order is not None:
+            order["status"] = "cancelled"
+            self._order_event(account, order)
+        return await self._respond("/orders/cancel", {})
+
+    async def order_by_client_id(self, request):
+        account = self._account(request)
+        limited = await self._rate_limited("/orders/by-client-order-id", account)
+        if limited:
+            return limited
+        order = self.by_client_id[account].get(request.query.get("clientOrderId"))
+        if order is None:
+            self.requests["/orders/by-client-order-id"] += 1
+            return web.Response(status=404, text="order not found")
+        return await self._respond("/orders/by-client-order-id", order)
+
+    async def order_by_id(self, request):
+        account = self._account(request)
+        limited = await self._rate_limited("/orders/{id}", account)
+        if limited:
+            return limited
+        order = self.placed[account].get(int(request.match_info["order_id"]))
+        if order is None:
+            self.requests["/orders/{id}"] += 1
+            return web.Response(status=404, text="order not found")
+        return await self._respond("/orders/{id}", order)
+
+    async def cancel_all(self, request):
+        account = self._account(request)
+        limited = await self._rate_limited("/orders/cancel/all", account)
+        if limited:
+            return limited
+        for order in self.orders[account].values():
+            order["status"] = "cancelled"
+            self._order_event(account, order)
+        self.orders[account].clear()
+        return await self._respond("/orders/cancel/all", {})
+
+    async def balances(self, request):
+        return await self._rate_limited("/account/balances", self._account(request)) or await self._respond("/account/balances", [
+            {"symbol": "USDT", "balance": f"{self.balance:.2f}", "free": f"{self.balance:.2f}"}
+        ])
+
+    async def volume_stats(self, request):
+        account = self._account(request)
+        limited = await self._rate_limited("/affiliate-dashboard/trading-volume-stats", account)
+        if limited:
+            return limited
+        volume = self.volume[account]
+        return await self._respond("/affiliate-dashboard/trading-volume-stats", {
+            "spotMakerVolume": f"{volume:.2f}",
+            "perpMakerVolume": f"{volume:.2f}",
+            "spotMakerFees": "0",
+            "perpMakerFees": "0"
+        })
+
+    async def stream(self, request):
+        """Push-фид: subscribe на ticker (params.symbol) и order_statuses, со снимком при подписке."""
+        if not self.ws_enabled:
+            return web.Response(status=503, text="stream unavailable")
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        account = self._account(request)
+        symbols = set()
+        self._streams[ws] = (account, symbols, False)
+        self.ws_connections += 1
+        try:
+            async for msg in ws:
+                if msg.type != web.WSMsgType.TEXT:
+                    continue
+                message = json.loads(msg.data)
+                if message.get("method") != "subscribe":
+                    continue
+                self.ws_subscribes += 1
+                args = message.get("args", {})
+                channel, params = args.get("channel"), args.get("params", {})
+                if channel == "ticker" and params.get("symbol") in self.prices:
+                    symbols.add(params["symbol"])
+                    await self._send(ws, "ticker", self._ticker_payload(params["symbol"]))
+                elif channel == "order_statuses" and account:
+                    self._streams[ws] = (account, symbols, True)
+                    if params.get("snapshot"):
+                        await self._send(ws, "order_statuses", list(self.orders[account].values()))
+        finally:
+            self._streams.pop(ws, None)
+        return ws
+
+    async def drop_streams(self):
+        """Разорвать все соединения фида, как при рестарте биржи."""
+        for ws in list(self._streams):
+            await ws.close(code=1012)
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application()
+        app.router.add_get("/api/public/ticker", self.ticker)
+        app.router.add_get("/api/public/tickers", self.tickers)
+        app.router.add_get("/api/public/pairs", self.pairs)
+        app.router.add_get("/api/public/contracts", self.contracts)
+        app.router.add_get("/api/orders", self.open_orders)
+        app.router.add_post("/api/orders/new", self.new_order)
+        app.router.add_get("/api/orders/by-client-order-id", self.order_by_client_id)
+        app.router.add_get(r"/api/orders/{order_id:\d+}", self.order_by_id)
+        app.router.add_post("/api/orders/cancel", self.cancel_order)
+        app.router.add_post("/api/orders/cancel/all", self.cancel_all)
+        app.router.add_get("/api/account/balances", self.balances)
+        app.router.add_get("/api/trades/history", self.trades_history)
+        app.router.add_get("/api/affiliate-dashboard/trading-volume-stats", self.volume_stats)
+        app.router.add_get("/ws", self.stream)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}/api"
+        self.ws_url = f"ws://{host}:{port}/ws"
+        self._ticker = asyncio.ensure_future(self._tick())
+        return self.base_url
+
+    async def stop(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+        await self.drop_streams()
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,491 @@
+"""Офлайн-прогон стратегии VolumePumpBot на записанных ценах с виртуальными часами.
+
+    python -m benchmarks.replay --ticks ticks --symbol ETH_USDT_PERP
+    python -m benchmarks.replay --synthetic-hours 48 --seed 7
+    python -m benchmarks.replay --synthetic-hours 24 --symbol ETH_USDT_PERP BTC_USDT_PERP SOL_USDT_PERP --max-positions 3
+
+Решения принимает настоящий код VolumePumpBot, OrderEngine и AccountState. Биржа заменена
+симуляцией: лимитки исполняются, когда записанный ask/bid доходит до их цены, с комиссиями
+maker/taker. asyncio.sleep, time.monotonic и datetime.now бота идут по виртуальному времени,
+поэтому сутки торговли прогоняются за секунды, а результат при том же --seed повторяется.
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import itertools
+import selectors
+from datetime import datetime
+from contextlib import contextmanager
+from collections import defaultdict
+import numpy as np
+from loguru import logger
+import src.VolumePumpBot as bot_module
+from src.VolumePumpBot import VolumePumpBot
+from src.ArkhamAPI import ORDER_NOT_FOUND
+from src.OrderEngine import OrderEngine
+from src.OrderStore import SIZE_EPSILON
+from src.AccountState import AccountState
+from src.InstrumentCache import Instrument
+from src.TickRecorder import list_days, load_day
+
+
+class PriceSeries:
+    """Цены одного символа: время в секундах, цена, bid, ask. Пропуски bid/ask заполняются ценой."""
+
+    def __init__(self, ts, price, bid=None, ask=None):
+        self.ts = np.asarray(ts, dtype=float)
+        self.price = np.asarray(price, dtype=float)
+        self.bid = self.price if bid is None else np.where(np.isnan(bid), self.price, bid)
+        self.ask = self.price if ask is None else np.where(np.isnan(ask), self.price, ask)
+
+    @classmethod
+    def from_recordings(cls, path, symbol, days=None):
+        """Склеить дни TickRecorder по одному символу."""
+        parts = []
+        for day in days or list_days(path):
+            data = load_day(path, day)
+            if symbol not in data["symbols"]:
+                continue
+            mask = data["symbol"] == data["symbols"].index(symbol)
+            parts.append((data["ts"][mask] / 1e6, data["price"][mask], data["bid"][mask], data["ask"][mask]))
+        if not parts:
+            raise ValueError(f"Нет записанных тиков {symbol} в {path}")
+        return cls(*(np.concatenate(column) for column in zip(*parts)))
+
+    @classmethod
+    def synthetic(cls, hours, price=2500.0, volatility=0.0002, spread=0.0001, step=1.0, seed=None, start=1760745600.0):
+        """Геометрическое случайное блуждание с шагом step секунд, volatility - за секунду."""
+        rng = np.random.default_rng(seed)
+        count = int(hours * 3600 / step)
+        prices = price * np.exp(np.cumsum(rng.normal(0.0, volatility * np.sqrt(step), count)))
+        half_spread = prices * spread / 2
+        return cls(start + np.arange(count) * step, prices, prices - half_spread, prices + half_spread)
+
+    @property
+    def start(self):
+        return float(self.ts[0])
+
+    @property
+    def end(self):
+        return float(self.ts[-1])
+
+    def index(self, now):
+        return max(0, int(np.searchsorted(self.ts, now, "right")) - 1)
+
+    def span(self, since, now):
+        """Срез тиков в полуинтервале (since, now]."""
+        return int(np.searchsorted(self.ts, since, "right")), int(np.searchsorted(self.ts, now, "right"))
+
+
+class VirtualClock:
+    __slots__ = ("now",)
+
+    def __init__(self, start):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """Вместо ожидания переводит часы к ближайшему таймеру: ввода-вывода в прогоне нет."""
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        if timeout is None:
+            raise RuntimeError("Прогон завис: нет ни готовых задач, ни таймеров")
+        if timeout > 0:
+            self.clock.now += timeout
+        return super().select(0)
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock):
+        self.clock = clock
+        super().__init__(_VirtualSelector(clock))
+        # часы - unix-время, шаг float у таких чисел ~2e-7: с точностью по умолчанию (1e-9)
+        # таймер, назначенный ровно на "сейчас", никогда не считался бы наступившим
+        self._clock_resolution = 1e-6
+
+    def time(self):
+        return self.clock.now
+
+
+@contextmanager
+def virtual_time(clock):
+    """time.monotonic/time.time и datetime.now бота на время прогона показывают виртуальные часы."""
+    class VirtualDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls.fromtimestamp(clock.now, tz)
+
+    saved = time.monotonic, time.time, bot_module.datetime
+    time.monotonic = time.time = clock.time
+    bot_module.datetime = VirtualDatetime
+    try:
+        yield
+    finally:
+        time.monotonic, time.time, bot_module.datetime = saved
+
+
+class SimStore:
+    """Позиции в памяти с интерфейсом OrderStore: без потока SQLite прогон остается детерминированным."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.rows = {}
+        self.fills = {}
+        self.pending = {}
+
+    async def save_order(self, order_id, account_id, symbol, side, size, open_price):
+        created_at = datetime.fromtimestamp(self.clock.now).isoformat(" ")
+        self.rows[order_id] = [order_id, account_id, symbol, side, size, open_price, "open", created_at, None, 0]
+
+    async def update_order(self, order_id, status, closed_at=None):
+        row = self.rows.get(order_id)
+        if row is not None:
+            row[6], row[8] = status, closed_at.isoformat(" ") if closed_at else None
+
+    async def replace_order(self, old_order_id, new_order_id, open_price):
+        row = self.rows.pop(old_order_id, None)
+        if row is not None:
+            row[0], row[5] = new_order_id, open_price
+            self.rows[new_order_id] = row
+
+    async def reduce_order(self, order_id, size, status, closed_at=None):
+        row = self.rows.get(order_id)
+        if row is not None:
+            if row[4] - size <= SIZE_EPSILON:
+                row[6], row[8] = status, closed_at.isoformat(" ") if closed_at else None
+            row[4] -= size
+
+    async def increment_check_count(self, order_id):
+        row = self.rows.get(order_id)
+        if row is not None:
+            row[9] += 1
+
+    async def get_open_orders(self, account_id):
+        return [tuple(row) for row in self.rows.values() if row[1] == account_id and row[6] == "open"]
+
+    async def save_pending(self, client_order_id, account_id, symbol, side, size, price, position_id=None):
+        self.pending[client_order_id] = (client_order_id, account_id, symbol, side, size, price, position_id)
+
+    async def delete_pending(self, client_order_id):
+        self.pending.pop(client_order_id, None)
+
+    async def open_pending(self, client_order_id, order_id, account_id, symbol, size, open_price):
+        if order_id not in self.rows:
+            await self.save_order(order_id, account_id, symbol, "buy", size, open_price)
+        await self.delete_pending(client_order_id)
+
+    async def get_pending(self, account_id):
+        return [(row[0], *row[2:]) for row in self.pending.values() if row[1] == account_id]
+
+    async def record_fill(self, order_id, account_id, symbol, side, size, price, fee, liquidity, filled_at=None):
+        self.fills.setdefault(order_id, (account_id, symbol, size * price, fee))
+
+    async def get_volume(self, account_id):
+        volume = {False: [0.0, 0.0], True: [0.0, 0.0]}
+        for fill_account, symbol, notional, fee in self.fills.values():
+            if fill_account == account_id:
+                totals = volume[symbol.endswith("_PERP")]
+                totals[0] += notional
+                totals[1] += fee
+        return volume[False][0], volume[True][0], volume[False][1], volume[True][1]
+
+    async def close(self):
+        pass
+
+
+class SimArkhamAPI:
+    """Биржа прогона: те методы AsyncArkhamAPI, которыми пользуются бот, движок ордеров и AccountState.
+
+    Лимитная покупка исполняется по своей цене, как только ask опустился до нее (продажа - bid поднялся),
+    с комиссией maker. Маркет и лимитки, пересекающие спред при выставлении, - по ask/bid с комиссией taker.
+    Спот меняет балансы монет, перп - позицию с реализованным PnL в USDT. Каждый запрос занимает
+    latency виртуальных секунд: с нулевой задержкой опрос и отмена ордера движком всегда совпадали бы в одном такте.
+    """
+
+    def __init__(self, series, clock, balance=1000.0, maker_fee=0.0002, taker_fee=0.0005, latency=0.05, alias="replay"):
+        self.series = series
+        self.clock = clock
+        self.latency = latency
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        self.api_key = alias
+        self.alias = alias
+        self.log = logger.bind(account=alias)
+        self.instruments = None
+        self.balances = defaultdict(float, USDT=balance)
+        self.positions = {}
+        self.orders = {}
+        # все выставленные ордера по clientOrderId, включая исполненные, - для поиска исхода ботом
+        self.by_client_id = {}
+        self.placed = {}
+        self.volume = {"spot": 0.0, "perp": 0.0}
+        self.fees = {"spot": 0.0, "perp": 0.0}
+        self.fills = {"maker": 0, "taker": 0}
+        self._ids = itertools.count(1)
+
+    def _quote(self, symbol):
+        series = self.series[symbol]
+        index = series.index(self.clock.now)
+        return series.price[index], series.bid[index], series.ask[index]
+
+    def _execute(self, symbol, side, size, price, liquidity):
+        notional = size * price
+        fee = notional * (self.maker_fee if liquidity == "maker" else self.taker_fee)
+        kind = "perp" if symbol.endswith("_PERP") else "spot"
+        self.volume[kind] += notional
+        self.fees[kind] += fee
+        self.fills[liquidity] += 1
+        self.balances["USDT"] -= fee
+
+        signed = size if side == "buy" else -size
+        if kind == "spot":
+            self.balances["USDT"] -= signed * price
+            self.balances[symbol.split("_")[0]] += signed
+            return
+
+        position, entry = self.positions.get(symbol, (0.0, 0.0))
+        if position == 0 or (position > 0) == (signed > 0):
+            entry = (entry * abs(position) + price * size) / abs(position + signed)
+        else:
+            closed = min(abs(position), size)
+            self.balances["USDT"] += closed * (price - entry) * (1 if position > 0 else -1)
+            if abs(signed) > abs(position):
+                entry = price
+        position += signed
+        self.positions[symbol] = (position, entry if abs(position) > 1e-12 else 0.0)
+
+    def _match(self):
+        """Исполнить лимитки, до которых дошла цена с прошлой проверки."""
+        now = self.clock.now
+        for order_id, order in list(self.orders.items()):
+            series = self.series[order["symbol"]]
+            low, high = series.span(order["checked_at"], now)
+            order["checked_at"] = now
+            if high <= low:
+                continue
+            if order["side"] == "buy":
+                hit = series.ask[low:high].min() <= order["price"]
+            else:
+                hit = series.bid[low:high].max() >= order["price"]
+            if hit:
+                del self.orders[order_id]
+                self._execute(order["symbol"], order["side"], order["size"], order["price"], "maker")
+                order.update(status="closed", executedSize=order["size"], avgPrice=order["price"])
+
+    async def get_open_orders(self, subaccount_id=0):
+        await asyncio.sleep(self.latency)
+        self._match()
+        return [
+            {"orderId": order_id, "symbol": order["symbol"], "side": order["side"], "size": str(order["size"]),
+             "price": str(order["price"]), "executedSize": "0", "status": "booked"}
+            for order_id, order in self.orders.items()
+        ]
+
+    async def get_balances(self):
+        await asyncio.sleep(self.latency)
+        self._match()
+        return [{"symbol": symbol, "balance": str(value), "free": str(value)} for symbol, value in self.balances.items()]
+
+    async def get_trading_volume(self):
+        await asyncio.sleep(self.latency)
+        self._match()
+        return self.volume["spot"], self.volume["perp"], self.fees["spot"], self.fees["perp"]
+
+    async def get_market_price(self, symbol):
+        await asyncio.sleep(self.latency)
+        return float(self._quote(symbol)[0])
+
+    async def create_order(self, price, size, side, symbol, type, subaccount_id=0, post_only=False, client_order_id=None):
+        await asyncio.sleep(self.latency)
+        self._match()
+        price, size = float(price), float(size)
+        if size <= 0:
+            return None
+        _, bid, ask = self._quote(symbol)
+        touch = ask if side == "buy" else bid
+        if not symbol.endswith("_PERP") and side == "buy" and size * max(price, touch) > self.balances["USDT"]:
+            self.log.error(f"Недостаточно USDT для {side} {size} {symbol}")
+            return None
+
+        order_id = next(self._ids)
+        order = {"orderId": order_id, "symbol": symbol, "side": side, "size": size, "price": price, "type": type, "checked_at": self.clock.now}
+        self.placed[order_id] = order
+        if client_order_id:
+            self.by_client_id[client_order_id] = order
+        if type == "market" or (price >= touch if side == "buy" else price <= touch):
+            self._execute(symbol, side, size, float(touch), "taker")
+            order.update(status="closed", executedSize=size, avgPrice=float(touch))
+        else:
+            self.orders[order_id] = order
+        return {"orderId": order_id, "clientOrderId": client_order_id}
+
+    async def get_order(self, order_id):
+        await asyncio.sleep(self.latency)
+        self._match()
+        order = self.placed.get(order_id)
+        return self._order_payload(order) if order is not None else ORDER_NOT_FOUND
+
+    async def get_order_by_client_id(self, client_order_id):
+        await asyncio.sleep(self.latency)
+        self._match()
+        order = self.by_client_id.get(client_order_id)
+        return self._order_payload(order) if order is not None else ORDER_NOT_FOUND
+
+    @staticmethod
+    def _order_payload(order):
+        return {
+            "orderId": order["orderId"], "symbol": order["symbol"], "side": order["side"], "type": order["type"],
+            "size": str(order["size"]), "price": str(order["price"]), "status": order.get("status", "booked"),
+            "executedSize": str(order.get("executedSize", 0)), "avgPrice": str(order.get("avgPrice", 0))
+        }
+
+    async def cancel_order(self, order_id, subaccount_id=0):
+        await asyncio.sleep(self.latency)
+        self._match()
+        # уже исполненный ордер отменить нельзя - движок решит по следующему опросу
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return None
+        order["status"] = "cancelled"
+        return {}
+
+    async def cancel_orders(self):
+        for order in self.orders.values():
+            order["status"] = "cancelled"
+        self.orders.clear()
+        return {}
+
+
+async def _run(series, clock, config, balance, maker_fee, taker_fee, tick, lot, duration):
+    api = SimArkhamAPI(series, clock, balance=balance, maker_fee=maker_fee, taker_fee=taker_fee)
+    api.instruments = {symbol: Instrument(symbol, tick, lot) for symbol in series}
+    store = SimStore(clock)
+    engine = OrderEngine(limit_hold_time=config["limit_hold_time"])
+    bot = VolumePumpBot(
+        api=api,
+        symbols={symbol: {"rounding_step": lot} for symbol in series},
+        spot_target_volume=config["spot_target_volume"],
+        perp_target_volume=config["perp_target_volume"],
+        max_check_price=config["max_check_price"],
+        slippage=config["slippage"],
+        is_perpetual=config["is_perpetual"],
+        leverage=config["leverage"],
+        hold_time=config["hold_time"],
+        limit_order_diff=config["limit_order_diff"],
+        limit_hold_time=config["limit_hold_time"],
+        store=store,
+        engine=engine,
+        account_state=AccountState(api),
+        fee_rates={"maker": maker_fee, "taker": taker_fee},
+        max_positions=config.get("max_positions", 1),
+        position_allocation=config.get("position_allocation", 0),
+        max_position_notional=config.get("max_position_notional", 0)
+    )
+
+    started = clock.now
+    end = min(item.end for item in series.values())
+    try:
+        await asyncio.wait_for(bot.run(), duration if duration is not None else end - started)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        await engine.close()
+
+    kind = "perp" if config["is_perpetual"] else "spot"
+    volume, fees = api.volume[kind], api.fees[kind]
+    prices = {symbol: float(api._quote(symbol)[0]) for symbol in series}
+    # открытые позиции оцениваем по последней цене
+    equity = api.balances["USDT"] + sum(
+        api.balances[symbol.split("_")[0]] * price for symbol, price in prices.items() if not symbol.endswith("_PERP")
+    ) + sum(size * (prices[symbol] - entry) for symbol, (size, entry) in api.positions.items())
+    return {
+        "symbol": ", ".join(series),
+        "simulated_hours": (clock.now - started) / 3600,
+        "volume": volume,
+        "fees": fees,
+        "fees_per_1m": fees / volume * 1e6 if volume else None,
+        "target_reached": bot.finished,
+        "time_to_target_hours": (clock.now - started) / 3600 if bot.finished else None,
+        "positions": sum(row[3] == "buy" for row in store.rows.values()),
+        "maker_fills": api.fills["maker"],
+        "taker_fills": api.fills["taker"],
+        "pnl": equity - balance,
+    }
+
+
+def replay(series, config, symbol=None, balance=1000.0, maker_fee=0.0002, taker_fee=0.0005, tick="0.01", lot=0.001, seed=0, duration=None):
+    """Прогнать бота по ценам series в виртуальном времени и вернуть итоги.
+
+    series - PriceSeries символа symbol или словарь {символ: PriceSeries} для нескольких позиций (max_positions).
+    """
+    series = series if isinstance(series, dict) else {symbol: series}
+    clock = VirtualClock(max(item.start for item in series.values()))
+    loop = VirtualClockLoop(clock)
+    random.seed(seed)
+    started = time.perf_counter()
+    with virtual_time(clock):
+        try:
+            result = loop.run_until_complete(_run(series, clock, config, balance, maker_fee, taker_fee, tick, lot, duration))
+        finally:
+            loop.close()
+    result["wall_seconds"] = time.perf_counter() - started
+    result["speedup"] = result["simulated_hours"] * 3600 / result["wall_seconds"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--ticks", default="ticks", help="TickRecorder directory")
+    parser.add_argument("--days", nargs="+", help="days to replay (default: all recorded)")
+    parser.add_argument("--symbol", nargs="+", help="default: ETH_USDT_PERP or ETH_USDT depending on is_perpetual")
+    parser.add_argument("--max-positions", type=int, help="override max_positions from config.json")
+    parser.add_argument("--synthetic-hours", type=float, help="replay a random walk instead of recorded ticks")
+    parser.add_argument("--balance", type=float, default=1000.0)
+    parser.add_argument("--maker-fee", type=float, default=0.0002)
+    parser.add_argument("--taker-fee", type=float, default=0.0005)
+    parser.add_argument("--tick", default="0.01", help="price tick of the symbol")
+    parser.add_argument("--lot", type=float, default=0.001, help="lot size of the symbol")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", help="save the result to this file")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    symbols = args.symbol or ["ETH_USDT_PERP" if config["is_perpetual"] else "ETH_USDT"]
+    if args.max_positions:
+        config["max_positions"] = args.max_positions
+    if args.synthetic_hours:
+        # у каждого символа свое блуждание
+        series = {symbol: PriceSeries.synthetic(args.synthetic_hours, seed=args.seed + i) for i, symbol in enumerate(symbols)}
+    else:
+        series = {symbol: PriceSeries.from_recordings(args.ticks, symbol, args.days) for symbol in symbols}
+
+    logger.remove()
+    logger.configure(extra={"account": "-", "symbol": "-"})
+    logger.add(sys.stderr, level=args.log_level, format="{extra[account]} | {message}")
+
+    result = replay(
+        series, config, balance=args.balance, maker_fee=args.maker_fee, taker_fee=args.taker_fee,
+        tick=args.tick, lot=args.lot, seed=args.seed
+    )
+    for key, value in result.items():
+        print(f"{key:>22}: {value:.4f}" if isinstance(value, float) else f"{key:>22}: {value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
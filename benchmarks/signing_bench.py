@@ -0,0 +1,79 @@
+"""Микро-бенчмарк подписи запросов: подписанных запросов в секунду до и после RequestSigner.
+
+    python -m benchmarks.signing_bench --iterations 200000
+"""
+import time
+import hmac
+import uuid
+import json
+import base64
+import hashlib
+import argparse
+from src.RequestSigner import RequestSigner, encode_body
+
+API_KEY = "bench-api-key-0000000000000000"
+API_SECRET = base64.b64encode(b"bench-secret-" * 4).decode()
+
+
+def order_body():
+    return {
+        "clientOrderId": str(uuid.uuid4()),
+        "postOnly": False,
+        "price": f"{2500.5:.8f}",
+        "side": "buy",
+        "size": "0.123",
+        "subaccountId": 0,
+        "symbol": "ETH_USDT_PERP",
+        "type": "limitGtc"
+    }
+
+
+def legacy_sign(body):
+    """Как ArkhamAPI подписывал ордер раньше: декодирование секрета и новый HMAC на каждый вызов."""
+    path = "/orders/new"
+    body_json = json.dumps(body)
+    expires = str(int(time.time() * 1000000) + 300000000)
+    message = f"{API_KEY}{expires}POST{path}{body_json}"
+    secret = base64.b64decode(API_SECRET)
+    signature = base64.b64encode(hmac.new(secret, message.encode(), hashlib.sha256).digest()).decode()
+    return body_json, {
+        "Content-Type": "application/json",
+        "Arkham-Api-Key": API_KEY,
+        "Arkham-Expires": expires,
+        "Arkham-Signature": signature
+    }
+
+
+def make_signer_sign():
+    signer = RequestSigner(API_KEY, API_SECRET)
+
+    def sign(body):
+        body_json = encode_body(body)
+        return body_json, signer.headers("POST", "/orders/new", body_json)
+    return sign
+
+
+def measure(sign, bodies):
+    started = time.perf_counter()
+    for body in bodies:
+        sign(body)
+    return len(bodies) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Signed order requests per second, before and after RequestSigner")
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    bodies = [order_body() for _ in range(args.iterations)]
+    candidates = {"legacy": legacy_sign, "RequestSigner": make_signer_sign()}
+    results = {name: max(measure(sign, bodies) for _ in range(args.repeat)) for name, sign in candidates.items()}
+
+    for name, rate in results.items():
+        print(f"{name:<15}{rate:>12.0f} signed requests/sec")
+    print(f"speedup: {results['RequestSigner'] / results['legacy']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
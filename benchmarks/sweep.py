@@ -0,0 +1,229 @@
+"""Перебор настроек стратегии на исторических ценах: векторная модель правил бота по сетке параметров.
+
+    python -m benchmarks.sweep --ticks ticks --symbol ETH_USDT_PERP
+    python -m benchmarks.sweep --synthetic-hours 72 --hold-time 1 5 15 --slippage 0.001 0.003 0.005
+
+Все комбинации hold_time, slippage, limit_order_diff, limit_hold_time и leverage идут одним массивом NumPy:
+на каждом шаге цены правила входа, тейк-профита, таймаута и перевыставления (как в manage_positions и
+_calculate_limit_price) применяются сразу ко всем комбинациям. Сетка делится между процессами.
+Модель упрощенная (фиксированная пауза цикла, полное исполнение лимиток) - лучшие варианты стоит
+проверить в benchmarks.replay, который гоняет настоящий код бота.
+"""
+import os
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from benchmarks.replay import PriceSeries
+
+PARAMS = ("hold_time", "slippage", "limit_order_diff", "limit_hold_time", "leverage")
+
+# состояния комбинации
+IDLE, ENTRY, HOLDING, EXIT, BROKE = range(5)
+
+_series = None
+
+
+def resample(series, step=1.0):
+    """Цены на равномерной сетке step секунд: последний известный тик на каждый момент."""
+    grid = np.arange(series.start, series.end + step, step)
+    index = np.maximum(np.searchsorted(series.ts, grid, "right") - 1, 0)
+    return grid, series.price[index], series.bid[index], series.ask[index]
+
+
+def _init_worker(series):
+    global _series
+    _series = series
+
+
+def simulate(grid, settings, balance=1000.0, maker_fee=0.0002, tick=0.01, target=1000000.0, max_check_price=3, cycle=47.0, is_perpetual=True):
+    """Прогнать все комбинации settings (словарь массивов PARAMS) по ценам grid = (ts, price, bid, ask)."""
+    ts, price, bid, ask = grid
+    count = len(settings["hold_time"])
+    hold_seconds = np.asarray(settings["hold_time"], dtype=float) * 60
+    slippage = np.asarray(settings["slippage"], dtype=float)
+    diff = np.asarray(settings["limit_order_diff"], dtype=float)
+    limit_hold = np.asarray(settings["limit_hold_time"], dtype=float)
+    leverage = np.asarray(settings["leverage"], dtype=float) if is_perpetual else np.ones(count)
+
+    state = np.full(count, IDLE)
+    next_action = np.full(count, ts[0])
+    limit = np.zeros(count)
+    placed_at = np.zeros(count)
+    opened_at = np.zeros(count)
+    open_price = np.zeros(count)
+    size = np.zeros(count)
+    checks = np.zeros(count)
+    equity = np.full(count, balance)
+    volume = np.zeros(count)
+    fees = np.zeros(count)
+    trades = np.zeros(count, dtype=int)
+    requotes = np.zeros(count, dtype=int)
+    reached_at = np.full(count, np.nan)
+
+    for t, p, b, a in zip(ts, price, bid, ask):
+        # вход: лимитка ниже цены на limit_order_diff, шаг цены вниз
+        start = (state == IDLE) & (t >= next_action)
+        limit[start] = np.floor(p * (1 - diff[start]) / tick) * tick
+        placed_at[start] = t
+        state[start] = ENTRY
+
+        entry = state == ENTRY
+        filled = entry & (a <= limit)
+        if filled.any():
+            size[filled] = equity[filled] * 0.95 * leverage[filled] / limit[filled]
+            notional = size[filled] * limit[filled]
+            volume[filled] += notional
+            fees[filled] += notional * maker_fee
+            equity[filled] -= notional * maker_fee
+            open_price[filled] = limit[filled]
+            opened_at[filled] = t
+            checks[filled] = 0
+            next_action[filled] = t + cycle
+            state[filled] = HOLDING
+        stale = entry & ~filled & (t - placed_at >= limit_hold)
+        limit[stale] = np.floor(p * (1 - diff[stale]) / tick) * tick
+        placed_at[stale] = t
+        requotes += stale
+
+        # проверка позиции раз в цикл: тейк-профит, по истечении hold_time - безубыток или принудительно
+        check = (state == HOLDING) & (t >= next_action)
+        if check.any():
+            take_profit = p >= open_price * (1 + slippage)
+            timed_out = t - opened_at >= hold_seconds
+            close = check & (take_profit | (timed_out & ((p >= open_price) | (checks >= max_check_price))))
+            checks += check & timed_out & ~close
+            next_action[check] = t + cycle
+            limit[close] = np.ceil(p * (1 + diff[close]) / tick) * tick
+            placed_at[close] = t
+            state[close] = EXIT
+
+        exiting = state == EXIT
+        sold = exiting & (b >= limit)
+        if sold.any():
+            notional = size[sold] * limit[sold]
+            volume[sold] += notional
+            fees[sold] += notional * maker_fee
+            equity[sold] += size[sold] * (limit[sold] - open_price[sold]) - notional * maker_fee
+            trades += sold
+            next_action[sold] = t + cycle
+            state[sold] = np.where(equity[sold] > 0, IDLE, BROKE)
+            reached = sold & np.isnan(reached_at) & (volume >= target)
+            reached_at[reached] = t
+        stale = exiting & ~sold & (t - placed_at >= limit_hold)
+        limit[stale] = np.ceil(p * (1 + diff[stale]) / tick) * tick
+        placed_at[stale] = t
+        requotes += stale
+
+    span = ts[-1] - ts[0]
+    # цель не набрана за историю - оцениваем по достигнутому темпу
+    expected = np.where(np.isnan(reached_at), np.where(volume > 0, span * target / np.maximum(volume, 1e-9), np.inf), reached_at - ts[0])
+    # открытую позицию оцениваем по последней цене
+    holding = (state == HOLDING) | (state == EXIT)
+    pnl = equity - balance + np.where(holding, size * (price[-1] - open_price), 0.0)
+    safe_volume = np.maximum(volume, 1e-9)
+    return {
+        "volume": volume,
+        "fees": fees,
+        "pnl": pnl,
+        "fees_per_1m": np.where(volume > 0, fees / safe_volume * 1e6, np.nan),
+        # полная цена объема: pnl уже за вычетом комиссий, так что это комиссии плюс торговый убыток
+        "cost_per_1m": np.where(volume > 0, -pnl / safe_volume * 1e6, np.nan),
+        "time_to_target_hours": expected / 3600,
+        "target_reached": ~np.isnan(reached_at),
+        "trades": trades,
+        "requotes": requotes,
+        "broke": state == BROKE,
+    }
+
+
+def _run_chunk(args):
+    settings, options = args
+    return simulate(_series, settings, **options)
+
+
+def sweep(series, grid, processes=None, step=1.0, **options):
+    """Разбить сетку параметров на куски по процессам и собрать результаты в один словарь массивов."""
+    combos = list(itertools.product(*(grid[name] for name in PARAMS)))
+    processes = processes or os.cpu_count() or 1
+    chunks = np.array_split(np.array(combos, dtype=float), min(processes, len(combos)))
+    resampled = resample(series, step)
+    with ProcessPoolExecutor(max_workers=len(chunks), initializer=_init_worker, initargs=(resampled,)) as pool:
+        parts = list(pool.map(_run_chunk, [({name: chunk[:, i] for i, name in enumerate(PARAMS)}, options) for chunk in chunks]))
+
+    combos = np.array(combos, dtype=float)
+    results = {name: combos[:, i] for i, name in enumerate(PARAMS)}
+    for key in parts[0]:
+        results[key] = np.concatenate([part[key] for part in parts])
+    return results
+
+
+def ranked(results):
+    """Порядок строк: дешевле объем, затем быстрее цель; разорившиеся и без объема - в конце."""
+    cost = np.where(np.isnan(results["cost_per_1m"]) | results["broke"], np.inf, results["cost_per_1m"])
+    return np.lexsort((results["time_to_target_hours"], cost))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--ticks", default="ticks", help="TickRecorder directory")
+    parser.add_argument("--days", nargs="+", help="days to use (default: all recorded)")
+    parser.add_argument("--symbol", help="default: ETH_USDT_PERP or ETH_USDT depending on is_perpetual")
+    parser.add_argument("--synthetic-hours", type=float, help="use a random walk instead of recorded ticks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--hold-time", type=float, nargs="+", default=[1, 5, 15])
+    parser.add_argument("--slippage", type=float, nargs="+", default=[0.001, 0.003, 0.005])
+    parser.add_argument("--limit-order-diff", type=float, nargs="+", default=[0.0001, 0.0003, 0.001])
+    parser.add_argument("--limit-hold-time", type=float, nargs="+", default=[10, 30, 90])
+    parser.add_argument("--leverage", type=float, nargs="+", default=[2, 5, 8])
+    parser.add_argument("--balance", type=float, default=1000.0)
+    parser.add_argument("--maker-fee", type=float, default=0.0002)
+    parser.add_argument("--tick", type=float, default=0.01, help="price tick of the symbol")
+    parser.add_argument("--step", type=float, default=1.0, help="price grid step in seconds")
+    parser.add_argument("--processes", type=int, help="default: number of CPUs")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--json", help="save all rows to this file")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    is_perpetual = bool(config["is_perpetual"])
+    symbol = args.symbol or ("ETH_USDT_PERP" if is_perpetual else "ETH_USDT")
+    if args.synthetic_hours:
+        series = PriceSeries.synthetic(args.synthetic_hours, seed=args.seed)
+    else:
+        series = PriceSeries.from_recordings(args.ticks, symbol, args.days)
+
+    grid = {name: getattr(args, name) for name in PARAMS}
+    started = time.perf_counter()
+    results = sweep(
+        series, grid, processes=args.processes, step=args.step,
+        balance=args.balance, maker_fee=args.maker_fee, tick=args.tick, is_perpetual=is_perpetual,
+        target=config["perp_target_volume"] if is_perpetual else config["spot_target_volume"],
+        max_check_price=config["max_check_price"]
+    )
+    rows = len(results["volume"])
+    print(f"{rows} combinations over {(series.end - series.start) / 3600:.1f}h of {symbol} in {time.perf_counter() - started:.1f}s\n")
+
+    print(f"{'#':>3} {'hold':>5} {'slippage':>9} {'diff':>8} {'lim hold':>8} {'lev':>4} {'cost/1M':>9} {'fees/1M':>8} {'pnl':>9} {'volume':>11} {'target h':>9} {'trades':>6} {'requotes':>8}")
+    order = ranked(results)
+    for place, i in enumerate(order[:args.top], start=1):
+        target_hours = results["time_to_target_hours"][i]
+        print(
+            f"{place:>3} {results['hold_time'][i]:>5g} {results['slippage'][i]:>9g} {results['limit_order_diff'][i]:>8g} "
+            f"{results['limit_hold_time'][i]:>8g} {results['leverage'][i]:>4g} {results['cost_per_1m'][i]:>9.0f} "
+            f"{results['fees_per_1m'][i]:>8.0f} {results['pnl'][i]:>9.2f} {results['volume'][i]:>11.0f} "
+            f"{target_hours:>8.1f}{'' if results['target_reached'][i] else '~'} {results['trades'][i]:>6} {results['requotes'][i]:>8}"
+        )
+    print("\n~ - target not reached on this history, extrapolated from the achieved pace")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([{key: results[key][i].item() for key in results} for i in order], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,36 @@
+import sys
 import json
 import asyncio
-from src.utils import load_account_info
-from src.ArkhamAPI import ArkhamAPI
-from src.VolumePumpBot import VolumePumpBot
+import argparse
+from loguru import logger
+from src.utils import load_account_info, validate_config, validate_accounts
+from src.LogSetup import setup_logging
+from src.Fleet import Fleet
+from src.Supervisor import Supervisor
 
 
 def load_config(config_path="config.json"):
     with open(config_path, "r") as f:
         return json.load(f)
 
-async def main():
-    accounts = load_account_info('accounts.csv')
-    config = load_config()
-
-    spot_target_volume = config["spot_target_volume"]
-    max_check_price = config["max_check_price"]
-    slippage = config["slippage"]
-    is_perpetual = config["is_perpetual"]
-    leverage = config["leverage"]
-    perp_target_volume = config["perp_target_volume"]
-    hold_time = config["hold_time"]
-    limit_order_diff = config["limit_order_diff"]
-    limit_hold_time = config["limit_hold_time"]
-    tasks = []
+def main():
+    parser = argparse.ArgumentParser(description="Arkham volume bot")
+    parser.add_argument("--workers", type=int, help="number of worker processes to shard accounts across")
+    args = parser.parse_args()
 
-    # тикеры
+    config = load_config()
+    setup_logging(config)
+    accounts = load_account_info('accounts.csv')
+    # проверяем один раз до старта, чтобы ошибка в строке 9000 не всплыла через час работы
+    try:
+        validate_config(config)
+        validate_accounts(accounts)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    workers = args.workers or config.get("workers", 1)
+
+    # тикеры; шаги цены и лота берутся с биржи (InstrumentCache), rounding_step - запасной лот
     symbols = {
         "ETH_USDT": {"rounding_step": 0.001},
         "BTC_USDT": {"rounding_step": 0.00001},
@@ -43,36 +49,15 @@ async def main():
         # "AVAX_USDTPERP": {"rounding_step": 0.01}
     }
 
-    for account in accounts:
-        proxies = None
-        if account["proxy"]:
-            proxies = {
-                "http": f"http://{account['proxy']}",
-                "https": f"http://{account['proxy']}"
-            }
-
-        trading_symbols = symbols
-        
-        if is_perpetual:
-            trading_symbols = symbols_perp
+    trading_symbols = symbols
 
-        api = ArkhamAPI(account['api_key'], account['api_secret'], proxies=proxies)
-        bot = VolumePumpBot(
-            api=api, 
-            symbols=trading_symbols, 
-            spot_target_volume=spot_target_volume, 
-            perp_target_volume=perp_target_volume, 
-            max_check_price=max_check_price, 
-            slippage=slippage, 
-            is_perpetual=is_perpetual, 
-            leverage=leverage,
-            hold_time=hold_time,
-            limit_order_diff=limit_order_diff,
-            limit_hold_time=limit_hold_time
-        )
-        tasks.append(bot.run())
+    if config["is_perpetual"]:
+        trading_symbols = symbols_perp
 
-    await asyncio.gather(*tasks)
+    if workers > 1:
+        Supervisor(accounts, config, trading_symbols, workers).run()
+    else:
+        asyncio.run(Fleet(accounts, config, trading_symbols).build().run())
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -0,0 +1,104 @@
+"""Прогресс флота по дневным итогам исполнений из orders.db, без запросов к бирже.
+
+    python report.py                      # по аккаунтам: объем, комиссии, доля цели
+    python report.py --by day --days 7    # по дням за последнюю неделю
+    python report.py --by symbol --since 2026-10-01
+
+Итоги считаются только по исполнениям, записанным ботом; объем, набранный до появления
+таблицы fills или вручную, бот учитывает через сверку со статистикой биржи, а здесь его нет.
+"""
+import os
+import sys
+import json
+import sqlite3
+import argparse
+from datetime import datetime, timedelta, timezone
+from src.utils import load_account_info
+
+GROUPS = {
+    "account": "account_id",
+    "symbol": "symbol",
+    "day": "day",
+}
+
+
+def load_rollups(db_path, by="account", since=None):
+    """Строки (ключ, spot_volume, perp_volume, fees, fills) из volume_daily, сгруппированные по by."""
+    column = GROUPS[by]
+    # только чтение: отчет можно запускать рядом с работающим ботом (WAL)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return conn.execute(
+            f'''SELECT {column},
+                       SUM(CASE WHEN symbol LIKE '%\\_PERP' ESCAPE '\\' THEN 0 ELSE volume END),
+                       SUM(CASE WHEN symbol LIKE '%\\_PERP' ESCAPE '\\' THEN volume ELSE 0 END),
+                       SUM(fees), SUM(fills)
+                FROM volume_daily WHERE day >= ? GROUP BY {column} ORDER BY {column}''',
+            (since or "",)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="orders.db")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--accounts", default="accounts.csv", help="used only to show aliases instead of API keys")
+    parser.add_argument("--by", choices=list(GROUPS), default="account")
+    parser.add_argument("--days", type=int, help="only the last N UTC days")
+    parser.add_argument("--since", help="only days from this UTC date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        sys.exit(f"{args.db} not found")
+    since = args.since
+    if args.days:
+        since = (datetime.now(timezone.utc) - timedelta(days=args.days - 1)).strftime("%Y-%m-%d")
+    try:
+        rows = load_rollups(args.db, args.by, since)
+    except sqlite3.OperationalError as e:
+        sys.exit(f"{args.db}: {e} (the bot has not recorded any fills yet)")
+
+    with open(args.config) as f:
+        config = json.load(f)
+    is_perpetual = bool(config["is_perpetual"])
+    target = config["perp_target_volume"] if is_perpetual else config["spot_target_volume"]
+    aliases = {}
+    if os.path.exists(args.accounts):
+        aliases = {account["api_key"]: account["alias"] for account in load_account_info(args.accounts)}
+
+    def name(key):
+        if args.by != "account":
+            return key
+        return aliases.get(key) or f"{key[:8]}..."
+
+    header = f"{args.by:<24} {'spot volume':>14} {'perp volume':>14} {'fees':>10} {'fees/1M':>8} {'fills':>7}"
+    if args.by == "account":
+        header += f" {'target':>7}"
+    print(header)
+
+    reached = 0
+    totals = [0.0, 0.0, 0.0, 0]
+    for key, spot, perp, fees, fills in rows:
+        volume = spot + perp
+        line = f"{name(key):<24} {spot:>14.2f} {perp:>14.2f} {fees:>10.2f} {fees / volume * 1e6 if volume else 0:>8.0f} {fills:>7}"
+        if args.by == "account":
+            progress = (perp if is_perpetual else spot) / target
+            reached += progress >= 1
+            line += f" {progress:>6.0%}"
+        print(line)
+        for i, value in enumerate((spot, perp, fees, fills)):
+            totals[i] += value
+
+    volume = totals[0] + totals[1]
+    print(
+        f"{'total':<24} {totals[0]:>14.2f} {totals[1]:>14.2f} {totals[2]:>10.2f} "
+        f"{totals[2] / volume * 1e6 if volume else 0:>8.0f} {totals[3]:>7}"
+    )
+    if args.by == "account":
+        print(f"\n{len(rows)} accounts with fills, {reached} reached the {'perp' if is_perpetual else 'spot'} target of {target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import time
+import asyncio
+
+DEFAULT_TTLS = {
+    "balances": 30,
+    "open_orders": 5,
+    "volume": 600
+}
+
+
+class AccountState:
+    """Состояние аккаунта: балансы (по символу), открытые ордера и объем торгов.
+
+    Поля кэшируются с разными TTL и обновляются одним параллельным раундом запросов;
+    собственные ордера аккаунта сбрасывают балансы и открытые ордера. Объем бот считает по своим
+    исполнениям в OrderStore, а статистика биржи нужна только для сверки - отсюда длинный TTL.
+    """
+
+    FIELDS = tuple(DEFAULT_TTLS)
+
+    __slots__ = ("api", "ttls", "_values", "_fetched_at", "_inflight")
+
+    def __init__(self, api, ttls=None):
+        self.api = api
+        # полный словарь TTL (как собирает Fleet) не копируем - он общий для всех аккаунтов
+        self.ttls = ttls if ttls is not None and ttls.keys() >= DEFAULT_TTLS.keys() else {**DEFAULT_TTLS, **(ttls or {})}
+        self._values = {}
+        self._fetched_at = {}
+        self._inflight = {}
+
+    async def _fetch_balances(self):
+        data = await self.api.get_balances()
+        if data is None:
+            return None
+        return {item["symbol"]: item for item in data}
+
+    async def _fetch_open_orders(self):
+        return await self.api.get_open_orders()
+
+    async def _fetch_volume(self):
+        volume = await self.api.get_trading_volume()
+        # при ошибке клиент возвращает 0 вместо кортежа
+        return volume if isinstance(volume, tuple) else None
+
+    def _fresh(self, field):
+        fetched_at = self._fetched_at.get(field)
+        return fetched_at is not None and time.monotonic() - fetched_at < self.ttls[field]
+
+    async def _load(self, field):
+        value = await getattr(self, f"_fetch_{field}")()
+        if value is not None:
+            self._values[field] = value
+            self._fetched_at[field] = time.monotonic()
+        return value
+
+    async def get(self, field):
+        if self._fresh(field):
+            return self._values[field]
+        task = self._inflight.get(field)
+        if task is None:
+            task = asyncio.ensure_future(self._load(field))
+            self._inflight[field] = task
+            task.add_done_callback(lambda _: self._inflight.pop(field, None))
+        return await asyncio.shield(task)
+
+    async def refresh(self, *fields):
+        """Обновить устаревшие поля одним параллельным раундом запросов."""
+        fields = fields or self.FIELDS
+        results = await asyncio.gather(*(self.get(field) for field in fields), return_exceptions=True)
+        for field, result in zip(fields, results):
+            if isinstance(result, Exception):
+                self.api.log.error(f"Ошибка обновления {field}: {result}")
+
+    def invalidate(self, *fields):
+        for field in fields or self.FIELDS:
+            self._fetched_at.pop(field, None)
+
+    def on_order_event(self, event):
+        """Событие по нашему ордеру меняет открытые ордера и свободный баланс."""
+        self.invalidate("balances", "open_orders")
+
+    async def balance(self, symbol, field="free"):
+        """Свободный баланс монеты; field="balance" - весь, включая залог открытых позиций и ордеров."""
+        balances = await self.get("balances")
+        if not balances or symbol not in balances:
+            return None
+        return float(balances[symbol].get(field) or balances[symbol]["free"])
+
+    async def open_orders(self):
+        return await self.get("open_orders")
+
+    async def volume(self):
+        return await self.get("volume")
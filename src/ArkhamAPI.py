@@ -1,235 +1,271 @@
-import time
-import hmac
-import hashlib
-import base64
 import uuid
+import time
+from decimal import Decimal
 import requests
-import json
-import random
 from loguru import logger
+from src.RequestSigner import RequestSigner, encode_body
+
+# статусы поиска ордера по clientOrderId
+ORDER_NOT_FOUND = "not_found"
+
+
+def is_duplicate_client_id(status, data):
+    """Отказ биржи из-за уже использованного clientOrderId: первая попытка дошла, ее надо найти, а не повторять."""
+    return status in (400, 409) and "clientorderid" in str(data).lower()
+
 
 class ArkhamAPI:
-    def __init__(self, api_key, api_secret, proxies=None):
+    def __init__(self, api_key, api_secret, proxies=None, alias=None, timeout=15, order_timeout=5, order_attempts=3):
         self.api_key = api_key
         self.api_secret = api_secret
         self.base_url = "https://arkm.com/api"
         self.proxies = proxies
-        logger.add("logs/arkham_api.log", rotation="1 day", level="INFO")
+        self.signer = RequestSigner(api_key, api_secret)
+        # в логах аккаунт виден по псевдониму, а не по ключу
+        self.alias = alias or api_key[:8]
+        self.log = logger.bind(account=self.alias)
+        # InstrumentCache, общий для флота: create_order квантует цену и размер по шагам пары
+        self.instruments = None
+        self.timeout = timeout
+        # срок одной попытки выставления и сколько попыток с одним clientOrderId
+        self.order_timeout = order_timeout
+        self.order_attempts = order_attempts
 
     def generate_signature(self, method, path, body, expires):
-        message = f"{self.api_key}{expires}{method}{path}{body}"
-        secret = base64.b64decode(self.api_secret)
-        signature = hmac.new(secret, message.encode(), hashlib.sha256).digest()
-        signature_b64 = base64.b64encode(signature).decode()
-        logger.debug(f"Generated signature for {path}")
-        return signature_b64
-    
+        return self.signer.sign(method, path, body, expires)
+
+    def _request(self, method, path, body=None, params=None, timeout=None):
+        """Подписанный запрос: один путь построения заголовков и тела для всех эндпоинтов."""
+        body_json = encode_body(body)
+        headers = self.signer.headers(method, path, body_json)
+        return requests.request(
+            method, f"{self.base_url}{path}", headers=headers, data=body_json or None, params=params,
+            proxies=self.proxies, timeout=timeout or self.timeout
+        )
+
     def get_open_orders(self, subaccount_id=0):
-        path = "/orders"
-        url = f"{self.base_url}{path}"
         params = {}
         
         if subaccount_id:
             params['subaccountId'] = subaccount_id
-        
-        method = "GET"
-        expires = str(int(time.time() * 1000000) + 300000000)
-        signature = self.generate_signature(method, path, '', expires)
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Arkham-Api-Key": self.api_key,
-            "Arkham-Expires": expires,
-            "Arkham-Signature": signature
-        }
 
-        response = requests.get(url, headers=headers, params=params, proxies=self.proxies)
+        response = self._request("GET", "/orders", params=params)
         
         if response.status_code == 200:
             return response.json()
         else:
-            logger.error(f"Error fetching orders: {response.status_code} - {response.text}")
+            self.log.error(f"Error fetching orders: {response.status_code} - {response.text}")
             return None
 
     def get_market_price(self, symbol):
-        path = f"/public/ticker?symbol={symbol}"
-        url = f"{self.base_url}{path}"
-        method = "GET"
-        expires = str(int(time.time() * 1000000) + 300000000)
-        signature = self.generate_signature(method, path, "", expires)
-
-        headers = {
-            "Arkham-Api-Key": self.api_key,
-            "Arkham-Expires": expires,
-            "Arkham-Signature": signature
-        }
-
-        logger.info(f"Fetching market price for {symbol}...")
-        response = requests.get(url, headers=headers, proxies=self.proxies)
+        log = self.log.bind(symbol=symbol)
+        log.info(f"Fetching market price for {symbol}...")
+        response = self._request("GET", f"/public/ticker?symbol={symbol}")
         if response.status_code == 200:
             data = response.json()
             price = float(data['price']) if 'price' in data else None
-            logger.info(f"Market price for {symbol}: {price}")
+            log.info(f"Market price for {symbol}: {price}")
             return price
         else:
-            logger.error(f"Error fetching price for {symbol}: {response.status_code} - {response.text}")
+            log.error(f"Error fetching price for {symbol}: {response.status_code} - {response.text}")
             return None
 
-    def get_balance_for_symbol(self, symbol):
-        """Получение баланса для конкретного символа."""
-        path = "/account/balances"
-        url = f"{self.base_url}{path}"
-        method = "GET"
-        expires = str(int(time.time() * 1000000) + 300000000)
-        signature = self.generate_signature(method, path, "", expires)
-
-        headers = {
-            "Arkham-Api-Key": self.api_key,
-            "Arkham-Expires": expires,
-            "Arkham-Signature": signature
-        }
+    def get_balances(self):
+        """Все балансы аккаунта одним запросом."""
+        response = self._request("GET", "/account/balances")
 
-        logger.info(f"Fetching balance for {symbol}...")
-        response = requests.get(url, headers=headers, proxies=self.proxies)
-        
         if response.status_code == 200:
-            balance_data = response.json()
-            for item in balance_data:
-                if item["symbol"] == symbol:
-                    free_balance = float(item["free"])
-                    logger.info(f"Balance for {symbol}: {free_balance}")
-                    return free_balance
-            logger.error(f"Symbol {symbol} not found in balance data.")
+            return response.json()
+        else:
+            self.log.error(f"Error fetching balances: {response.status_code} - {response.text}")
             return None
+
+    def get_fills(self, limit=100):
+        """Последние сделки аккаунта, новые первыми."""
+        response = self._request("GET", "/trades/history", params={"limit": limit})
+
+        if response.status_code == 200:
+            return response.json()
         else:
-            logger.error(f"Error fetching balance for {symbol}: {response.status_code} - {response.text}")
+            self.log.error(f"Error fetching fills: {response.status_code} - {response.text}")
             return None
 
-    def create_order(self, price, size, side, symbol, type, subaccount_id=0, post_only=False):
-        path = "/orders/new"
-        url = f"{self.base_url}{path}"
-        method = "POST"
-        client_order_id = str(uuid.uuid4())
-        
+    def get_order(self, order_id):
+        """Ордер по orderId (в том числе исполненный или отмененный), ORDER_NOT_FOUND или None при ошибке запроса."""
+        try:
+            response = self._request("GET", f"/orders/{order_id}")
+        except requests.RequestException as e:
+            self.log.error(f"Error fetching order {order_id}: {e}")
+            return None
+
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code == 404:
+            return ORDER_NOT_FOUND
+        self.log.error(f"Error fetching order {order_id}: {response.status_code} - {response.text}")
+        return None
+
+    def get_order_by_client_id(self, client_order_id):
+        """Ордер по clientOrderId (в том числе исполненный), ORDER_NOT_FOUND или None при ошибке запроса."""
+        try:
+            response = self._request("GET", "/orders/by-client-order-id", params={"clientOrderId": client_order_id})
+        except requests.RequestException as e:
+            self.log.error(f"Error looking up order {client_order_id}: {e}")
+            return None
+
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code == 404:
+            return ORDER_NOT_FOUND
+        self.log.error(f"Error looking up order {client_order_id}: {response.status_code} - {response.text}")
+        return None
+
+    def get_balance_for_symbol(self, symbol):
+        """Получение баланса для конкретного символа."""
+        log = self.log.bind(symbol=symbol)
+        log.info(f"Fetching balance for {symbol}...")
+        balance_data = self.get_balances()
+        if balance_data is None:
+            return None
+
+        for item in balance_data:
+            if item["symbol"] == symbol:
+                free_balance = float(item["free"])
+                log.info(f"Balance for {symbol}: {free_balance}")
+                return free_balance
+        log.error(f"Symbol {symbol} not found in balance data.")
+        return None
+
+    @staticmethod
+    def _order_body(price, size, side, symbol, type, subaccount_id=0, post_only=False, client_order_id=None):
         if type == "market":
             price = 0
 
-        body = {
-            "clientOrderId": client_order_id,
+        return {
+            "clientOrderId": client_order_id or str(uuid.uuid4()),
             "postOnly": post_only,
-            "price": f"{price:.8f}",
+            "price": format(price, "f") if isinstance(price, Decimal) else f"{price:.8f}",
             "side": side,
-            "size": str(size),
+            # str() у Decimal с мелким шагом и у float дает экспоненту (1E-8, 1e-05)
+            "size": format(size if isinstance(size, Decimal) else Decimal(str(size)), "f"),
             "subaccountId": subaccount_id,
             "symbol": symbol,
             "type": type
         }
 
-        body_json = json.dumps(body)
-        expires = str(int(time.time() * 1000000) + 300000000)
-        signature = self.generate_signature(method, path, body_json, expires)
-
-        headers = {
-            "Content-Type": "application/json",
-            "Arkham-Api-Key": self.api_key,
-            "Arkham-Expires": expires,
-            "Arkham-Signature": signature
-        }
+    def _quantize_order(self, price, size, side, symbol, type):
+        """Цена и размер по шагам пары. None, если ордер биржа все равно отклонит."""
+        instrument = self.instruments.get(symbol) if self.instruments is not None else None
+        if instrument is not None:
+            size = instrument.size(size)
+            if type != "market":
+                price = instrument.price(price, side)
+                if not instrument.meets_min_notional(price, size):
+                    return None
+        # без метаданных пары шаг DEFAULT_TICK округляет цену дешевой пары до 0, а min_notional 0 это пропускает
+        if size <= 0 or (type != "market" and price <= 0):
+            return None
+        return price, size
 
-        logger.info(f"Creating order for {side}: {size} {symbol} at {price}. {type}")
-        response = requests.post(url, headers=headers, data=body_json, proxies=self.proxies)
-        if response.status_code == 200:
-            logger.info(f"Order created successfully: {response.json()}")
-            return response.json()
-        else:
-            logger.error(f"Error creating order: {response.status_code} - {response.text}")
+    def create_order(self, price, size, side, symbol, type, subaccount_id=0, post_only=False, client_order_id=None):
+        """Выставить ордер. Все попытки идут с одним clientOrderId; при неизвестном исходе (таймаут, обрыв, 5xx)
+        ордер сначала ищется на бирже, и повтор уходит, только если его там нет."""
+        log = self.log.bind(symbol=symbol)
+        quantized = self._quantize_order(price, size, side, symbol, type)
+        if quantized is None:
+            log.error(f"Order {side} {size} {symbol} at {price} is below tick, lot size or min notional")
             return None
+        price, size = quantized
+        body = self._order_body(price, size, side, symbol, type, subaccount_id, post_only, client_order_id)
+
+        log.info(f"Creating order for {side}: {size} {symbol} at {body['price']}. {type}")
+        for attempt in range(1, self.order_attempts + 1):
+            try:
+                response = self._request("POST", "/orders/new", body=body, timeout=self.order_timeout)
+                if response.status_code == 200:
+                    log.info(f"Order created successfully: {response.json()}")
+                    return response.json()
+                if response.status_code < 500 and not is_duplicate_client_id(response.status_code, response.text):
+                    log.error(f"Error creating order: {response.status_code} - {response.text}")
+                    return None
+                reason = f"{response.status_code} - {response.text}"
+            except requests.RequestException as e:
+                reason = str(e)
+
+            found = self.get_order_by_client_id(body["clientOrderId"])
+            if found is None:
+                log.error(f"Order {body['clientOrderId']} outcome unknown ({reason}), not retrying to avoid a duplicate")
+                return None
+            if found != ORDER_NOT_FOUND:
+                log.info(f"Order {body['clientOrderId']} was placed despite {reason}: {found.get('orderId')}")
+                return {"orderId": found["orderId"], "clientOrderId": body["clientOrderId"]}
+            log.warning(f"Order {body['clientOrderId']} not placed ({reason}), attempt {attempt}/{self.order_attempts}")
+            if attempt < self.order_attempts:
+                time.sleep(min(0.5 * attempt, 2))
+        log.error(f"Error creating order: {self.order_attempts} attempts failed")
+        return None
         
     def cancel_orders(self):
-        path = "/orders/cancel/all"
-        url = f"{self.base_url}{path}"
-        method = "POST"
         body = {
             "subaccountId": 0,
             "timeToCancel": 0
         }
 
-        body_json = json.dumps(body)
-        expires = str(int(time.time() * 1000000) + 300000000)
-        signature = self.generate_signature(method, path, body_json, expires)
-
-        headers = {
-            "Content-Type": "application/json",
-            "Arkham-Api-Key": self.api_key,
-            "Arkham-Expires": expires,
-            "Arkham-Signature": signature
-        }
-
-        logger.info(f"Canceling all open orders..")
-        response = requests.post(url, headers=headers, data=body_json, proxies=self.proxies)
+        self.log.info(f"Canceling all open orders..")
+        response = self._request("POST", "/orders/cancel/all", body=body)
 
         if response.status_code == 200:
-            logger.info(f"Orders cancelled successfully: {response.json()}")
+            self.log.info(f"Orders cancelled successfully: {response.json()}")
             return response.json()
         else:
-            logger.error(f"Error cancelling orders: {response.status_code} - {response.text}")
+            self.log.error(f"Error cancelling orders: {response.status_code} - {response.text}")
             return None
         
     def get_trading_volume(self):
-        path = "/affiliate-dashboard/trading-volume-stats"
-        url = f"{self.base_url}{path}"
-        method = "GET"
-        expires = str(int(time.time() * 1000000) + 300000000)
-        signature = self.generate_signature(method, path, "", expires)
-
-        headers = {
-            "Arkham-Api-Key": self.api_key,
-            "Arkham-Expires": expires,
-            "Arkham-Signature": signature
-        }
-
-        logger.info("Fetching trading volume...")
-        response = requests.get(url, headers=headers, proxies=self.proxies)
+        self.log.info("Fetching trading volume...")
+        response = self._request("GET", "/affiliate-dashboard/trading-volume-stats")
         if response.status_code == 200:
-            volume_data = response.json()
-            spot_taker_volume = float(volume_data['spotTakerVolume']) if 'spotTakerVolume' in volume_data and volume_data['spotTakerVolume'] else 0
-            spot_maker_volume = float(volume_data['spotMakerVolume']) if 'spotMakerVolume' in volume_data and volume_data['spotMakerVolume'] else 0
-            total_spot_volume = spot_taker_volume+spot_maker_volume
+            return self._parse_trading_volume(response.json())
+        else:
+            self.log.error(f"Error fetching trading volume: {response.status_code} - {response.text}")
+            return 0
 
-            perp_taker_volume = float(volume_data['perpTakerVolume']) if 'perpTakerVolume' in volume_data and volume_data['perpTakerVolume'] else 0
-            perp_maker_volume = float(volume_data['perpMakerVolume']) if 'perpMakerVolume' in volume_data and volume_data['perpMakerVolume'] else 0
-            total_perp_volume = perp_taker_volume+perp_maker_volume
+    @staticmethod
+    def _parse_trading_volume(volume_data):
+        spot_taker_volume = float(volume_data['spotTakerVolume']) if 'spotTakerVolume' in volume_data and volume_data['spotTakerVolume'] else 0
+        spot_maker_volume = float(volume_data['spotMakerVolume']) if 'spotMakerVolume' in volume_data and volume_data['spotMakerVolume'] else 0
+        total_spot_volume = spot_taker_volume+spot_maker_volume
 
-            spot_taker_fees = float(volume_data['spotTakerFees']) if 'spotTakerFees' in volume_data and volume_data['spotTakerFees'] else 0
-            spot_maker_fees = float(volume_data['spotMakerFees']) if 'spotMakerFees' in volume_data and volume_data['spotMakerFees'] else 0
-            total_spot_fees = spot_maker_fees + spot_taker_fees
+        perp_taker_volume = float(volume_data['perpTakerVolume']) if 'perpTakerVolume' in volume_data and volume_data['perpTakerVolume'] else 0
+        perp_maker_volume = float(volume_data['perpMakerVolume']) if 'perpMakerVolume' in volume_data and volume_data['perpMakerVolume'] else 0
+        total_perp_volume = perp_taker_volume+perp_maker_volume
 
-            perp_taker_fees = float(volume_data['perpTakerFees']) if 'perpTakerFees' in volume_data and volume_data['perpTakerFees'] else 0
-            perp_maker_fees = float(volume_data['perpMakerFees']) if 'spotMakerFees' in volume_data and volume_data['perpMakerFees'] else 0
-            total_perp_fees = perp_taker_fees + perp_maker_fees
+        spot_taker_fees = float(volume_data['spotTakerFees']) if 'spotTakerFees' in volume_data and volume_data['spotTakerFees'] else 0
+        spot_maker_fees = float(volume_data['spotMakerFees']) if 'spotMakerFees' in volume_data and volume_data['spotMakerFees'] else 0
+        total_spot_fees = spot_maker_fees + spot_taker_fees
 
-            return total_spot_volume, total_perp_volume, total_spot_fees, total_perp_fees
-        else:
-            logger.error(f"Error fetching trading volume: {response.status_code} - {response.text}")
-            return 0
+        perp_taker_fees = float(volume_data['perpTakerFees']) if 'perpTakerFees' in volume_data and volume_data['perpTakerFees'] else 0
+        perp_maker_fees = float(volume_data['perpMakerFees']) if 'spotMakerFees' in volume_data and volume_data['perpMakerFees'] else 0
+        total_perp_fees = perp_taker_fees + perp_maker_fees
 
-    def get_tickers(self):
-        path = "/public/tickers"
-        url = f"{self.base_url}{path}"
-        method = "GET"
-        expires = str(int(time.time() * 1000000) + 300000000)
-        signature = self.generate_signature(method, path, "", expires)
-
-        headers = {
-            "Arkham-Api-Key": self.api_key,
-            "Arkham-Expires": expires,
-            "Arkham-Signature": signature
-        }
+        return total_spot_volume, total_perp_volume, total_spot_fees, total_perp_fees
+
+    def get_instruments(self):
+        """Метаданные спотовых пар и перпетуалов: шаг цены, лот, минимальный объем."""
+        instruments = []
+        for path in ("/public/pairs", "/public/contracts"):
+            response = self._request("GET", path)
+            if response.status_code == 200:
+                instruments.extend(response.json() or [])
+            else:
+                self.log.error(f"Error fetching {path}: {response.status_code} - {response.text}")
+        return instruments
 
-        logger.info("Fetching tickers...")
-        response = requests.get(url, headers=headers, proxies=self.proxies)
+    def get_tickers(self):
+        self.log.info("Fetching tickers...")
+        response = self._request("GET", "/public/tickers")
         if response.status_code == 200:
             return response.json()
         else:
-            logger.error(f"Error fetching tickers: {response.status_code} - {response.text}")
+            self.log.error(f"Error fetching tickers: {response.status_code} - {response.text}")
             return 0
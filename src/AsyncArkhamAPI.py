@@ -0,0 +1,364 @@
+import time
+import asyncio
+import aiohttp
+from src.ArkhamAPI import ArkhamAPI, ORDER_NOT_FOUND, is_duplicate_client_id
+from src.RequestSigner import encode_body
+from src.RateLimiter import RateLimiter, LatencyTracker, endpoint_class, parse_retry_after
+from src.Metrics import Metrics
+
+# исход одной попытки выставления
+PLACED, REJECTED, UNKNOWN = "placed", "rejected", "unknown"
+
+
+class AsyncArkhamAPI(ArkhamAPI):
+    """Асинхронный клиент Arkham API с пулом keep-alive соединений на аккаунт/прокси."""
+
+    def __init__(
+            self, api_key, api_secret, proxies=None, pool_limit=10, timeout=15, keepalive_timeout=30,
+            limiter: RateLimiter = None, metrics: Metrics = None, alias=None,
+            order_timeout=5, order_attempts=3, order_hedge_percentile=0, order_latency: LatencyTracker = None
+    ):
+        super().__init__(api_key, api_secret, proxies=proxies, alias=alias, timeout=timeout, order_timeout=order_timeout, order_attempts=order_attempts)
+        self.proxy = proxies.get("https") if proxies else None
+        self.pool_limit = pool_limit
+        self.keepalive_timeout = keepalive_timeout
+        self.limiter = limiter
+        self.metrics = metrics
+        # вторая попытка с тем же clientOrderId, если первая дольше этого перцентиля (0 - выключено)
+        self.order_hedge_percentile = order_hedge_percentile
+        self.order_latency = order_latency
+        self._session = None
+        self._hedges = set()
+
+    def _get_session(self):
+        """Ленивое создание сессии внутри работающего event loop."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _send(self, method, path, body_json="", params=None, timeout=None):
+        """Одна попытка подписанного запроса. Возвращает (status, json при 200 иначе текст, Retry-After)."""
+        headers = self.signer.headers(method, path, body_json)
+        session = self._get_session()
+        # timeout=None у aiohttp значит "без срока", поэтому без своего срока действует таймаут сессии
+        extra = {"timeout": aiohttp.ClientTimeout(total=timeout)} if timeout else {}
+        async with session.request(
+            method, f"{self.base_url}{path}", headers=headers, data=body_json or None, params=params, proxy=self.proxy, **extra
+        ) as response:
+            if response.status == 200:
+                return response.status, await response.json(content_type=None), None
+            return response.status, await response.text(), parse_retry_after(response.headers.get("Retry-After"))
+
+    async def _timed_send(self, method, path, body_json="", params=None, timeout=None):
+        """_send с записью статуса и длительности попытки в метрики."""
+        if self.metrics is None:
+            return await self._send(method, path, body_json, params, timeout)
+        started = time.perf_counter()
+        try:
+            result = await self._send(method, path, body_json, params, timeout)
+        except Exception:
+            self.metrics.observe_request(path, "error", time.perf_counter() - started)
+            raise
+        self.metrics.observe_request(path, result[0], time.perf_counter() - started)
+        return result
+
+    async def _request(self, method, path, body=None, params=None, timeout=None):
+        """Подписанный запрос через лимитер с повтором на 429/5xx. Возвращает (status, данные).
+
+        timeout - срок каждой отправки вместо общего таймаута сессии; ожидание в лимитере в него не входит.
+        """
+        body = encode_body(body)
+        if self.limiter is None:
+            status, data, _ = await self._timed_send(method, path, body, params, timeout)
+            return status, data
+
+        cls = endpoint_class(path)
+        attempt = 0
+        while True:
+            await self.limiter.acquire(self.api_key, self.proxy, cls)
+            status, data, retry_after = await self._timed_send(method, path, body, params, timeout)
+            if status == 200 or not self.limiter.should_retry(path, status, attempt):
+                return status, data
+
+            delay = self.limiter.backoff(attempt, retry_after)
+            self.limiter.on_response(self.api_key, self.proxy, cls, status, delay)
+            self.log.warning(f"{method} {path}: {status}, retry #{attempt + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def get_open_orders(self, subaccount_id=0):
+        params = {}
+
+        if subaccount_id:
+            params['subaccountId'] = subaccount_id
+
+        status, data = await self._request("GET", "/orders", params=params)
+
+        if status == 200:
+            return data
+        else:
+            self.log.error(f"Error fetching orders: {status} - {data}")
+            return None
+
+    async def get_market_price(self, symbol):
+        log = self.log.bind(symbol=symbol)
+        log.info(f"Fetching market price for {symbol}...")
+        status, data = await self._request("GET", f"/public/ticker?symbol={symbol}")
+        if status == 200:
+            price = float(data['price']) if 'price' in data else None
+            log.info(f"Market price for {symbol}: {price}")
+            return price
+        else:
+            log.error(f"Error fetching price for {symbol}: {status} - {data}")
+            return None
+
+    async def get_balances(self):
+        """Все балансы аккаунта одним запросом."""
+        status, data = await self._request("GET", "/account/balances")
+
+        if status == 200:
+            return data
+        else:
+            self.log.error(f"Error fetching balances: {status} - {data}")
+            return None
+
+    async def get_fills(self, limit=100):
+        """Последние сделки аккаунта, новые первыми."""
+        status, data = await self._request("GET", "/trades/history", params={"limit": limit})
+
+        if status == 200:
+            return data
+        else:
+            self.log.error(f"Error fetching fills: {status} - {data}")
+            return None
+
+    async def get_order(self, order_id):
+        """Ордер по orderId (в том числе исполненный или отмененный), ORDER_NOT_FOUND или None при ошибке запроса."""
+        try:
+            status, data = await self._request("GET", f"/orders/{order_id}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.log.error(f"Error fetching order {order_id}: {e}")
+            return None
+
+        if status == 200:
+            return data
+        if status == 404:
+            return ORDER_NOT_FOUND
+        self.log.error(f"Error fetching order {order_id}: {status} - {data}")
+        return None
+
+    async def get_order_by_client_id(self, client_order_id):
+        """Ордер по clientOrderId (в том числе исполненный), ORDER_NOT_FOUND или None при ошибке запроса."""
+        try:
+            status, data = await self._request("GET", "/orders/by-client-order-id", params={"clientOrderId": client_order_id}, timeout=self.order_timeout)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.log.error(f"Error looking up order {client_order_id}: {e}")
+            return None
+
+        if status == 200:
+            return data
+        if status == 404:
+            return ORDER_NOT_FOUND
+        self.log.error(f"Error looking up order {client_order_id}: {status} - {data}")
+        return None
+
+    async def get_balance_for_symbol(self, symbol):
+        """Получение баланса для конкретного символа."""
+        log = self.log.bind(symbol=symbol)
+        log.info(f"Fetching balance for {symbol}...")
+        balance_data = await self.get_balances()
+        if balance_data is None:
+            return None
+
+        for item in balance_data:
+            if item["symbol"] == symbol:
+                free_balance = float(item["free"])
+                log.info(f"Balance for {symbol}: {free_balance}")
+                return free_balance
+        log.error(f"Symbol {symbol} not found in balance data.")
+        return None
+
+    def _count_submit(self, outcome):
+        if self.metrics is not None:
+            self.metrics.inc("arkham_order_submits_total", help_text="Выставления ордеров по итогу", outcome=outcome)
+
+    async def _place_once(self, body):
+        """Одна попытка /orders/new со сроком order_timeout: (PLACED, ответ) / (REJECTED, причина) / (UNKNOWN, причина)."""
+        started = time.monotonic()
+        try:
+            status, data = await self._request("POST", "/orders/new", body=body, timeout=self.order_timeout)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return UNKNOWN, f"{type(e).__name__} {e}".strip()
+        if status == 200 and isinstance(data, dict) and "orderId" in data:
+            if self.order_latency is not None:
+                self.order_latency.observe(time.monotonic() - started)
+            return PLACED, data
+        # 5xx и отказ из-за занятого clientOrderId не значат, что ордера нет
+        if status >= 500 or is_duplicate_client_id(status, data):
+            return UNKNOWN, f"{status} - {data}"
+        return REJECTED, f"{status} - {data}"
+
+    async def _check_hedge(self, other, kept, log):
+        """Вторая попытка пары тоже выставила ордер (биржа не отсеяла повтор clientOrderId) - снимаем лишний."""
+        outcome, data = await other
+        if outcome == PLACED and str(data["orderId"]) != str(kept["orderId"]):
+            log.error(f"Hedged attempt created a second order {data['orderId']} for {kept['clientOrderId']}, cancelling it")
+            self._count_submit("duplicate_cancelled")
+            await self.cancel_order(data["orderId"])
+
+    async def _place_hedged(self, body, log):
+        """Первая попытка, а если она дольше перцентиля недавних выставлений - вторая с тем же телом.
+        Возвращается первый успешный ответ; за оставшейся попыткой следит _check_hedge."""
+        primary = asyncio.ensure_future(self._place_once(body))
+        threshold = self.order_latency.percentile(self.order_hedge_percentile) if self.order_hedge_percentile and self.order_latency else None
+        if threshold is None:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=threshold)
+        if done:
+            return primary.result()
+
+        log.warning(f"Order {body['clientOrderId']} slower than p{self.order_hedge_percentile:g} ({threshold * 1000:.0f} ms), sending a hedged attempt")
+        self._count_submit("hedged")
+        hedge = asyncio.ensure_future(self._place_once(body))
+        pending = {primary, hedge}
+        result = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                outcome = task.result()
+                if outcome[0] == PLACED:
+                    # обе попытки могли выставить ордер в одной итерации - проверяется каждая, а не только оставшаяся
+                    for other in (done | pending) - {task}:
+                        check = asyncio.ensure_future(self._check_hedge(other, outcome[1], log))
+                        self._hedges.add(check)
+                        check.add_done_callback(self._hedges.discard)
+                    return outcome
+            for task in done:
+                # неизвестный исход важнее отказа: вторая попытка могла получить отказ (например, по балансу)
+                # как раз потому, что первая уже выставила ордер - create_order поищет его по clientOrderId
+                if result is None or task.result()[0] == UNKNOWN:
+                    result = task.result()
+        return result
+
+    async def create_order(self, price, size, side, symbol, type, subaccount_id=0, post_only=False, client_order_id=None):
+        """Выставить ордер со сроком на каждую попытку. Все попытки (и хеджированная) идут с одним clientOrderId;
+        при неизвестном исходе ордер сначала ищется на бирже, и повтор уходит, только если его там нет."""
+        log = self.log.bind(symbol=symbol)
+        quantized = self._quantize_order(price, size, side, symbol, type)
+        if quantized is None:
+            log.error(f"Order {side} {size} {symbol} at {price} is below tick, lot size or min notional")
+            return None
+        price, size = quantized
+        body = self._order_body(price, size, side, symbol, type, subaccount_id, post_only, client_order_id)
+        client_order_id = body["clientOrderId"]
+
+        log.info(f"Creating order for {side}: {size} {symbol} at {body['price']}. {type}")
+        for attempt in range(1, self.order_attempts + 1):
+            outcome, data = await (self._place_hedged(body, log) if attempt == 1 else self._place_once(body))
+            if outcome == PLACED:
+                log.info(f"Order created successfully: {data}")
+                self._count_submit("placed" if attempt == 1 else "retried")
+                return data
+            if outcome == REJECTED:
+                log.error(f"Error creating order: {data}")
+                self._count_submit("rejected")
+                return None
+
+            found = await self.get_order_by_client_id(client_order_id)
+            if found is None:
+                # без ответа биржи повтор может стать дублем; если ордер дошел, его подберет _adopt_resting_orders
+                log.error(f"Order {client_order_id} outcome unknown ({data}), not retrying to avoid a duplicate")
+                self._count_submit("unknown")
+                return None
+            if found != ORDER_NOT_FOUND:
+                log.info(f"Order {client_order_id} was placed despite {data}: {found.get('orderId')}")
+                self._count_submit("found")
+                return {"orderId": found["orderId"], "clientOrderId": client_order_id}
+            log.warning(f"Order {client_order_id} not placed ({data}), attempt {attempt}/{self.order_attempts}")
+            if attempt < self.order_attempts:
+                await asyncio.sleep(min(0.5 * attempt, 2))
+
+        log.error(f"Error creating order: {self.order_attempts} attempts failed")
+        self._count_submit("failed")
+        return None
+
+    async def cancel_orders(self):
+        body = {
+            "subaccountId": 0,
+            "timeToCancel": 0
+        }
+
+        self.log.info(f"Canceling all open orders..")
+        status, data = await self._request("POST", "/orders/cancel/all", body=body)
+
+        if status == 200:
+            self.log.info(f"Orders cancelled successfully: {data}")
+            return data
+        else:
+            self.log.error(f"Error cancelling orders: {status} - {data}")
+            return None
+
+    async def cancel_order(self, order_id, subaccount_id=0):
+        body = {
+            "orderId": order_id,
+            "subaccountId": subaccount_id
+        }
+
+        self.log.info(f"Canceling order {order_id}..")
+        status, data = await self._request("POST", "/orders/cancel", body=body)
+
+        if status == 200:
+            self.log.info(f"Order {order_id} cancelled successfully: {data}")
+            return data
+        else:
+            self.log.error(f"Error cancelling order {order_id}: {status} - {data}")
+            return None
+
+    async def get_trading_volume(self):
+        self.log.info("Fetching trading volume...")
+        status, data = await self._request("GET", "/affiliate-dashboard/trading-volume-stats")
+        if status == 200:
+            return self._parse_trading_volume(data)
+        else:
+            self.log.error(f"Error fetching trading volume: {status} - {data}")
+            return 0
+
+    async def get_instruments(self):
+        """Метаданные спотовых пар и перпетуалов: шаг цены, лот, минимальный объем."""
+        results = await asyncio.gather(*(self._request("GET", path) for path in ("/public/pairs", "/public/contracts")))
+        instruments = []
+        for path, (status, data) in zip(("/public/pairs", "/public/contracts"), results):
+            if status == 200:
+                instruments.extend(data or [])
+            else:
+                self.log.error(f"Error fetching {path}: {status} - {data}")
+        return instruments
+
+    async def get_tickers(self):
+        self.log.info("Fetching tickers...")
+        status, data = await self._request("GET", "/public/tickers")
+        if status == 200:
+            return data
+        else:
+            self.log.error(f"Error fetching tickers: {status} - {data}")
+            return 0
@@ -0,0 +1,139 @@
+import heapq
+import asyncio
+import itertools
+from loguru import logger
+from src.RateLimiter import RateLimiter
+
+
+class _AccountSlot:
+    __slots__ = ("bot", "due", "cycles")
+
+    def __init__(self, bot, due):
+        self.bot = bot
+        self.due = due
+        self.cycles = 0
+
+
+class CycleScheduler:
+    """Циклы всех ботов процесса без долгоживущей корутины на аккаунт.
+
+    Аккаунты лежат в куче по времени следующего цикла, один диспетчер отдает
+    наступившие циклы фиксированному пулу воркеров. Воркер занят только до отправки
+    ордера: бот (defer_fills) отдает ордер движку и возвращает задачу его ожидания через take_awaiting,
+    а слот возвращается в кучу, когда все они завершатся. Если в лимитере копится
+    очередь ожидающих запросов, новые циклы не запускаются, пока она не рассосется.
+    """
+
+    def __init__(self, workers=100, limiter: RateLimiter = None, max_queued=50, backpressure_delay=0.5, error_delay=10):
+        self.workers = workers
+        self.limiter = limiter
+        self.max_queued = max_queued
+        self.backpressure_delay = backpressure_delay
+        self.error_delay = error_delay
+        self._heap = []
+        self._seq = itertools.count()
+        self._queue = None
+        self._wakeup = None
+        self._done = None
+        self._active = 0
+        self._admitting = True
+        self.busy = 0
+        self.waiting = 0
+        self.stats = {"cycles": 0, "deferred": 0, "deferred_seconds": 0.0, "errors": 0}
+
+    def _push(self, slot, delay):
+        slot.due = asyncio.get_running_loop().time() + delay
+        heapq.heappush(self._heap, (slot.due, next(self._seq), slot))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def add(self, bot, delay=0):
+        """Поставить бота в расписание; вызывать внутри работающего event loop."""
+        self._active += 1
+        self._push(_AccountSlot(bot, 0.0), delay)
+
+    def _park(self, slot, awaiting, delay):
+        """Ордера цикла у движка: слот встанет в расписание через delay после завершения последнего из них."""
+        self.waiting += 1
+
+        def resume(_):
+            self.waiting -= 1
+            self._push(slot, delay)
+
+        asyncio.gather(*awaiting, return_exceptions=True).add_done_callback(resume)
+
+    def finish_admission(self):
+        """Новых ботов больше не будет: run() завершится, когда закончат оставшиеся."""
+        self._admitting = False
+        if self._active <= 0 and self._done is not None:
+            self._done.set()
+
+    def _saturated(self):
+        return self.limiter is not None and self.max_queued and self.limiter.queued >= self.max_queued
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if self._heap and self._heap[0][0] <= now:
+                if self._saturated():
+                    # API уже не успевает - придерживаем циклы, а не копим запросы в лимитере
+                    self.stats["deferred"] += 1
+                    self.stats["deferred_seconds"] += self.backpressure_delay
+                    await asyncio.sleep(self.backpressure_delay)
+                    continue
+                _, _, slot = heapq.heappop(self._heap)
+                # очередь размером с пул: пока все воркеры заняты, диспетчер ждет здесь
+                await self._queue.put(slot)
+                continue
+
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        while True:
+            slot = await self._queue.get()
+            self.busy += 1
+            try:
+                delay = await slot.bot.run_cycle()
+            except Exception as e:
+                logger.error(f"Ошибка цикла бота: {e}")
+                self.stats["errors"] += 1
+                delay = self.error_delay
+            finally:
+                self.busy -= 1
+            slot.cycles += 1
+            self.stats["cycles"] += 1
+
+            if delay is None:
+                self._active -= 1
+                if self._active <= 0 and not self._admitting:
+                    self._done.set()
+            elif awaiting := slot.bot.take_awaiting():
+                self._park(slot, awaiting, delay)
+            else:
+                self._push(slot, delay)
+
+    def snapshot(self):
+        return {**self.stats, "scheduled": len(self._heap), "busy": self.busy, "waiting": self.waiting, "active": self._active}
+
+    async def run(self):
+        """Работать, пока все боты не наберут объем или пока таск не отменят."""
+        self._queue = asyncio.Queue(maxsize=self.workers)
+        self._wakeup = asyncio.Event()
+        self._done = asyncio.Event()
+        if self._active <= 0 and not self._admitting:
+            return
+
+        tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        tasks.append(asyncio.ensure_future(self._dispatch()))
+        try:
+            await self._done.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
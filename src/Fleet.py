@@ -0,0 +1,295 @@
+import time
+import asyncio
+from loguru import logger
+from src.AsyncArkhamAPI import AsyncArkhamAPI
+from src.VolumePumpBot import VolumePumpBot, DEFAULT_FEE_RATES
+from src.MarketDataCache import MarketDataCache
+from src.StreamFeed import StreamFeed
+from src.OrderStore import OrderStore
+from src.OrderEngine import OrderEngine
+from src.AccountState import AccountState, DEFAULT_TTLS
+from src.Metrics import Metrics
+from src.CycleScheduler import CycleScheduler
+from src.SymbolSelector import SymbolSelector
+from src.InstrumentCache import InstrumentCache
+from src.Reconciler import Reconciler
+from src.TickRecorder import TickRecorder
+from src.Profiler import Profiler
+from src.RateLimiter import RateLimiter, LatencyTracker, TokenBucket
+
+class Fleet:
+    """Все боты одного event loop с общими кэшем цен, хранилищем, движком ордеров и лимитером."""
+
+    def __init__(self, accounts, config, symbols, db_path="orders.db"):
+        self.accounts = accounts
+        self.config = config
+        self.symbols = symbols
+        self.db_path = db_path
+        self.store = None
+        self.engine = None
+        self.limiter = None
+        self.order_latency = None
+        self.market_data = None
+        self.metrics = None
+        self.scheduler = None
+        self.selector = None
+        self.instruments = None
+        self.recorder = None
+        self.profiler = None
+        self.feeds = []
+        self.apis = []
+        self.bots = []
+        self.started_at = None
+        self.admitted_at = None
+        self.first_order_at = None
+        self._public_api = None
+        self._ticker_feed = None
+        self._account_state_ttls = None
+        self._fee_rates = None
+        self._running = False
+        self._tasks = []
+        self._closed = False
+
+    def build(self):
+        """Общие компоненты процесса. Боты создаются позже, по мере допуска аккаунтов."""
+        config = self.config
+        # объединяем с умолчаниями один раз, чтобы аккаунты делили один словарь
+        self._account_state_ttls = {**DEFAULT_TTLS, **config["account_state_ttls"]} if config.get("account_state_ttls") else None
+        self._fee_rates = {**DEFAULT_FEE_RATES, **(config.get("fee_rates") or {})}
+        self.limiter = RateLimiter(config.get("rate_limits"), max_retries=config.get("max_retries", 3))
+        # задержки выставления всех аккаунтов - по ним порог хеджированной попытки
+        self.order_latency = LatencyTracker()
+        self.store = OrderStore(self.db_path)
+        self.engine = OrderEngine(limit_hold_time=config["limit_hold_time"])
+        self.metrics = Metrics(account_histograms=bool(config.get("metrics_account_histograms", 0)))
+        self.metrics.add_collector(self._collect_metrics)
+        self.profiler = Profiler(config.get("profile_dir", "profiles"), config.get("slow_callback_ms", 100))
+        self.metrics.add_collector(self.profiler.collect)
+        for route in self.profiler.routes():
+            self.metrics.add_route(*route)
+
+        scheduler_workers = config.get("scheduler_workers", 0)
+        if scheduler_workers:
+            self.scheduler = CycleScheduler(
+                workers=scheduler_workers,
+                limiter=self.limiter,
+                max_queued=config.get("scheduler_max_queued", 50)
+            )
+
+        # один кэш цен на весь процесс, публичные запросы идут через первый аккаунт
+        self._public_api = self._make_api(self.accounts[0])
+        if config.get("tick_recorder"):
+            self.recorder = TickRecorder(config["tick_recorder"], symbols=self.symbols)
+        self.market_data = MarketDataCache(self._public_api, ttl=config.get("price_cache_ttl", 3), recorder=self.recorder)
+        self.instruments = InstrumentCache(
+            self._public_api,
+            path=config.get("instruments_cache", "instruments.json"),
+            ttl=config.get("instruments_ttl", 86400),
+            fallback=self.symbols
+        )
+        self._public_api.instruments = self.instruments
+        if config.get("symbol_selection", "liquidity") == "liquidity":
+            # вход и выход - лимитки, издержки символа считаются по той же ставке maker, что и учет комиссий
+            self.selector = SymbolSelector(
+                self.market_data, self.symbols, limit_hold_time=config["limit_hold_time"], fee_rate=self._fee_rates["maker"]
+            )
+        if config.get("use_websocket", 0):
+            self._ticker_feed = StreamFeed(self._public_api, market_data=self.market_data)
+            self.feeds.append(self._ticker_feed)
+        return self
+
+    def _make_api(self, account):
+        proxies = None
+        if account["proxy"]:
+            proxies = {
+                "http": f"http://{account['proxy']}",
+                "https": f"http://{account['proxy']}"
+            }
+
+        api = AsyncArkhamAPI(
+            account['api_key'],
+            account['api_secret'],
+            proxies=proxies,
+            pool_limit=self.config.get("http_pool_limit", 10),
+            timeout=self.config.get("http_timeout", 15),
+            limiter=self.limiter,
+            metrics=self.metrics,
+            alias=account.get("alias"),
+            order_timeout=self.config.get("order_timeout", 5),
+            order_attempts=self.config.get("order_attempts", 3),
+            order_hedge_percentile=self.config.get("order_hedge_percentile", 0),
+            order_latency=self.order_latency
+        )
+        api.instruments = self.instruments
+        return api
+
+    def make_bot(self, account):
+        """Клиент, стрим ордеров и бот одного аккаунта."""
+        config = self.config
+        api = self._public_api if account is self.accounts[0] else self._make_api(account)
+        self.apis.append(api)
+
+        # приватный канал ордеров авторизуется ключом, поэтому соединение на аккаунт
+        order_feed = None
+        if config.get("use_websocket", 0):
+            order_feed = StreamFeed(api, authenticated=True)
+            self.feeds.append(order_feed)
+            if self._running:
+                order_feed.start()
+
+        bot = VolumePumpBot(
+            api=api,
+            symbols=self.symbols,
+            spot_target_volume=config["spot_target_volume"],
+            perp_target_volume=config["perp_target_volume"],
+            max_check_price=config["max_check_price"],
+            slippage=config["slippage"],
+            is_perpetual=config["is_perpetual"],
+            leverage=config["leverage"],
+            hold_time=config["hold_time"],
+            limit_order_diff=config["limit_order_diff"],
+            limit_hold_time=config["limit_hold_time"],
+            store=self.store,
+            market_data=self.market_data,
+            # в режиме планировщика ботов не будят по тикерам: очередь на бота стоит дороже пробуждения
+            ticker_feed=self._ticker_feed if self.scheduler is None else None,
+            order_feed=order_feed,
+            engine=self.engine,
+            account_state=AccountState(api, self._account_state_ttls),
+            metrics=self.metrics,
+            selector=self.selector,
+            on_order_placed=self._on_order_placed,
+            fee_rates=self._fee_rates,
+            max_positions=config.get("max_positions", 1),
+            position_allocation=config.get("position_allocation", 0),
+            max_position_notional=config.get("max_position_notional", 0),
+            defer_fills=self.scheduler is not None
+        )
+        self.bots.append(bot)
+        return bot
+
+    def _on_order_placed(self, bot):
+        if self.first_order_at is None:
+            self.first_order_at = time.monotonic()
+            logger.info(f"Первый ордер выставлен через {self.first_order_at - self.started_at:.1f}с после старта")
+
+    async def _admit(self):
+        """Аккаунты входят в работу постепенно: токены на startup_ramp_seconds, пауза, пока лимитер не успевает."""
+        config = self.config
+        ramp = config.get("startup_ramp_seconds", 30)
+        bucket = TokenBucket(len(self.accounts) / ramp, config.get("startup_burst", 10)) if ramp > 0 else None
+        max_queued = config.get("scheduler_max_queued", 50)
+
+        for account in self.accounts:
+            if bucket is not None:
+                wait = bucket.reserve()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            while max_queued and self.limiter.queued >= max_queued:
+                await asyncio.sleep(0.5)
+
+            bot = self.make_bot(account)
+            if self.scheduler is not None:
+                self.scheduler.add(bot)
+            else:
+                self._tasks.append(asyncio.ensure_future(bot.run()))
+
+        if self.scheduler is not None:
+            self.scheduler.finish_admission()
+        self.admitted_at = time.monotonic()
+        logger.info(f"Все {len(self.accounts)} аккаунтов запущены за {self.admitted_at - self.started_at:.1f}с")
+
+    async def reconcile(self):
+        """Сверка базы с биржей до запуска торговли; клиенты сверки закрываются сразу после своих запросов."""
+        reconciler = Reconciler(
+            self.store, self._make_api, self.symbols,
+            concurrency=self.config.get("reconcile_concurrency", 50)
+        )
+        report = await reconciler.run(self.accounts)
+        for item in report:
+            self.metrics.inc("arkham_reconcile_discrepancies_total", help_text="Расхождения базы и биржи при старте", kind=item["kind"])
+        return report
+
+    def progress(self):
+        return {
+            "bots": len(self.accounts),
+            "admitted": len(self.bots),
+            "finished": sum(bot.finished for bot in self.bots),
+            "spot_volume": sum(bot.spot_volume for bot in self.bots),
+            "perp_volume": sum(bot.perp_volume for bot in self.bots)
+        }
+
+    def _collect_metrics(self, metrics):
+        progress = self.progress()
+        metrics.set("arkham_fleet_bots", progress["bots"], help_text="Ботов в процессе")
+        metrics.set("arkham_fleet_finished", progress["finished"], help_text="Ботов, набравших целевой объем")
+        metrics.set("arkham_fleet_admitted", progress["admitted"], help_text="Аккаунтов, допущенных к работе")
+        if self.first_order_at is not None:
+            metrics.set("arkham_startup_first_order_seconds", self.first_order_at - self.started_at, help_text="От старта до первого ордера")
+        if self.admitted_at is not None:
+            metrics.set("arkham_startup_ramp_seconds", self.admitted_at - self.started_at, help_text="От старта до допуска всех аккаунтов")
+        for key, value in self.limiter.snapshot().items():
+            if key in ("queued", "buckets"):
+                metrics.set(f"arkham_limiter_{key}", value, help_text="Состояние лимитера запросов")
+            else:
+                metrics.set_counter(f"arkham_limiter_{key}_total", value, help_text="Статистика лимитера запросов")
+        if self.scheduler is not None:
+            for key, value in self.scheduler.snapshot().items():
+                if key in ("scheduled", "busy", "waiting", "active"):
+                    metrics.set(f"arkham_scheduler_{key}", value, help_text="Состояние планировщика циклов")
+                else:
+                    metrics.set_counter(f"arkham_scheduler_{key}_total", value, help_text="Статистика планировщика циклов")
+
+    async def run(self):
+        """Работать, пока все боты не наберут объем или пока таск не отменят."""
+        config = self.config
+        self.started_at = time.monotonic()
+        await self.metrics.start(
+            port=config.get("metrics_port", 0),
+            snapshot_path=config.get("metrics_snapshot"),
+            snapshot_interval=config.get("metrics_snapshot_interval", 60)
+        )
+        self.profiler.install_signals()
+        await self.instruments.load()
+        if config.get("reconcile_on_start", 1):
+            await self.reconcile()
+        for feed in self.feeds:
+            feed.start()
+        self._running = True
+
+        # задачи ботов _admit добавляет в self._tasks по мере допуска
+        self._tasks = [asyncio.ensure_future(self._admit())]
+        if self.scheduler is not None:
+            self._tasks.append(asyncio.ensure_future(self.scheduler.run()))
+        try:
+            await self._tasks[0]
+            await asyncio.gather(*self._tasks[1:])
+        finally:
+            await self.shutdown(cancel_orders=any(not task.done() or task.cancelled() for task in self._tasks))
+
+    async def shutdown(self, cancel_orders=True):
+        """Остановить ботов и, если нужно, снять все выставленные ордера аккаунтов."""
+        if self._closed:
+            return
+        self._closed = True
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # в режиме планировщика задачи позиций не принадлежат таскам ботов
+        await asyncio.gather(*(bot.close() for bot in self.bots))
+        await self.engine.close()
+
+        if cancel_orders:
+            logger.info(f"Отмена открытых ордеров на {len(self.apis)} аккаунтах...")
+            results = await asyncio.gather(*(api.cancel_orders() for api in self.apis), return_exceptions=True)
+            for api, result in zip(self.apis, results):
+                if isinstance(result, Exception) or result is None:
+                    api.log.error(f"Не удалось отменить ордера аккаунта: {result}")
+
+        await asyncio.gather(*(feed.close() for feed in self.feeds))
+        await asyncio.gather(*(api.close() for api in self.apis))
+        await self.store.close()
+        self.profiler.close()
+        await self.metrics.close()
+        if self.recorder is not None:
+            self.recorder.close()
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import asyncio
+import aiohttp
+from decimal import Decimal, ROUND_FLOOR, ROUND_CEILING
+from loguru import logger
+
+# шаг цены по умолчанию, если биржа не отдала метаданные (как раньше - 2 знака)
+DEFAULT_TICK = "0.01"
+
+
+class Instrument:
+    """Шаг цены, лот и минимальный объем пары с заранее построенными Decimal-квантователями."""
+
+    __slots__ = ("symbol", "tick", "lot", "min_notional")
+
+    def __init__(self, symbol, tick, lot, min_notional="0"):
+        self.symbol = symbol
+        self.tick = Decimal(str(tick))
+        self.lot = Decimal(str(lot))
+        self.min_notional = Decimal(str(min_notional or "0"))
+
+    @staticmethod
+    def _quantize(value, step, rounding):
+        value = value if isinstance(value, Decimal) else Decimal(str(value))
+        return ((value / step).to_integral_value(rounding) * step).quantize(step)
+
+    def price(self, price, side="buy"):
+        """Покупка округляется вниз, продажа вверх: лимитка не становится агрессивнее расчетной."""
+        return self._quantize(price, self.tick, ROUND_CEILING if side == "sell" else ROUND_FLOOR)
+
+    def size(self, size):
+        return self._quantize(size, self.lot, ROUND_FLOOR)
+
+    def meets_min_notional(self, price, size):
+        return Decimal(str(price)) * Decimal(str(size)) >= self.min_notional
+
+    def to_dict(self):
+        return {"symbol": self.symbol, "tick": str(self.tick), "lot": str(self.lot), "min_notional": str(self.min_notional)}
+
+
+def _parse_pair(item):
+    symbol = item.get("symbol")
+    tick = item.get("minTickPrice") or item.get("tickSize")
+    lot = item.get("minLotSize") or item.get("lotSize")
+    if not symbol or not tick or not lot:
+        return None
+    return Instrument(symbol, tick, lot, item.get("minNotional") or "0")
+
+
+class InstrumentCache:
+    """Метаданные всех пар с биржи: загружаются один раз и хранятся на диске с TTL для быстрых перезапусков.
+
+    fallback - словарь символов из main.py: его rounding_step используется как лот,
+    если биржа пару не вернула.
+    """
+
+    def __init__(self, api, path="instruments.json", ttl=86400, fallback=None):
+        self.api = api
+        self.path = path
+        self.ttl = ttl
+        self.fallback = fallback or {}
+        self._instruments = {}
+
+    def _read_disk(self, stale=False):
+        """Пары из файла; устаревшие - только при stale (биржа недоступна)."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not stale and time.time() - data.get("fetched_at", 0) >= self.ttl:
+            return None
+        return data.get("instruments")
+
+    def _write_disk(self, instruments):
+        # несколько шардов могут писать одновременно - пишем во временный файл и атомарно заменяем
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"fetched_at": time.time(), "instruments": [item.to_dict() for item in instruments]}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить кэш инструментов {self.path}: {e}")
+
+    async def load(self):
+        cached = self._read_disk()
+        if cached is not None:
+            instruments = [Instrument(**item) for item in cached]
+            logger.info(f"Метаданные {len(instruments)} пар загружены из {self.path}")
+        else:
+            try:
+                items = await self.api.get_instruments()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Ошибка загрузки метаданных пар: {e}")
+                items = None
+            instruments = [instrument for instrument in map(_parse_pair, items or []) if instrument is not None]
+            if instruments:
+                self._write_disk(instruments)
+                logger.info(f"Метаданные {len(instruments)} пар получены с биржи")
+            elif (stale := self._read_disk(stale=True)) is not None:
+                instruments = [Instrument(**item) for item in stale]
+                logger.warning(f"Биржа не вернула метаданные пар, используется устаревший кэш {self.path} ({len(instruments)} пар)")
+            else:
+                logger.warning("Биржа не вернула метаданные пар, используются rounding_step из настроек")
+        self._instruments = {instrument.symbol: instrument for instrument in instruments}
+        return self
+
+    def get(self, symbol):
+        instrument = self._instruments.get(symbol)
+        if instrument is None and symbol in self.fallback:
+            instrument = self._instruments[symbol] = Instrument(symbol, DEFAULT_TICK, self.fallback[symbol]["rounding_step"])
+        return instrument
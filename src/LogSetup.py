@@ -0,0 +1,36 @@
+import os
+import sys
+from loguru import logger
+
+TEXT_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "<cyan>{extra[account]}</cyan> | {extra[symbol]} | {message}"
+)
+
+
+def setup_logging(config=None, suffix=None):
+    """Единственная настройка логов процесса: консоль и файл, запись в фоновом потоке.
+
+    Экземпляры не добавляют своих sink'ов, а привязывают контекст через logger.bind(account=..., symbol=...),
+    поэтому стоимость строки не зависит от числа аккаунтов. suffix отделяет файлы шардов супервизора.
+    """
+    config = config or {}
+    level = config.get("log_level", "INFO")
+    log_dir = config.get("log_dir", "logs")
+    as_json = config.get("log_json", 0)
+
+    logger.remove()
+    logger.configure(extra={"account": "-", "symbol": "-"})
+    logger.add(sys.stderr, level=level, format=TEXT_FORMAT, enqueue=True)
+
+    os.makedirs(log_dir, exist_ok=True)
+    name = f"bot.{suffix}" if suffix is not None else "bot"
+    logger.add(
+        os.path.join(log_dir, f"{name}.jsonl" if as_json else f"{name}.log"),
+        level=level,
+        format=TEXT_FORMAT,
+        serialize=bool(as_json),
+        rotation="1 day",
+        enqueue=True,
+        colorize=False
+    )
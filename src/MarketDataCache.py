@@ -0,0 +1,87 @@
+import time
+import asyncio
+from loguru import logger
+
+class MarketDataCache:
+    """Общий для всех ботов процесса кэш тикеров с TTL и объединением одновременных запросов."""
+
+    def __init__(self, api, ttl=3, recorder=None):
+        self.api = api
+        self.ttl = ttl
+        self.recorder = recorder
+        self._tickers = {}
+        self._inflight = {}
+        self.refreshed_at = 0.0
+
+    def update(self, ticker):
+        """Положить в кэш свежий тикер (словарь с ключами symbol/price)."""
+        if ticker and "symbol" in ticker:
+            self._tickers[ticker["symbol"]] = (ticker, time.monotonic())
+            # сюда сходятся REST и стрим, поэтому записываем тики здесь
+            if self.recorder is not None:
+                self.recorder.record(ticker)
+
+    def get_cached_ticker(self, symbol):
+        entry = self._tickers.get(symbol)
+        if entry and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        return None
+
+    def _coalesce(self, key, factory):
+        """Один запрос в полете на ключ: остальные ждут тот же результат."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: отмена одного ожидающего не отменяет общий запрос
+        return asyncio.shield(task)
+
+    async def _fetch_tickers(self):
+        tickers = await self.api.get_tickers()
+        if not tickers:
+            return False
+        for ticker in tickers:
+            self.update(ticker)
+        self.refreshed_at = time.monotonic()
+        logger.debug(f"Ticker cache refreshed: {len(tickers)} symbols")
+        return True
+
+    async def _fetch_ticker(self, symbol):
+        price = await self.api.get_market_price(symbol)
+        if price is None:
+            return None
+        ticker = {"symbol": symbol, "price": price}
+        self.update(ticker)
+        return ticker
+
+    async def refresh(self):
+        """Массовое обновление кэша одним запросом /public/tickers."""
+        return await self._coalesce("*", self._fetch_tickers)
+
+    async def refresh_if_stale(self):
+        """Массовый снимок не чаще раза в ttl на весь процесс, сколько бы ботов ни спрашивало."""
+        if time.monotonic() - self.refreshed_at >= self.ttl:
+            await self.refresh()
+
+    def get_cached_tickers(self, symbols):
+        return {symbol: ticker for symbol in symbols if (ticker := self.get_cached_ticker(symbol)) is not None}
+
+    async def get_ticker(self, symbol):
+        ticker = self.get_cached_ticker(symbol)
+        if ticker is not None:
+            return ticker
+
+        await self.refresh()
+        ticker = self.get_cached_ticker(symbol)
+        if ticker is not None:
+            return ticker
+
+        # Символа нет в массовом ответе - запрашиваем отдельно
+        return await self._coalesce(symbol, lambda: self._fetch_ticker(symbol))
+
+    async def get_price(self, symbol):
+        ticker = await self.get_ticker(symbol)
+        if not ticker or ticker.get("price") is None:
+            return None
+        return float(ticker["price"])
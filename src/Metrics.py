@@ -0,0 +1,251 @@
+import os
+import re
+import json
+import time
+import bisect
+import asyncio
+from aiohttp import web
+from loguru import logger
+
+REQUEST_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FILL_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+# /orders/123 -> /orders/{id}: id ордера в метке плодил бы по серии на ордер
+ID_SEGMENT_RE = re.compile(r"/\d+(?=/|$)")
+
+
+def _escape(value, quote=True):
+    """Экранирование текстового формата Prometheus: в значениях меток \\, \" и перевод строки, в HELP - без кавычек."""
+    value = str(value).replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quote else value
+
+
+def _labels_text(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+def _format(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics:
+    """Метрики процесса: запросы к API, ордера, прогресс объема, лаг event loop.
+
+    Отдаются в формате Prometheus по /metrics, JSON по /metrics.json
+    и, если задан путь, периодически пишутся в JSON-файл. По аккаунтам - только счетчики и gauge:
+    гистограмма на аккаунт при тысячах аккаунтов - десятки тысяч серий, ее включает account_histograms.
+    """
+
+    def __init__(self, account_histograms=False):
+        self.account_histograms = account_histograms
+        self._types = {}
+        self._values = {}
+        self._collectors = []
+        self._routes = []
+        self._volume_start = {}
+        self._phases = {}
+        self._tasks = []
+        self._runner = None
+        self._snapshot_path = None
+        self.started_at = time.time()
+
+    def _series(self, kind, name, help_text):
+        if name not in self._types:
+            self._types[name] = (kind, help_text)
+            self._values[name] = {}
+        return self._values[name]
+
+    def inc(self, name, value=1, help_text="", **labels):
+        series = self._series("counter", name, help_text)
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+
+    def set_counter(self, name, value, help_text="", **labels):
+        """Счетчик, который накапливается в другом месте (например, в статистике лимитера)."""
+        self._series("counter", name, help_text)[tuple(sorted(labels.items()))] = value
+
+    def set(self, name, value, help_text="", **labels):
+        self._series("gauge", name, help_text)[tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, buckets=REQUEST_BUCKETS, help_text="", **labels):
+        series = self._series("histogram", name, help_text)
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def add_collector(self, callback):
+        """callback(metrics) вызывается перед каждой выгрузкой и обновляет gauge."""
+        self._collectors.append(callback)
+
+    def add_route(self, method, path, handler):
+        """Дополнительный обработчик на сервере метрик (например, управление профилированием); до start()."""
+        self._routes.append((method, path, handler))
+
+    def observe_request(self, path, status, seconds):
+        endpoint = ID_SEGMENT_RE.sub("/{id}", path.split("?")[0])
+        self.inc("arkham_requests_total", help_text="Запросы к Arkham API по эндпоинту и статусу", endpoint=endpoint, status=status)
+        self.observe("arkham_request_seconds", seconds, help_text="Время одной попытки запроса", endpoint=endpoint)
+        if status != 200:
+            self.inc("arkham_request_errors_total", help_text="Неуспешные попытки запроса", endpoint=endpoint)
+
+    def observe_order(self, account, side, state, seconds, requotes):
+        self.inc("arkham_orders_total", help_text="Завершенные ордера по итоговому статусу", account=account, side=side, state=state)
+        if requotes:
+            self.inc("arkham_order_requotes_total", requotes, help_text="Перевыставления зависших ордеров", account=account)
+        if state == "filled":
+            labels = {"account": account, "side": side} if self.account_histograms else {"side": side}
+            self.observe("arkham_order_fill_seconds", seconds, FILL_BUCKETS, help_text="От выставления до исполнения", **labels)
+
+    def set_volume(self, account, spot_volume, perp_volume, spot_target, perp_target):
+        """Объем, цель и скорость набора с момента первого замера в этом процессе."""
+        now = time.monotonic()
+        start = self._volume_start.setdefault(account, (now, spot_volume, perp_volume))
+        hours = (now - start[0]) / 3600
+        for market, volume, target, initial in (("spot", spot_volume, spot_target, start[1]), ("perp", perp_volume, perp_target, start[2])):
+            self.set("arkham_volume", volume, help_text="Набранный объем", account=account, market=market)
+            self.set("arkham_volume_target", target, help_text="Целевой объем", account=account, market=market)
+            if hours > 0:
+                self.set("arkham_volume_per_hour", (volume - initial) / hours, help_text="Скорость набора объема", account=account, market=market)
+
+    def set_phase(self, account, phase):
+        """Чем сейчас занят бот: по сумме фаз видно, ждет ли флот сети, исполнений или спит."""
+        self._phases[account] = phase
+
+    def _collect(self):
+        phases = {}
+        for phase in self._phases.values():
+            phases[phase] = phases.get(phase, 0) + 1
+        if "arkham_bots" in self._values:
+            # фазы пересчитываются целиком, исчезнувшие не должны висеть со старым значением
+            self._values["arkham_bots"] = {}
+        for phase, count in phases.items():
+            self.set("arkham_bots", count, help_text="Боты по текущей фазе", phase=phase)
+        for callback in self._collectors:
+            try:
+                callback(self)
+            except Exception as e:
+                logger.error(f"Ошибка сборщика метрик: {e}")
+
+    def render(self):
+        """Текстовый формат Prometheus."""
+        self._collect()
+        lines = []
+        for name, (kind, help_text) in self._types.items():
+            if help_text:
+                lines.append(f"# HELP {name} {_escape(help_text, quote=False)}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in self._values.get(name, {}).items():
+                if kind == "histogram":
+                    for bound, total in value.cumulative():
+                        lines.append(f"{name}_bucket{_labels_text(labels, ('le', _format(bound)))} {total}")
+                    lines.append(f"{name}_sum{_labels_text(labels)} {_format(value.sum)}")
+                    lines.append(f"{name}_count{_labels_text(labels)} {value.count}")
+                else:
+                    lines.append(f"{name}{_labels_text(labels)} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        self._collect()
+        result = {"time": time.time(), "uptime": time.time() - self.started_at}
+        for name, (kind, _) in self._types.items():
+            series = []
+            for labels, value in self._values.get(name, {}).items():
+                item = dict(labels)
+                if kind == "histogram":
+                    item.update(count=value.count, sum=value.sum, buckets={_format(bound): total for bound, total in value.cumulative()})
+                else:
+                    item["value"] = value
+                series.append(item)
+            result[name] = series
+        return result
+
+    async def _monitor_loop(self, interval=0.5):
+        """Насколько позже запланированного просыпается event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - started - interval)
+            self.observe("arkham_loop_lag_seconds", lag, LAG_BUCKETS, help_text="Задержка пробуждения event loop")
+            self.set("arkham_loop_lag_last_seconds", lag, help_text="Последний замер задержки event loop")
+
+    def _write_snapshot(self, path, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    async def _dump_loop(self, path, interval):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(None, self._write_snapshot, path, self.snapshot())
+            except OSError as e:
+                logger.error(f"Не удалось записать снимок метрик {path}: {e}")
+
+    async def _handle_metrics(self, request):
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8", headers={"X-Content-Type-Options": "nosniff"})
+
+    async def _handle_json(self, request):
+        return web.json_response(self.snapshot())
+
+    async def start(self, port=0, host="127.0.0.1", snapshot_path=None, snapshot_interval=60):
+        """Лаг loop меряется всегда; HTTP-сервер - если задан port, JSON-снимки - если задан путь."""
+        self._snapshot_path = snapshot_path
+        self._tasks.append(asyncio.ensure_future(self._monitor_loop()))
+        if snapshot_path:
+            self._tasks.append(asyncio.ensure_future(self._dump_loop(snapshot_path, snapshot_interval)))
+        if port:
+            app = web.Application()
+            app.router.add_get("/metrics", self._handle_metrics)
+            app.router.add_get("/metrics.json", self._handle_json)
+            for method, path, handler in self._routes:
+                app.router.add_route(method, path, handler)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            try:
+                await web.TCPSite(self._runner, host, port).start()
+                logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+            except OSError as e:
+                logger.error(f"Не удалось открыть порт метрик {port}: {e}")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._snapshot_path:
+            try:
+                self._write_snapshot(self._snapshot_path, self.snapshot())
+            except OSError as e:
+                logger.error(f"Не удалось записать снимок метрик {self._snapshot_path}: {e}")
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
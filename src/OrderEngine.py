@@ -0,0 +1,311 @@
+import time
+import asyncio
+from loguru import logger
+from src.ArkhamAPI import ORDER_NOT_FOUND
+
+class OrderState:
+    NEW = "new"
+    RESTING = "resting"
+    PARTIALLY_FILLED = "partially_filled"
+    FILLED = "filled"
+    CANCELLED = "cancelled"
+    REPLACED = "replaced"
+
+    TERMINAL = (FILLED, CANCELLED, REPLACED)
+
+
+class TrackedOrder:
+    """Живой ордер под наблюдением движка. Перевыставленные ордера делят общий future done."""
+
+    __slots__ = (
+        "api", "order_id", "client_order_id", "symbol", "side", "size", "price", "order_type",
+        "state", "filled_size", "avg_price", "placed_at", "requotes", "cancel_requested",
+        "reprice", "on_replace", "on_fill", "done"
+    )
+
+    def __init__(self, api, order_id, client_order_id, symbol, side, size, price, order_type, reprice, on_replace, done, on_fill=None):
+        self.api = api
+        self.order_id = order_id
+        self.client_order_id = client_order_id
+        self.symbol = symbol
+        self.side = side
+        self.size = size
+        self.price = price
+        self.order_type = order_type
+        self.state = OrderState.NEW
+        self.filled_size = 0.0
+        self.avg_price = None
+        self.placed_at = time.monotonic()
+        self.requotes = 0
+        self.cancel_requested = False
+        self.reprice = reprice
+        self.on_replace = on_replace
+        self.on_fill = on_fill
+        self.done = done
+
+
+class _Account:
+    __slots__ = ("api", "orders", "next_poll", "feed", "polling")
+
+    def __init__(self, api):
+        self.api = api
+        self.orders = set()
+        self.next_poll = 0.0
+        self.feed = None
+        self.polling = False
+
+
+class OrderEngine:
+    """Машина состояний ордеров всех аккаунтов с одним планировщиком.
+
+    new -> resting -> partially_filled -> filled / cancelled / replaced.
+    Вместо цикла ожидания на каждый ордер один таск раз в tick опрашивает /orders
+    по одному запросу на аккаунт (реже, если подключен стрим) и перевыставляет
+    только конкретный зависший ордер через отмену по orderId.
+    """
+
+    def __init__(self, limit_hold_time=30, poll_interval=5, tick=1):
+        self.limit_hold_time = limit_hold_time
+        self.poll_interval = poll_interval
+        self.tick = tick
+        self._orders = {}
+        self._by_client_id = {}
+        self._accounts = {}
+        self._wakeup = None
+        self._task = None
+        self._jobs = set()
+
+    def _account(self, api):
+        account = self._accounts.get(api.api_key)
+        if account is None:
+            account = self._accounts[api.api_key] = _Account(api)
+        return account
+
+    def attach_feed(self, api, feed):
+        """Получать события ордеров аккаунта из стрима; опрос остается страховкой."""
+        self._account(api).feed = feed
+        feed.on_orders(self.on_order_event)
+
+    @staticmethod
+    def _log(order):
+        """Планировщик общий для всех аккаунтов, поэтому контекст берем из самого ордера."""
+        return order.api.log.bind(symbol=order.symbol)
+
+    def is_tracked(self, order_id):
+        return order_id in self._orders
+
+    def track(self, api, order_id, symbol, side, size, price, client_order_id=None, order_type="limitGtc", reprice=None, on_replace=None, on_fill=None):
+        """Взять ордер под наблюдение. reprice(symbol, side) -> новая цена для перевыставления,
+        on_fill(order) вызывается для каждого завершенного ордера цепочки с ненулевым исполнением."""
+        done = asyncio.get_running_loop().create_future()
+        order = TrackedOrder(api, order_id, client_order_id, symbol, side, size, price, order_type, reprice, on_replace, done, on_fill)
+        self._register(order)
+        return order
+
+    def _register(self, order):
+        self._orders[order.order_id] = order
+        if order.client_order_id:
+            self._by_client_id[order.client_order_id] = order
+        self._account(order.api).orders.add(order.order_id)
+
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+        self._wakeup.set()
+
+    def _forget(self, order):
+        self._orders.pop(order.order_id, None)
+        if order.client_order_id:
+            self._by_client_id.pop(order.client_order_id, None)
+        account = self._accounts.get(order.api.api_key)
+        if account is not None:
+            account.orders.discard(order.order_id)
+
+    async def wait(self, order):
+        """Дождаться конечного состояния ордера (с учетом перевыставлений)."""
+        return await asyncio.shield(order.done)
+
+    def _finish(self, order, state, filled_size=None):
+        order.state = state
+        if filled_size is not None:
+            order.filled_size = filled_size
+        self._forget(order)
+        # частичное исполнение перевыставленного ордера - тоже объем
+        if order.on_fill is not None and order.filled_size > 0:
+            self._spawn(order.on_fill(order))
+        if state != OrderState.REPLACED and not order.done.done():
+            order.done.set_result(order)
+
+    def _apply(self, order, state, filled_size):
+        if order.state in OrderState.TERMINAL:
+            return
+        if state in (OrderState.FILLED, OrderState.CANCELLED):
+            # отмену, которую запросили сами, завершает _requote
+            if state == OrderState.CANCELLED and order.cancel_requested:
+                order.filled_size = filled_size
+                return
+            self._finish(order, state, filled_size)
+            self._log(order).info(f"Ордер {order.order_id} {order.side} {order.symbol}: {state}")
+        else:
+            order.state = state
+            order.filled_size = filled_size
+
+    def _apply_status(self, order, item):
+        """Статус Arkham (событие стрима или ответ /orders/{id}) -> состояние ордера."""
+        status = item.get("status")
+        filled = float(item.get("executedSize") or 0)
+        if item.get("avgPrice") and float(item["avgPrice"]):
+            order.avg_price = float(item["avgPrice"])
+        if status == "booked":
+            state = OrderState.PARTIALLY_FILLED if filled else OrderState.RESTING
+        elif status in ("taker", "maker"):
+            state = OrderState.FILLED if filled >= order.size else OrderState.PARTIALLY_FILLED
+        elif status == "closed":
+            state = OrderState.FILLED if filled >= order.size else OrderState.CANCELLED
+        elif status == "cancelled":
+            state = OrderState.CANCELLED
+        else:
+            return
+        self._apply(order, state, filled)
+
+    def on_order_event(self, event):
+        """Событие из стрима order_statuses."""
+        order = self._orders.get(event.get("orderId")) or self._by_client_id.get(event.get("clientOrderId"))
+        if order is not None:
+            self._apply_status(order, event)
+
+    async def _resolve_missing(self, order):
+        """Ордер пропал из открытых, а отмену мы не запрашивали: исполнен, истек или отклонен - спрашиваем биржу."""
+        item = await order.api.get_order(order.order_id)
+        if item is None or order.state in OrderState.TERMINAL:
+            # при ошибке решит следующий опрос
+            return
+        if item == ORDER_NOT_FOUND:
+            self._log(order).warning(f"Ордер {order.order_id} пропал из открытых и не найден на бирже")
+            self._apply(order, OrderState.CANCELLED, order.filled_size)
+            return
+        self._apply_status(order, item)
+
+    async def _poll(self, account):
+        """Один запрос /orders на аккаунт сверяет все его живые ордера; пропавшие из открытых проверяются по orderId."""
+        started = time.monotonic()
+        account.polling = True
+        try:
+            await self._check_orders(account, started)
+        finally:
+            account.polling = False
+
+    async def _check_orders(self, account, started):
+        open_orders = await account.api.get_open_orders()
+        if open_orders is None:
+            return
+
+        resting = {item.get("orderId"): item for item in open_orders}
+        missing = []
+        for order_id in list(account.orders):
+            order = self._orders.get(order_id)
+            if order is None or order.placed_at > started:
+                continue
+            item = resting.get(order_id)
+            if item is None:
+                if not order.cancel_requested:
+                    missing.append(order)
+                continue
+            filled = float(item.get("executedSize") or 0)
+            if item.get("avgPrice"):
+                order.avg_price = float(item["avgPrice"])
+            self._apply(order, OrderState.PARTIALLY_FILLED if filled else OrderState.RESTING, filled)
+        if missing:
+            await asyncio.gather(*(self._resolve_missing(order) for order in missing))
+
+    async def _requote(self, order):
+        """Отменить конкретный зависший ордер и выставить остаток по новой цене."""
+        try:
+            cancelled = await order.api.cancel_order(order.order_id)
+        except Exception as e:
+            self._log(order).error(f"Ошибка отмены ордера {order.order_id}: {e}")
+            cancelled = None
+        if cancelled is None:
+            # отмена не прошла (возможно, ордер уже исполнен) - решит следующий опрос
+            order.cancel_requested = False
+            order.placed_at = time.monotonic() - self.limit_hold_time + self.poll_interval
+            return
+        if order.state in OrderState.TERMINAL:
+            return
+
+        remaining = order.size - order.filled_size
+        if remaining <= 0:
+            self._finish(order, OrderState.FILLED)
+            return
+
+        response = None
+        try:
+            price = await order.reprice(order.symbol, order.side)
+            if price is not None:
+                response = await order.api.create_order(price=price, size=remaining, side=order.side, symbol=order.symbol, type=order.order_type)
+        except Exception as e:
+            self._log(order).error(f"Ошибка перевыставления ордера {order.order_id}: {e}")
+
+        if not response or "orderId" not in response:
+            self._log(order).error(f"Не удалось перевыставить ордер {order.order_id} для {order.symbol}.")
+            self._finish(order, OrderState.CANCELLED)
+            return
+
+        new_order = TrackedOrder(
+            order.api, response["orderId"], response.get("clientOrderId"), order.symbol, order.side,
+            remaining, price, order.order_type, order.reprice, order.on_replace, order.done, order.on_fill
+        )
+        new_order.requotes = order.requotes + 1
+        self._finish(order, OrderState.REPLACED)
+        self._register(new_order)
+        self._log(order).info(f"Ордер {order.order_id} для {order.symbol} перевыставлен: {new_order.order_id} по цене {price}")
+        if order.on_replace is not None:
+            await order.on_replace(order, new_order)
+
+    def _spawn(self, coro):
+        """Запуск без ожидания: медленный аккаунт не задерживает тик остальных."""
+        job = asyncio.ensure_future(coro)
+        self._jobs.add(job)
+        job.add_done_callback(self._job_done)
+
+    def _job_done(self, job):
+        self._jobs.discard(job)
+        if not job.cancelled() and job.exception() is not None:
+            logger.error(f"Ошибка планировщика ордеров: {job.exception()}")
+
+    async def _run(self):
+        while True:
+            if not self._orders:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            now = time.monotonic()
+            for account in self._accounts.values():
+                if account.orders and not account.polling and account.next_poll <= now:
+                    streaming = account.feed is not None and account.feed.connected.is_set()
+                    account.next_poll = now + (self.limit_hold_time if streaming else self.poll_interval)
+                    self._spawn(self._poll(account))
+
+            for order in list(self._orders.values()):
+                if (
+                    order.reprice is not None
+                    and not order.cancel_requested
+                    and order.state not in OrderState.TERMINAL
+                    and now - order.placed_at >= self.limit_hold_time
+                ):
+                    self._log(order).warning(f"Ордер {order.order_id} для {order.symbol} не заполнился за {self.limit_hold_time} секунд. Переустановка ордера.")
+                    order.cancel_requested = True
+                    self._spawn(self._requote(order))
+
+            await asyncio.sleep(self.tick)
+
+    async def close(self):
+        for job in list(self._jobs):
+            job.cancel()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
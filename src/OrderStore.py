@@ -0,0 +1,304 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from loguru import logger
+
+# остаток позиции меньше этого - погрешность float после вычитаний, а не позиция
+SIZE_EPSILON = 1e-9
+
+class OrderStore:
+    """Хранилище ордеров: одно соединение SQLite в режиме WAL и пакетная запись через очередь.
+
+    Все обращения к соединению идут через один поток, поэтому event loop не блокируется,
+    а записи от всех ботов процесса коммитятся пачками одной транзакцией.
+    """
+
+    def __init__(self, db_path="orders.db", batch_size=200):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="order-store")
+        self._conn = self._executor.submit(self._connect).result()
+        self._queue = None
+        self._writer = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute('''CREATE TABLE IF NOT EXISTS orders (
+                            order_id TEXT PRIMARY KEY,
+                            account_id TEXT,
+                            symbol TEXT,
+                            side TEXT,
+                            size REAL,
+                            open_price REAL,
+                            status TEXT,
+                            created_at TIMESTAMP,
+                            closed_at TIMESTAMP,
+                            check_count INTEGER DEFAULT 0)''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_account_status ON orders (account_id, status)")
+        # ордер записывается сюда до отправки: если ответа нет и проверить исход не удалось, следующий цикл
+        # найдет его по clientOrderId. position_id - позиция, которую закрывает продажа (у входа NULL)
+        conn.execute('''CREATE TABLE IF NOT EXISTS pending_orders (
+                            client_order_id TEXT PRIMARY KEY,
+                            account_id TEXT,
+                            symbol TEXT,
+                            side TEXT,
+                            size REAL,
+                            price REAL,
+                            position_id TEXT,
+                            created_at TIMESTAMP)''')
+        # исполнения по ордерам (у перевыставленного - своя строка на каждый ордер цепочки)
+        conn.execute('''CREATE TABLE IF NOT EXISTS fills (
+                            order_id TEXT PRIMARY KEY,
+                            account_id TEXT,
+                            symbol TEXT,
+                            side TEXT,
+                            size REAL,
+                            price REAL,
+                            fee REAL,
+                            liquidity TEXT,
+                            filled_at TIMESTAMP)''')
+        # итоги по аккаунту, символу и дню (UTC) обновляет триггер в той же транзакции, что и вставку исполнения
+        conn.execute('''CREATE TABLE IF NOT EXISTS volume_daily (
+                            account_id TEXT,
+                            symbol TEXT,
+                            day TEXT,
+                            volume REAL NOT NULL DEFAULT 0,
+                            fees REAL NOT NULL DEFAULT 0,
+                            fills INTEGER NOT NULL DEFAULT 0,
+                            PRIMARY KEY (account_id, symbol, day))''')
+        conn.execute('''CREATE TRIGGER IF NOT EXISTS fills_volume_daily AFTER INSERT ON fills
+                        BEGIN
+                            INSERT INTO volume_daily (account_id, symbol, day, volume, fees, fills)
+                            VALUES (NEW.account_id, NEW.symbol, substr(NEW.filled_at, 1, 10), NEW.size * NEW.price, NEW.fee, 1)
+                            ON CONFLICT (account_id, symbol, day) DO UPDATE SET
+                                volume = volume + excluded.volume,
+                                fees = fees + excluded.fees,
+                                fills = fills + 1;
+                        END''')
+        conn.commit()
+        return conn
+
+    async def execute(self, fn, *args):
+        """Выполнить fn(conn, *args) в потоке базы данных."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, self._conn, *args)
+
+    def _commit_batch(self, conn, batch):
+        """Коммит пачки одной транзакцией. Возвращает ошибки по каждой записи (None - успех)."""
+        try:
+            with conn:
+                for sql, params, _ in batch:
+                    conn.execute(sql, params)
+            return [None] * len(batch)
+        except sqlite3.Error:
+            pass
+
+        # одна плохая запись не должна откатывать записи других ботов
+        errors = []
+        for sql, params, _ in batch:
+            try:
+                with conn:
+                    conn.execute(sql, params)
+                errors.append(None)
+            except sqlite3.Error as e:
+                errors.append(e)
+        return errors
+
+    async def _write_loop(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            item = await self._queue.get()
+            # пока идет коммит, в очереди копятся записи следующей пачки
+            while True:
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+                if stopping or len(batch) >= self.batch_size or self._queue.empty():
+                    break
+                item = self._queue.get_nowait()
+
+            if not batch:
+                continue
+
+            try:
+                errors = await self.execute(self._commit_batch, batch)
+            except Exception as e:
+                logger.error(f"Ошибка записи пачки из {len(batch)} изменений в {self.db_path}: {e}")
+                errors = [e] * len(batch)
+
+            for (_, _, future), error in zip(batch, errors):
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+    async def _write(self, sql, params):
+        """Поставить запись в очередь и дождаться коммита ее пачки."""
+        if self._writer is None:
+            self._queue = asyncio.Queue()
+            self._writer = asyncio.ensure_future(self._write_loop())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((sql, params, future))
+        await future
+
+    async def save_order(self, order_id, account_id, symbol, side, size, open_price):
+        await self._write(
+            '''INSERT INTO orders (order_id, account_id, symbol, side, size, open_price, status, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+            (order_id, account_id, symbol, side, size, open_price, "open", datetime.now().isoformat(" "))
+        )
+
+    async def update_order(self, order_id, status, closed_at=None):
+        await self._write(
+            "UPDATE orders SET status = ?, closed_at = ? WHERE order_id = ?",
+            (status, closed_at.isoformat(" ") if closed_at else None, order_id)
+        )
+
+    async def replace_order(self, old_order_id, new_order_id, open_price):
+        """Позиция переезжает на перевыставленный ордер с новой ценой входа."""
+        await self._write(
+            "UPDATE orders SET order_id = ?, open_price = ? WHERE order_id = ?",
+            (new_order_id, open_price, old_order_id)
+        )
+
+    async def reduce_order(self, order_id, size, status, closed_at=None):
+        """Позиция меньше записанной на size (вход исполнился не целиком). Если от нее ничего не осталось,
+        строка получает status и closed_at."""
+        closed_at = closed_at.isoformat(" ") if closed_at else None
+        await self._write(
+            '''UPDATE orders SET
+                   status = CASE WHEN size - ? <= ? THEN ? ELSE status END,
+                   closed_at = CASE WHEN size - ? <= ? THEN ? ELSE closed_at END,
+                   size = size - ?
+               WHERE order_id = ?''',
+            (size, SIZE_EPSILON, status, size, SIZE_EPSILON, closed_at, size, order_id)
+        )
+
+    async def increment_check_count(self, order_id):
+        await self._write("UPDATE orders SET check_count = check_count + 1 WHERE order_id = ?", (order_id,))
+
+    async def save_pending(self, client_order_id, account_id, symbol, side, size, price, position_id=None):
+        await self._write(
+            '''INSERT INTO pending_orders (client_order_id, account_id, symbol, side, size, price, position_id, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+            (client_order_id, account_id, symbol, side, size, price, position_id, datetime.now().isoformat(" "))
+        )
+
+    async def delete_pending(self, client_order_id):
+        await self._write("DELETE FROM pending_orders WHERE client_order_id = ?", (client_order_id,))
+
+    async def open_pending(self, client_order_id, order_id, account_id, symbol, size, open_price):
+        """Вход с неизвестным исходом нашелся на бирже: позиция и удаление из pending_orders одной транзакцией."""
+        now = datetime.now().isoformat(" ")
+
+        def apply(conn):
+            with conn:
+                conn.execute(
+                    '''INSERT OR IGNORE INTO orders (order_id, account_id, symbol, side, size, open_price, status, created_at)
+                       VALUES (?, ?, ?, 'buy', ?, ?, 'open', ?)''',
+                    (str(order_id), account_id, symbol, size, open_price, now)
+                )
+                conn.execute("DELETE FROM pending_orders WHERE client_order_id = ?", (client_order_id,))
+        await self.execute(apply)
+
+    async def get_pending(self, account_id):
+        """Ордера аккаунта с неизвестным исходом: (client_order_id, symbol, side, size, price, position_id)."""
+        def fetch(conn):
+            return conn.execute(
+                "SELECT client_order_id, symbol, side, size, price, position_id FROM pending_orders WHERE account_id = ?",
+                (account_id,)
+            ).fetchall()
+        return await self.execute(fetch)
+
+    async def record_fill(self, order_id, account_id, symbol, side, size, price, fee, liquidity, filled_at=None):
+        """Исполнение ордера; повтор по тому же order_id игнорируется и итоги не задваивает."""
+        filled_at = filled_at or datetime.now(timezone.utc)
+        await self._write(
+            '''INSERT OR IGNORE INTO fills (order_id, account_id, symbol, side, size, price, fee, liquidity, filled_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (order_id, account_id, symbol, side, size, price, fee, liquidity, filled_at.strftime("%Y-%m-%d %H:%M:%S.%f"))
+        )
+
+    async def get_volume(self, account_id):
+        """Объем и комиссии аккаунта по итогам исполнений: (spot_volume, perp_volume, spot_fees, perp_fees)."""
+        def fetch(conn):
+            volume = {False: (0.0, 0.0), True: (0.0, 0.0)}
+            for perp, total, fees in conn.execute(
+                "SELECT symbol LIKE '%\\_PERP' ESCAPE '\\', SUM(volume), SUM(fees) FROM volume_daily WHERE account_id = ? GROUP BY 1",
+                (account_id,)
+            ):
+                volume[bool(perp)] = (total, fees)
+            return volume[False][0], volume[True][0], volume[False][1], volume[True][1]
+        return await self.execute(fetch)
+
+    async def get_open_orders(self, account_id):
+        def fetch(conn):
+            return conn.execute(
+                "SELECT * FROM orders WHERE account_id = ? AND status = 'open'", (account_id,)
+            ).fetchall()
+        return await self.execute(fetch)
+
+    async def load_reconciliation(self, account_ids, order_ids):
+        """Все, что нужно сверке, за один проход: открытые позиции аккаунтов, какие из order_ids уже есть в базе
+        и время последней записи каждого аккаунта."""
+        def fetch(conn):
+            accounts = set(account_ids)
+            open_rows = {}
+            for row in conn.execute("SELECT * FROM orders WHERE status = 'open'"):
+                if row[1] in accounts:
+                    open_rows.setdefault(row[1], []).append(row)
+
+            order_ids_list = [str(order_id) for order_id in order_ids]
+            known = set()
+            # лимит SQLite на число параметров запроса
+            for start in range(0, len(order_ids_list), 500):
+                chunk = order_ids_list[start:start + 500]
+                known.update(order_id for (order_id,) in conn.execute(
+                    f"SELECT order_id FROM orders WHERE order_id IN ({','.join('?' * len(chunk))})", chunk
+                ))
+
+            latest = {
+                account_id: created_at
+                for account_id, created_at in conn.execute("SELECT account_id, MAX(created_at) FROM orders GROUP BY account_id")
+                if account_id in accounts
+            }
+            return open_rows, known, latest
+        return await self.execute(fetch)
+
+    async def apply_reconciliation(self, status_updates, new_orders):
+        """Исправления сверки одной транзакцией.
+
+        status_updates - (status, closed_at, order_id) для позиций, которых на бирже уже нет,
+        new_orders - строки (order_id, account_id, symbol, side, size, open_price) для ордеров, которых нет в базе.
+        """
+        now = datetime.now().isoformat(" ")
+
+        def apply(conn):
+            with conn:
+                conn.executemany(
+                    "UPDATE orders SET status = ?, closed_at = ? WHERE order_id = ? AND status = 'open'",
+                    status_updates
+                )
+                conn.executemany(
+                    '''INSERT OR IGNORE INTO orders (order_id, account_id, symbol, side, size, open_price, status, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?, 'open', ?)''',
+                    [(*row, now) for row in new_orders]
+                )
+        await self.execute(apply)
+
+    async def close(self):
+        """Дописать очередь, остановить писателя и закрыть соединение."""
+        if self._writer is not None:
+            self._queue.put_nowait(None)
+            await self._writer
+            self._writer = None
+        await self.execute(lambda conn: conn.close())
+        self._executor.shutdown()
@@ -0,0 +1,335 @@
+import os
+import sys
+import time
+import signal
+import asyncio
+import threading
+import tracemalloc
+from collections import Counter
+from aiohttp import web
+from loguru import logger
+
+TOP = 10
+ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+
+def _query_seconds(request, name, scale=1):
+    """Неотрицательное число из параметра запроса в секундах; None, если параметр не задан или 0."""
+    raw = request.query.get(name)
+    if raw is None:
+        return None
+    try:
+        value = float(raw)
+    except ValueError:
+        value = float("nan")
+    # nan и inf проходят float(), но интервалом сэмплирования быть не могут
+    if not 0 <= value < float("inf"):
+        raise ValueError(f"{name}: ожидается неотрицательное число, получено {raw!r}")
+    return value / scale or None
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _stamp():
+    return f"{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}"
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик всех потоков: раз в interval снимает стеки через sys._current_frames.
+
+    Стеки копятся в формате folded (поток;функция;...;функция число), который читают flamegraph.pl,
+    speedscope и inferno. Корень стека - имя потока: видно, сколько времени у event loop, потока
+    OrderStore (коммиты SQLite) и писателя логов. Код бота не инструментируется.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, interval=None):
+        if self.running:
+            return
+        self.interval = interval or self.interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="cpu-profiler", daemon=True)
+        self._thread.start()
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if frames.keys() - names.keys():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def top(self, thread="MainThread", limit=TOP):
+        """Функции, на которых чаще всего стоял поток (собственное время), и их доля сэмплов."""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            if stack.startswith(f"{thread};"):
+                leaves[stack.rsplit(";", 1)[1]] += count
+        return [(label, count / max(self.samples, 1)) for label, count in leaves.most_common(limit)]
+
+    def stop(self, path):
+        """Остановить и записать стеки в path."""
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return time.monotonic() - self.started_at
+
+
+class SlowCallbackMonitor:
+    """Колбэки event loop дольше threshold секунд - то, что держит loop и задерживает всех ботов.
+
+    Пока монитор включен, Handle._run обернут замером времени. Шаг задачи приписывается ее корутине,
+    а место, где задача снова уснула, показывает конец медленного участка.
+    """
+
+    def __init__(self, threshold=0.1):
+        self.threshold = threshold
+        self.stats = {}
+        self._original = None
+
+    @property
+    def running(self):
+        return self._original is not None
+
+    def start(self, threshold=None):
+        if self.running:
+            return
+        self.threshold = threshold or self.threshold
+        self.stats = {}
+        original = self._original = asyncio.events.Handle._run
+        monitor = self
+
+        def _run(handle):
+            started = time.perf_counter()
+            original(handle)
+            elapsed = time.perf_counter() - started
+            if elapsed >= monitor.threshold:
+                monitor._report(handle, elapsed)
+
+        asyncio.events.Handle._run = _run
+
+    def stop(self):
+        if self.running:
+            asyncio.events.Handle._run = self._original
+            self._original = None
+
+    @staticmethod
+    def _describe(handle):
+        """(имя корутины или колбэка, где задача уснула после шага)."""
+        callback = handle._callback
+        task = getattr(callback, "__self__", None)
+        if not isinstance(task, asyncio.Task):
+            return getattr(callback, "__qualname__", repr(callback)), None
+        coro = task.get_coro()
+        name = getattr(coro, "__qualname__", repr(coro))
+        # по цепочке await до самой внутренней корутины вне asyncio (внутри - всегда sleep/wait)
+        frame = None
+        while coro is not None and getattr(coro, "cr_frame", None) is not None:
+            if os.path.dirname(coro.cr_frame.f_code.co_filename) != ASYNCIO_DIR or frame is None:
+                frame = coro.cr_frame
+            coro = coro.cr_await
+        where = f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno}" if frame is not None else None
+        return name, where
+
+    def _report(self, handle, elapsed):
+        name, where = self._describe(handle)
+        stat = self.stats.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+        stat["count"] += 1
+        stat["total"] += elapsed
+        stat["max"] = max(stat["max"], elapsed)
+        logger.warning(f"Колбэк {name} занял loop на {elapsed * 1000:.0f} мс" + (f" (уснул на {where})" if where else ""))
+
+    def top(self, limit=TOP):
+        return sorted(self.stats.items(), key=lambda item: item[1]["total"], reverse=True)[:limit]
+
+
+class MemoryTracker:
+    """Снимки tracemalloc: первый снимок после включения - база, каждый следующий сравнивается с предыдущим."""
+
+    def __init__(self, frames=25):
+        self.frames = frames
+        self._previous = None
+
+    @property
+    def running(self):
+        return tracemalloc.is_tracing()
+
+    def snapshot(self, path, limit=TOP):
+        """Снять и записать снимок (читается tracemalloc.Snapshot.load); вернуть строки с наибольшим ростом."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._previous = None
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        snapshot.dump(path)
+        if self._previous is None:
+            stats = snapshot.statistics("lineno")[:limit]
+        else:
+            stats = snapshot.compare_to(self._previous, "lineno")[:limit]
+        self._previous = snapshot
+        return [str(stat) for stat in stats]
+
+    def stop(self):
+        tracemalloc.stop()
+        self._previous = None
+
+
+class Profiler:
+    """Профилирование работающего процесса по запросу, без перезапуска.
+
+    SIGUSR1 включает и выключает CPU-профиль вместе с поиском медленных колбэков, SIGUSR2 снимает
+    снимок памяти. То же и с параметрами - POST /debug/... на порту метрик (только 127.0.0.1).
+    Файлы пишутся в directory с pid процесса в имени, так что шарды супервизора не мешают друг другу.
+    """
+
+    def __init__(self, directory="profiles", slow_callback_ms=100, interval=0.005):
+        self.directory = directory
+        self.cpu = SamplingProfiler(interval)
+        self.slow = SlowCallbackMonitor(slow_callback_ms / 1000)
+        self.memory = MemoryTracker()
+
+    def _path(self, kind, ext):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{kind}-{_stamp()}.{ext}")
+
+    def start_cpu(self, interval=None, threshold=None):
+        self.cpu.start(interval)
+        self.slow.start(threshold)
+        logger.info(
+            f"Профилирование включено: сэмпл раз в {self.cpu.interval * 1000:g} мс, "
+            f"медленные колбэки от {self.slow.threshold * 1000:g} мс"
+        )
+
+    def stop_cpu(self):
+        """Выключить CPU-профиль и монитор колбэков; вернуть итоги."""
+        result = {"slow_callbacks": [{"callback": name, **stat} for name, stat in self.slow.top()]}
+        self.slow.stop()
+        if not self.cpu.running:
+            return result
+        path = self._path("cpu", "folded")
+        seconds = self.cpu.stop(path)
+        top = self.cpu.top()
+        logger.info(
+            f"CPU-профиль за {seconds:.0f}с ({self.cpu.samples} сэмплов) записан в {path}; event loop: "
+            + ", ".join(f"{label} {share:.0%}" for label, share in top[:5])
+        )
+        for name, stat in self.slow.top(5):
+            logger.info(f"Медленный колбэк {name}: {stat['count']} раз, всего {stat['total']:.2f}с, максимум {stat['max'] * 1000:.0f} мс")
+        return {**result, "path": path, "seconds": seconds, "samples": self.cpu.samples, "top": top}
+
+    def toggle_cpu(self):
+        if self.cpu.running:
+            self.stop_cpu()
+        else:
+            self.start_cpu()
+
+    def snapshot_memory(self):
+        path = self._path("mem", "snapshot")
+        baseline = not self.memory.running
+        top = self.memory.snapshot(path)
+        if baseline:
+            logger.info(f"tracemalloc включен, базовый снимок записан в {path}; следующий снимок покажет рост")
+        else:
+            logger.info(f"Снимок памяти записан в {path}, рост с предыдущего:\n  " + "\n  ".join(top))
+        return {"path": path, "top": top}
+
+    def _on_memory_signal(self):
+        # снимок большого процесса занимает секунды - не внутри обработчика сигнала
+        loop = asyncio.get_running_loop()
+        loop.run_in_executor(None, self.snapshot_memory)
+
+    def install_signals(self):
+        """На Windows сигналов SIGUSR нет - там только HTTP."""
+        loop = asyncio.get_running_loop()
+        for name, handler in (("SIGUSR1", self.toggle_cpu), ("SIGUSR2", self._on_memory_signal)):
+            signum = getattr(signal, name, None)
+            if signum is None:
+                continue
+            try:
+                loop.add_signal_handler(signum, handler)
+            except (NotImplementedError, RuntimeError):
+                return
+
+    def status(self):
+        return {
+            "cpu": self.cpu.running,
+            "slow_callbacks": self.slow.running,
+            "memory": self.memory.running,
+            "directory": os.path.abspath(self.directory),
+        }
+
+    async def _handle_status(self, request):
+        return web.json_response(self.status())
+
+    async def _handle_cpu_start(self, request):
+        try:
+            interval = _query_seconds(request, "interval")
+            threshold = _query_seconds(request, "slow_ms", scale=1000)
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        self.start_cpu(interval, threshold)
+        return web.json_response(self.status())
+
+    async def _handle_cpu_stop(self, request):
+        return web.json_response(self.stop_cpu())
+
+    async def _handle_memory_snapshot(self, request):
+        loop = asyncio.get_running_loop()
+        return web.json_response(await loop.run_in_executor(None, self.snapshot_memory))
+
+    async def _handle_memory_stop(self, request):
+        self.memory.stop()
+        return web.json_response(self.status())
+
+    def routes(self):
+        """Маршруты для сервера метрик: (метод, путь, обработчик)."""
+        return [
+            ("GET", "/debug/profile", self._handle_status),
+            ("POST", "/debug/cpu/start", self._handle_cpu_start),
+            ("POST", "/debug/cpu/stop", self._handle_cpu_stop),
+            ("POST", "/debug/memory/snapshot", self._handle_memory_snapshot),
+            ("POST", "/debug/memory/stop", self._handle_memory_stop),
+        ]
+
+    def collect(self, metrics):
+        for name, stat in self.slow.stats.items():
+            metrics.set_counter("arkham_slow_callbacks_total", stat["count"], help_text="Колбэки, дольше порога державшие event loop", callback=name)
+
+    def close(self):
+        """Дописать незавершенный CPU-профиль при остановке процесса."""
+        if self.cpu.running or self.slow.running:
+            self.stop_cpu()
+        if self.memory.running:
+            self.memory.stop()
@@ -0,0 +1,164 @@
+import time
+import random
+import asyncio
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+DEFAULT_LIMITS = {
+    "public": 10,
+    "private": 20,
+    "order": 10,
+    "proxy": 30
+}
+
+
+def endpoint_class(path):
+    """public - /public/*, order - выставление и отмена ордеров, private - остальное."""
+    if path.startswith("/public"):
+        return "public"
+    if path.startswith("/orders/new") or path.startswith("/orders/cancel"):
+        return "order"
+    return "private"
+
+
+def parse_retry_after(value):
+    """Retry-After в секундах или HTTP-дате -> секунды ожидания."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Бакет с резервированием: токены уходят в минус, а вызывающий ждет, пока они накопятся."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Забрать токен; вернуть сколько секунд ждать до права на запрос."""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate, self.blocked_until - now)
+
+    def try_take(self):
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens < 1 or self.blocked_until > now:
+            return False
+        self.tokens -= 1
+        return True
+
+    def block(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    """Общий для процесса лимитер: бакеты на API ключ, на прокси и на класс эндпоинта."""
+
+    def __init__(self, limits=None, max_retries=3, backoff_base=0.5, backoff_max=30):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._buckets = {}
+        self.queued = 0
+        self.stats = {
+            "requests": 0,
+            "throttled": 0,
+            "throttled_seconds": 0.0,
+            "rate_limited": 0,
+            "server_errors": 0,
+            "retries": 0
+        }
+
+    def _bucket(self, scope, limit_name):
+        bucket = self._buckets.get(scope)
+        if bucket is None:
+            bucket = self._buckets[scope] = TokenBucket(self.limits[limit_name])
+        return bucket
+
+    def _buckets_for(self, api_key, proxy, cls):
+        proxy = proxy or "direct"
+        # публичные лимиты считаются по IP, приватные и ордерные - по ключу
+        owner = proxy if cls == "public" else api_key
+        return (
+            self._bucket(("proxy", proxy), "proxy"),
+            self._bucket((cls, owner), cls)
+        )
+
+    async def acquire(self, api_key, proxy, cls):
+        self.stats["requests"] += 1
+        wait = max(bucket.reserve() for bucket in self._buckets_for(api_key, proxy, cls))
+        if wait <= 0:
+            return
+        self.stats["throttled"] += 1
+        self.stats["throttled_seconds"] += wait
+        self.queued += 1
+        try:
+            await asyncio.sleep(wait)
+        finally:
+            self.queued -= 1
+
+    def backoff(self, attempt, retry_after=None):
+        """Retry-After от биржи, иначе экспоненциальная задержка с полным джиттером."""
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def on_response(self, api_key, proxy, cls, status, delay):
+        """429 тормозит все запросы того же ключа (для public - того же IP) на время задержки."""
+        if status == 429:
+            self.stats["rate_limited"] += 1
+            self._buckets_for(api_key, proxy, cls)[1].block(delay)
+        elif status >= 500:
+            self.stats["server_errors"] += 1
+        self.stats["retries"] += 1
+
+    def should_retry(self, path, status, attempt):
+        if attempt >= self.max_retries:
+            return False
+        if status == 429:
+            return True
+        # 5xx на выставлении ордера не повторяем: ордер мог быть принят
+        return status >= 500 and not path.startswith("/orders/new")
+
+    def snapshot(self):
+        return {**self.stats, "queued": self.queued, "buckets": len(self._buckets)}
+
+
+class LatencyTracker:
+    """Скользящее окно длительностей успешных запросов (общее для флота) - порог для хеджированной попытки."""
+
+    __slots__ = ("_samples", "min_samples")
+
+    def __init__(self, size=500, min_samples=50):
+        self._samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def observe(self, seconds):
+        self._samples.append(seconds)
+
+    def percentile(self, p):
+        """p-й перцентиль окна; None, пока замеров меньше min_samples."""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
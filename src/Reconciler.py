@@ -0,0 +1,191 @@
+import time
+import asyncio
+import aiohttp
+from datetime import datetime
+from collections import Counter
+from loguru import logger
+from src.OrderStore import OrderStore
+from src.OrderEngine import OrderState
+
+# ошибки разбора ответа биржи (нет поля, не число): аккаунт пропускается как unavailable
+MALFORMED = (KeyError, TypeError, ValueError, AttributeError)
+
+# позиция считается исчезнувшей, если на бирже осталось меньше этой доли ее размера (комиссия списывается в монете)
+HOLDING_TOLERANCE = 0.5
+
+KINDS = {
+    "position_closed": "позиция уже закрыта на бирже, строка помечена closed",
+    "entry_not_found": "ордера на вход нет ни в стакане, ни в сделках, ни на балансе, строка помечена cancelled",
+    "unverified": "вход старше истории сделок, позицию не проверить - оставлена как есть",
+    "order_not_in_db": "открытый ордер на покупку не записан в базе, добавлен",
+    "fill_not_in_db": "исполненная покупка не записана в базе, позиция добавлена",
+    "unavailable": "не удалось получить или разобрать состояние аккаунта, сверка пропущена",
+}
+
+
+def _fill_time(value):
+    """Время сделки Arkham (микросекунды) -> unix-секунды."""
+    value = float(value or 0)
+    if value > 1e14:
+        return value / 1e6
+    if value > 1e11:
+        return value / 1e3
+    return value
+
+
+def _row_time(created_at):
+    return datetime.fromisoformat(created_at).timestamp() if created_at else 0.0
+
+
+class Reconciler:
+    """Сверка orders.db с биржей перед стартом торговли.
+
+    Открытые ордера, балансы и последние сделки всех аккаунтов запрашиваются параллельно,
+    сравниваются с базой за один проход, а исправления записываются одной транзакцией.
+    """
+
+    def __init__(self, store: OrderStore, make_api, symbols, concurrency=50, fills_limit=100):
+        self.store = store
+        self.make_api = make_api
+        self.symbols = symbols
+        self.fills_limit = fills_limit
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _fetch(self, account):
+        async with self._semaphore:
+            api = self.make_api(account)
+            try:
+                open_orders, balances, fills = await asyncio.gather(
+                    api.get_open_orders(), api.get_balances(), api.get_fills(self.fills_limit)
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                api.log.error(f"Сверка: ошибка сети: {e}")
+                return api, None
+            finally:
+                # клиент сверки не держит соединения до допуска аккаунта
+                await api.close()
+
+        if open_orders is None or balances is None or fills is None:
+            return api, None
+        try:
+            return api, {
+                "open_orders": open_orders,
+                "balances": {item["symbol"]: float(item.get("balance") or 0) for item in balances},
+                "fills": fills,
+                "order_ids": {str(item["orderId"]) for item in open_orders + fills}
+            }
+        except MALFORMED as e:
+            api.log.error(f"Сверка: некорректный ответ биржи: {e!r}")
+            return api, None
+
+    def _diff(self, api, state, rows, known, latest):
+        """Расхождения одного аккаунта: (отчет, обновления статусов, новые строки)."""
+        report, updates, inserts = [], [], []
+        now = datetime.now().isoformat(" ")
+        resting = {str(item["orderId"]): item for item in state["open_orders"]}
+
+        # сделки по ордерам: суммарный размер, средняя цена, время последней
+        fills = {}
+        for fill in state["fills"]:
+            entry = fills.setdefault(str(fill["orderId"]), {
+                "symbol": fill.get("symbol"), "side": fill.get("side"), "size": 0.0, "notional": 0.0, "time": 0.0
+            })
+            size = float(fill.get("size") or 0)
+            entry["size"] += size
+            entry["notional"] += size * float(fill.get("price") or 0)
+            entry["time"] = max(entry["time"], _fill_time(fill.get("time")))
+        # если вернулось меньше лимита, история сделок у нас целиком
+        complete = len(state["fills"]) < self.fills_limit
+        oldest = min((entry["time"] for entry in fills.values()), default=None)
+
+        def holding(symbol, size, since):
+            """Спот - монеты на балансе, перп - после входа не было продаж на размер позиции."""
+            if symbol.endswith("_PERP"):
+                sold = sum(
+                    entry["size"] for entry in fills.values()
+                    if entry["symbol"] == symbol and entry["side"] == "sell" and entry["time"] >= since
+                )
+                return sold < size * HOLDING_TOLERANCE
+            return state["balances"].get(symbol.split("_")[0], 0.0) >= size * HOLDING_TOLERANCE
+
+        def add(kind, order_id, symbol):
+            report.append({"account": api.alias, "order_id": order_id, "symbol": symbol, "kind": kind})
+
+        for row in rows:
+            order_id, _, symbol, side, size, _, _, created_at = row[:8]
+            if side != "buy" or order_id in resting:
+                continue
+            entry = fills.get(order_id)
+            if entry is not None:
+                if not holding(symbol, size, entry["time"]):
+                    updates.append(("closed", now, order_id))
+                    add("position_closed", order_id, symbol)
+                continue
+
+            perp = symbol.endswith("_PERP")
+            if not perp and holding(symbol, size, None):
+                # вход исполнился раньше окна сделок, монеты на месте
+                continue
+            if not perp or complete or (oldest is not None and _row_time(created_at) >= oldest):
+                updates.append((OrderState.CANCELLED, now, order_id))
+                add("entry_not_found", order_id, symbol)
+            else:
+                add("unverified", order_id, symbol)
+
+        for order_id, item in resting.items():
+            if item.get("side") == "buy" and item.get("symbol") in self.symbols and order_id not in known:
+                inserts.append((order_id, api.api_key, item["symbol"], "buy", float(item.get("size") or 0), float(item.get("price") or 0)))
+                add("order_not_in_db", order_id, item["symbol"])
+
+        # бот мог упасть между ответом биржи и записью в базу: такие покупки новее последней строки аккаунта
+        last_row = _row_time(latest) if latest else None
+        for order_id, entry in fills.items():
+            if (
+                last_row is None or entry["side"] != "buy" or entry["symbol"] not in self.symbols
+                or order_id in known or order_id in resting or entry["time"] <= last_row or entry["size"] <= 0
+            ):
+                continue
+            if holding(entry["symbol"], entry["size"], entry["time"]):
+                inserts.append((order_id, api.api_key, entry["symbol"], "buy", entry["size"], entry["notional"] / entry["size"]))
+                add("fill_not_in_db", order_id, entry["symbol"])
+
+        return report, updates, inserts
+
+    async def run(self, accounts):
+        """Сверить все аккаунты и вернуть список расхождений."""
+        started = time.monotonic()
+        results = await asyncio.gather(*(self._fetch(account) for account in accounts))
+
+        order_ids = set().union(*(state["order_ids"] for _, state in results if state is not None))
+        open_rows, known, latest = await self.store.load_reconciliation([api.api_key for api, _ in results], order_ids)
+
+        report, updates, inserts = [], [], []
+        for api, state in results:
+            if state is None:
+                report.append({"account": api.alias, "order_id": None, "symbol": None, "kind": "unavailable"})
+                continue
+            try:
+                diff = self._diff(api, state, open_rows.get(api.api_key, []), known, latest.get(api.api_key))
+            except MALFORMED as e:
+                # одна битая запись не должна останавливать запуск всего флота
+                api.log.error(f"Сверка: некорректный ответ биржи: {e!r}")
+                report.append({"account": api.alias, "order_id": None, "symbol": None, "kind": "unavailable"})
+                continue
+            report.extend(diff[0])
+            updates.extend(diff[1])
+            inserts.extend(diff[2])
+
+        if updates or inserts:
+            await self.store.apply_reconciliation(updates, inserts)
+
+        for item in report:
+            logger.bind(account=item["account"], symbol=item["symbol"] or "-").warning(
+                f"Сверка: {item['order_id'] or ''} {KINDS[item['kind']]}"
+            )
+        counts = Counter(item["kind"] for item in report)
+        logger.info(
+            f"Сверка {len(results)} аккаунтов за {time.monotonic() - started:.1f}с: "
+            f"исправлено {len(updates) + len(inserts)} строк, расхождений {len(report)}"
+            + (f" ({', '.join(f'{kind}: {count}' for kind, count in counts.items())})" if counts else "")
+        )
+        return report
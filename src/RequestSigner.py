@@ -0,0 +1,47 @@
+import time
+import hmac
+import base64
+import hashlib
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_body(body):
+    """Компактный JSON с сортировкой ключей: подпись считается ровно от отправляемой строки."""
+    if body is None:
+        return ""
+    if orjson is not None:
+        return orjson.dumps(body, option=orjson.OPT_SORT_KEYS).decode()
+    return json.dumps(body, separators=(",", ":"), sort_keys=True)
+
+
+class RequestSigner:
+    """Подписывает запросы Arkham: секрет декодируется один раз, HMAC с ключом клонируется через copy()."""
+
+    __slots__ = ("api_key", "expires_in_us", "_hmac")
+
+    def __init__(self, api_key, api_secret, expires_in=300):
+        self.api_key = api_key
+        self.expires_in_us = expires_in * 1000000
+        self._hmac = hmac.new(base64.b64decode(api_secret), digestmod=hashlib.sha256)
+
+    def expires(self):
+        return str(time.time_ns() // 1000 + self.expires_in_us)
+
+    def sign(self, method, path, body, expires):
+        mac = self._hmac.copy()
+        mac.update(f"{self.api_key}{expires}{method}{path}{body}".encode())
+        return base64.b64encode(mac.digest()).decode()
+
+    def headers(self, method, path, body=""):
+        expires = self.expires()
+        return {
+            "Content-Type": "application/json",
+            "Arkham-Api-Key": self.api_key,
+            "Arkham-Expires": expires,
+            "Arkham-Signature": self.sign(method, path, body, expires)
+        }
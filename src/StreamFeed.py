@@ -0,0 +1,171 @@
+import time
+import json
+import random
+import asyncio
+import aiohttp
+from loguru import logger
+
+class StreamFeed:
+    """WebSocket-соединение с push-фидом Arkham: раздает тикеры и события ордеров через asyncio очереди."""
+
+    def __init__(
+            self,
+            api,
+            ws_url="wss://arkm.com/ws",
+            authenticated=False,
+            market_data=None,
+            queue_size=100,
+            heartbeat=20,
+            max_reconnect_delay=30
+    ):
+        self.api = api
+        self.ws_url = ws_url
+        self.authenticated = authenticated
+        # приватный стрим принадлежит аккаунту, публичный общий
+        self.log = api.log if authenticated else logger
+        self.market_data = market_data
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.max_reconnect_delay = max_reconnect_delay
+        self.connected = asyncio.Event()
+        self._subscriptions = {}
+        self._queues = {}
+        self._listeners = {}
+        # последний тикер по символу - для очередей, подписавшихся на уже открытую подписку
+        self._last = {}
+        self._ws = None
+        self._task = None
+
+    def _add_queue(self, key, params, queue=None):
+        """Подписка уходит на биржу только для нового ключа: N ботов на одном символе - один subscribe и один снимок,
+        а следующие очереди получают последнее сообщение из кэша."""
+        queue = queue or asyncio.Queue(maxsize=self.queue_size)
+        self._queues.setdefault(key, []).append(queue)
+        if key in self._subscriptions:
+            if key in self._last and not queue.full():
+                queue.put_nowait(self._last[key])
+            return queue
+        self._subscriptions[key] = params
+        if self._ws is not None and not self._ws.closed:
+            asyncio.ensure_future(self._send_subscribe(self._ws, key, params))
+        return queue
+
+    def subscribe_tickers(self, symbols):
+        """Одна очередь на подписчика, в нее приходят тикеры всех переданных символов."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        for symbol in symbols:
+            self._add_queue(("ticker", symbol), {"symbol": symbol}, queue)
+        return queue
+
+    def subscribe_orders(self):
+        """Очередь событий по ордерам аккаунта (требует authenticated=True)."""
+        if not self.authenticated:
+            raise ValueError("Order updates require an authenticated feed")
+        return self._add_queue(("order_statuses", None), {})
+
+    def on_orders(self, callback):
+        """Вызывать callback(event) на каждое событие по ордерам аккаунта без промежуточной очереди."""
+        if not self.authenticated:
+            raise ValueError("Order updates require an authenticated feed")
+        key = ("order_statuses", None)
+        self._listeners.setdefault(key, []).append(callback)
+        if key not in self._subscriptions:
+            self._subscriptions[key] = {}
+            if self._ws is not None and not self._ws.closed:
+                asyncio.ensure_future(self._send_subscribe(self._ws, key, {}))
+
+    def _publish(self, key, data):
+        if key[0] == "ticker":
+            # события ордеров - поток изменений, а не состояние: их не кэшируем
+            self._last[key] = data
+        for callback in self._listeners.get(key, ()):
+            callback(data)
+        for queue in self._queues.get(key, ()):
+            if queue.full():
+                # медленный подписчик теряет самые старые события, а не тормозит фид
+                queue.get_nowait()
+            queue.put_nowait(data)
+
+    def _auth_headers(self):
+        if not self.authenticated:
+            return None
+        return self.api.signer.headers("GET", "/ws")
+
+    async def _send_subscribe(self, ws, key, params):
+        channel, _ = key
+        # snapshot=True: после переподключения биржа заново присылает текущее состояние
+        await ws.send_str(json.dumps({
+            "method": "subscribe",
+            "args": {"channel": channel, "params": {**params, "snapshot": True}}
+        }))
+
+    def _dispatch(self, message):
+        channel = message.get("channel")
+        data = message.get("data")
+        if channel is None or data is None:
+            return
+
+        items = data if isinstance(data, list) else [data]
+        for item in items:
+            if channel == "ticker":
+                if self.market_data is not None:
+                    self.market_data.update(item)
+                self._publish(("ticker", item.get("symbol")), item)
+            elif channel == "order_statuses":
+                self._publish(("order_statuses", None), item)
+
+    async def _listen(self, session):
+        async with session.ws_connect(
+            self.ws_url,
+            headers=self._auth_headers(),
+            heartbeat=self.heartbeat,
+            proxy=getattr(self.api, "proxy", None)
+        ) as ws:
+            self._ws = ws
+            for key, params in list(self._subscriptions.items()):
+                await self._send_subscribe(ws, key, params)
+            self.connected.set()
+            self.log.info(f"Stream connected: {self.ws_url} ({len(self._subscriptions)} subscriptions)")
+
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    self._dispatch(json.loads(msg.data))
+                elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    break
+
+    async def run(self):
+        """Держит соединение открытым, переподключается с экспоненциальной задержкой."""
+        delay = 1
+        async with aiohttp.ClientSession() as session:
+            while True:
+                started = time.monotonic()
+                try:
+                    await self._listen(session)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.log.warning(f"Stream error: {e}")
+                finally:
+                    self._ws = None
+                    self.connected.clear()
+
+                # соединение продержалось долго - начинаем задержки заново
+                if time.monotonic() - started > self.max_reconnect_delay:
+                    delay = 1
+                self.log.warning(f"Stream disconnected, reconnecting in {delay}s...")
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+        return self._task
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
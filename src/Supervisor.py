@@ -0,0 +1,190 @@
+import os
+import time
+import queue
+import signal
+import asyncio
+import multiprocessing
+from loguru import logger
+from src.Fleet import Fleet
+from src.LogSetup import setup_logging
+
+def shard_accounts(accounts, workers):
+    """Раскладываем аккаунты по шардам по кругу, чтобы шарды были одного размера."""
+    return [accounts[i::workers] for i in range(workers)]
+
+
+def shard_config(config, shard_id):
+    """У каждого шарда свой порт метрик и свой файл снимка, иначе процессы мешают друг другу."""
+    config = dict(config)
+    if config.get("metrics_port"):
+        config["metrics_port"] += shard_id
+    if config.get("metrics_snapshot"):
+        root, ext = os.path.splitext(config["metrics_snapshot"])
+        config["metrics_snapshot"] = f"{root}.{shard_id}{ext}"
+    # тикеры у всех шардов одни и те же, пишет их только первый
+    if shard_id and config.get("tick_recorder"):
+        config["tick_recorder"] = ""
+    return config
+
+
+async def _run_shard(shard_id, accounts, config, symbols, status_queue, stop_event, heartbeat_interval):
+    fleet = Fleet(accounts, shard_config(config, shard_id), symbols).build()
+    run_task = asyncio.ensure_future(fleet.run())
+    loop = asyncio.get_running_loop()
+
+    async def heartbeat():
+        while True:
+            status_queue.put(("heartbeat", shard_id, fleet.progress()))
+            await asyncio.sleep(heartbeat_interval)
+
+    heartbeat_task = asyncio.ensure_future(heartbeat())
+    stop_task = loop.run_in_executor(None, stop_event.wait)
+    await asyncio.wait([run_task, stop_task], return_when=asyncio.FIRST_COMPLETED)
+
+    if not run_task.done():
+        logger.info(f"Шард {shard_id}: остановка по команде супервизора")
+        run_task.cancel()
+    await asyncio.gather(run_task, return_exceptions=True)
+    heartbeat_task.cancel()
+    status_queue.put(("done", shard_id, fleet.progress()))
+    # поток, ждущий stop_event, не должен держать процесс
+    stop_event.set()
+
+
+def shard_main(shard_id, accounts, config, symbols, status_queue, stop_event, heartbeat_interval):
+    """Точка входа процесса-шарда: свой event loop и свой набор ботов."""
+    # Ctrl+C получает вся группа процессов - останавливает только супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # spawn не наследует sink'и родителя, у каждого шарда свой файл
+    setup_logging(config, suffix=shard_id)
+    asyncio.run(_run_shard(shard_id, accounts, config, symbols, status_queue, stop_event, heartbeat_interval))
+
+
+class _Shard:
+    __slots__ = ("shard_id", "accounts", "process", "stop_event", "last_seen", "progress", "restarts", "done")
+
+    def __init__(self, shard_id, accounts):
+        self.shard_id = shard_id
+        self.accounts = accounts
+        self.process = None
+        self.stop_event = None
+        self.last_seen = 0.0
+        self.progress = {}
+        self.restarts = 0
+        self.done = False
+
+
+class Supervisor:
+    """Раскладывает accounts.csv по N процессам, следит за ними, перезапускает упавшие
+    и собирает общий прогресс. При остановке шарды снимают выставленные ордера."""
+
+    def __init__(self, accounts, config, symbols, workers, heartbeat_interval=10, heartbeat_timeout=120, restart_delay=5, report_interval=60):
+        self.config = config
+        self.symbols = symbols
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.restart_delay = restart_delay
+        self.report_interval = report_interval
+        self.context = multiprocessing.get_context("spawn")
+        self.status_queue = self.context.Queue()
+        self.shards = [_Shard(i, shard) for i, shard in enumerate(shard_accounts(accounts, workers)) if shard]
+        self._stopping = False
+
+    def _start(self, shard):
+        shard.stop_event = self.context.Event()
+        shard.process = self.context.Process(
+            target=shard_main,
+            args=(shard.shard_id, shard.accounts, self.config, self.symbols, self.status_queue, shard.stop_event, self.heartbeat_interval),
+            name=f"arkham-shard-{shard.shard_id}",
+            daemon=False
+        )
+        shard.process.start()
+        shard.last_seen = time.monotonic()
+        logger.info(f"Шард {shard.shard_id} запущен (pid {shard.process.pid}, аккаунтов: {len(shard.accounts)})")
+
+    def _restart(self, shard, reason):
+        shard.restarts += 1
+        logger.warning(f"Шард {shard.shard_id}: {reason}, перезапуск #{shard.restarts} через {self.restart_delay}с")
+        if shard.process.is_alive():
+            shard.process.terminate()
+            shard.process.join(10)
+        time.sleep(self.restart_delay)
+        self._start(shard)
+
+    def _drain_status(self, timeout=1):
+        """Прочитать все накопившиеся сообщения шардов, первое ждем не дольше timeout."""
+        while True:
+            try:
+                kind, shard_id, progress = self.status_queue.get(timeout=timeout)
+            except queue.Empty:
+                return
+            timeout = 0
+            shard = self.shards[shard_id]
+            shard.last_seen = time.monotonic()
+            shard.progress = progress
+            if kind == "done" and progress.get("finished") == progress.get("bots"):
+                shard.done = True
+
+    def _check(self, shard):
+        if shard.done or self._stopping:
+            return
+        if not shard.process.is_alive():
+            # финальное сообщение шарда могло прийти после последнего чтения очереди
+            self._drain_status(timeout=0)
+            if not shard.done:
+                self._restart(shard, f"процесс завершился с кодом {shard.process.exitcode}")
+        elif time.monotonic() - shard.last_seen > self.heartbeat_timeout:
+            self._restart(shard, f"нет heartbeat {self.heartbeat_timeout}с")
+
+    def progress(self):
+        total = {"shards": len(self.shards), "alive": 0, "bots": 0, "finished": 0, "spot_volume": 0.0, "perp_volume": 0.0}
+        for shard in self.shards:
+            total["alive"] += bool(shard.process and shard.process.is_alive())
+            for key in ("bots", "finished", "spot_volume", "perp_volume"):
+                total[key] += shard.progress.get(key, 0)
+        return total
+
+    def _request_stop(self, *_):
+        if not self._stopping:
+            logger.info("Остановка: шарды отменяют ордера и завершаются...")
+        self._stopping = True
+        for shard in self.shards:
+            if shard.stop_event is not None:
+                shard.stop_event.set()
+
+    def _forward_signal(self, signum, _):
+        """Профилирование включается в шардах: SIGUSR1/SIGUSR2 супервизору уходят всем живым шардам."""
+        for shard in self.shards:
+            if shard.process is not None and shard.process.is_alive():
+                os.kill(shard.process.pid, signum)
+
+    def run(self):
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGTERM, self._request_stop)
+        for name in ("SIGUSR1", "SIGUSR2"):
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), self._forward_signal)
+
+        for shard in self.shards:
+            self._start(shard)
+
+        last_report = time.monotonic()
+        while any(shard.process.is_alive() for shard in self.shards) or not (
+            self._stopping or all(shard.done for shard in self.shards)
+        ):
+            self._drain_status()
+            for shard in self.shards:
+                self._check(shard)
+
+            if time.monotonic() - last_report >= self.report_interval:
+                last_report = time.monotonic()
+                progress = self.progress()
+                logger.info(
+                    f"Прогресс: шардов {progress['alive']}/{progress['shards']}, "
+                    f"ботов завершили {progress['finished']}/{progress['bots']}, "
+                    f"spot {progress['spot_volume']:.0f}, perp {progress['perp_volume']:.0f}"
+                )
+
+        for shard in self.shards:
+            shard.process.join()
+        logger.info(f"Все шарды завершены: {self.progress()}")
@@ -0,0 +1,66 @@
+import math
+import random
+from src.MarketDataCache import MarketDataCache
+
+
+class SymbolSelector:
+    """Выбор символа для новой позиции по общему снимку тикеров.
+
+    Вес символа - оборот за 24ч (логарифм) на доллар издержек (комиссии двух сторон
+    плюс спред), умноженный на наблюдаемую скорость исполнения наших лимиток.
+    Выбор взвешенно-случайный, чтобы весь флот не стоял в одном стакане.
+    fee_rate - ставка maker одной стороны (Fleet берет ее из fee_rates настроек).
+    """
+
+    def __init__(self, market_data: MarketDataCache, symbols, limit_hold_time=30, fee_rate=0.0002, sharpness=2, fill_alpha=0.2):
+        self.market_data = market_data
+        self.symbols = list(symbols)
+        self.limit_hold_time = limit_hold_time
+        self.fee_rate = fee_rate
+        self.sharpness = sharpness
+        self.fill_alpha = fill_alpha
+        self._fill_seconds = {}
+        self._weights = None
+        self._weights_at = None
+
+    def record_order(self, symbol, seconds, filled):
+        """Итог лимитного ордера: сглаженное время до исполнения; неисполненный считается вдвое дольше удержания."""
+        if symbol not in self.symbols:
+            return
+        if not filled:
+            seconds = max(seconds, 2 * self.limit_hold_time)
+        previous = self._fill_seconds.get(symbol)
+        self._fill_seconds[symbol] = seconds if previous is None else previous + self.fill_alpha * (seconds - previous)
+        self._weights = None
+
+    def score(self, symbol, ticker):
+        price = float(ticker.get("price") or 0)
+        bid = float(ticker.get("bestBidPrice") or price)
+        ask = float(ticker.get("bestAskPrice") or price)
+        mid = (bid + ask) / 2 or price
+        if mid <= 0:
+            return 0.0
+
+        spread = max(ask - bid, 0.0) / mid
+        turnover = float(ticker.get("usdVolume24h") or 0) or float(ticker.get("volume24h") or 0) * mid
+        speed = self.limit_hold_time / (self.limit_hold_time + self._fill_seconds.get(symbol, 0.0))
+        return math.log1p(turnover) * speed / (2 * self.fee_rate + spread)
+
+    def weights(self):
+        """Веса пересчитываются только при новом снимке тикеров или новом исполнении."""
+        if self._weights is None or self._weights_at != self.market_data.refreshed_at:
+            tickers = self.market_data.get_cached_tickers(self.symbols)
+            self._weights = {symbol: self.score(symbol, ticker) ** self.sharpness for symbol, ticker in tickers.items()}
+            self._weights_at = self.market_data.refreshed_at
+        return self._weights
+
+    async def choose(self, exclude=()):
+        """Символ для новой позиции; exclude - символы, в которых у аккаунта уже есть позиция."""
+        await self.market_data.refresh_if_stale()
+        weights = self.weights()
+        candidates = [symbol for symbol, weight in weights.items() if weight > 0 and symbol not in exclude]
+        if not candidates:
+            # снимка нет - поведение как раньше
+            rest = [symbol for symbol in self.symbols if symbol not in exclude]
+            return random.choice(rest) if rest else None
+        return random.choices(candidates, weights=[weights[symbol] for symbol in candidates])[0]
@@ -0,0 +1,172 @@
+import os
+import json
+import mmap
+import time
+import struct
+from loguru import logger
+
+# колонки: имя файла, формат struct, dtype NumPy для чтения
+COLUMNS = (
+    ("ts", "<q", "<i8"),        # время, микросекунды unix
+    ("symbol", "<H", "<u2"),    # id символа из symbols.json
+    ("price", "<d", "<f8"),
+    ("bid", "<d", "<f8"),
+    ("ask", "<d", "<f8"),
+)
+COUNT_FILE = "count"
+SYMBOLS_FILE = "symbols.json"
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class _Column:
+    __slots__ = ("file", "map", "packer")
+
+    def __init__(self, path, packer, capacity):
+        self.packer = packer
+        self.file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        self.map = None
+        self.resize(capacity)
+
+    def resize(self, capacity):
+        size = capacity * self.packer.size
+        if self.map is not None:
+            self.map.close()
+        if os.fstat(self.file.fileno()).st_size < size:
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+
+class TickRecorder:
+    """Запись снимков тикеров в колоночные файлы фиксированной ширины через mmap.
+
+    На каждый день (UTC) - каталог path/YYYY-MM-DD с файлом на колонку, symbols.json и счетчиком
+    записанных строк. Счетчик обновляется после колонок, поэтому читатель всегда видит целые строки.
+    Файлы растут удвоением, запись тика - несколько pack_into в уже отображенную память.
+    """
+
+    def __init__(self, path="ticks", symbols=None, chunk_rows=65536):
+        self.path = path
+        # без фильтра массовый /public/tickers записал бы все пары биржи
+        self.symbols = set(symbols) if symbols else None
+        self.chunk_rows = chunk_rows
+        self._columns = None
+        self._count_map = None
+        self._count_file = None
+        self._count_packer = struct.Struct("<q")
+        self._packers = [struct.Struct(fmt) for _, fmt, _ in COLUMNS]
+        self._day_dir = None
+        self._day_end = 0
+        self._symbols = {}
+        self.capacity = 0
+        self.count = 0
+
+    def _open_day(self, now):
+        self.close()
+        day_start = int(now) // 86400 * 86400
+        self._day_end = day_start + 86400
+        self._day_dir = os.path.join(self.path, time.strftime("%Y-%m-%d", time.gmtime(day_start)))
+        os.makedirs(self._day_dir, exist_ok=True)
+
+        # перезапуск в тот же день - дописываем в конец
+        count_path = os.path.join(self._day_dir, COUNT_FILE)
+        self._count_file = open(count_path, "r+b" if os.path.exists(count_path) else "w+b")
+        if os.fstat(self._count_file.fileno()).st_size < self._count_packer.size:
+            self._count_file.truncate(self._count_packer.size)
+        self._count_map = mmap.mmap(self._count_file.fileno(), self._count_packer.size)
+        self.count = self._count_packer.unpack_from(self._count_map)[0]
+        try:
+            with open(os.path.join(self._day_dir, SYMBOLS_FILE)) as f:
+                self._symbols = {symbol: index for index, symbol in enumerate(json.load(f))}
+        except (OSError, ValueError):
+            self._symbols = {}
+
+        self.capacity = max(self.chunk_rows, self.count)
+        self._columns = [
+            _Column(os.path.join(self._day_dir, f"{name}.bin"), packer, self.capacity)
+            for (name, _, _), packer in zip(COLUMNS, self._packers)
+        ]
+        logger.info(f"Запись тиков в {self._day_dir} с позиции {self.count}")
+
+    def _symbol_id(self, symbol):
+        symbol_id = self._symbols.get(symbol)
+        if symbol_id is None:
+            symbol_id = self._symbols[symbol] = len(self._symbols)
+            tmp_path = os.path.join(self._day_dir, f"{SYMBOLS_FILE}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(list(self._symbols), f)
+            os.replace(tmp_path, os.path.join(self._day_dir, SYMBOLS_FILE))
+        return symbol_id
+
+    def record(self, ticker, now=None):
+        """Дописать тикер (словарь symbol/price и, если есть, bestBidPrice/bestAskPrice)."""
+        if self.symbols is not None and ticker["symbol"] not in self.symbols:
+            return
+        now = time.time() if now is None else now
+        if now >= self._day_end:
+            self._open_day(now)
+        if self.count >= self.capacity:
+            self.capacity *= 2
+            for column in self._columns:
+                column.resize(self.capacity)
+
+        index = self.count
+        values = (
+            int(now * 1000000),
+            self._symbol_id(ticker["symbol"]),
+            _float(ticker.get("price")),
+            _float(ticker.get("bestBidPrice")),
+            _float(ticker.get("bestAskPrice")),
+        )
+        for column, value in zip(self._columns, values):
+            column.packer.pack_into(column.map, index * column.packer.size, value)
+        self.count = index + 1
+        self._count_packer.pack_into(self._count_map, 0, self.count)
+
+    def close(self):
+        if self._columns is None:
+            return
+        for column in self._columns:
+            column.close()
+        self._count_map.flush()
+        self._count_map.close()
+        self._count_file.close()
+        self._columns = None
+
+
+def list_days(path="ticks"):
+    """Дни, за которые есть запись, по возрастанию."""
+    if not os.path.isdir(path):
+        return []
+    return sorted(day for day in os.listdir(path) if os.path.exists(os.path.join(path, day, COUNT_FILE)))
+
+
+def load_day(path, day):
+    """День тиков как массивы NumPy поверх файлов без копирования.
+
+    Возвращает словарь колонок (ts, symbol, price, bid, ask) и список symbols, где symbols[id] - имя символа.
+    """
+    # numpy нужен только для анализа записанных данных, боту он не требуется
+    import numpy as np
+
+    day_dir = os.path.join(path, day)
+    count = int(np.fromfile(os.path.join(day_dir, COUNT_FILE), dtype="<i8", count=1)[0])
+    data = {}
+    for name, _, dtype in COLUMNS:
+        data[name] = np.memmap(os.path.join(day_dir, f"{name}.bin"), dtype=dtype, mode="r", shape=(count,)) if count else np.empty(0, dtype)
+    try:
+        with open(os.path.join(day_dir, SYMBOLS_FILE)) as f:
+            data["symbols"] = json.load(f)
+    except OSError:
+        data["symbols"] = []
+    return data
@@ -1,15 +1,31 @@
-import sqlite3
+import time
+import uuid
 import random
 from datetime import datetime, timedelta
-from loguru import logger
-import requests
-from src.ArkhamAPI import ArkhamAPI
+import aiohttp
+from src.ArkhamAPI import ORDER_NOT_FOUND
+from src.AsyncArkhamAPI import AsyncArkhamAPI
+from src.MarketDataCache import MarketDataCache
+from src.StreamFeed import StreamFeed
+from src.OrderStore import OrderStore, SIZE_EPSILON
+from src.OrderEngine import OrderEngine, OrderState
+from src.AccountState import AccountState
+from src.Metrics import Metrics
+from src.SymbolSelector import SymbolSelector
+from src.InstrumentCache import Instrument, DEFAULT_TICK
 import asyncio
 
+# комиссии для оценки по исполнениям, если в настройках нет fee_rates
+DEFAULT_FEE_RATES = {"maker": 0.0002, "taker": 0.0005}
+# допустимое расхождение локального объема с биржей между сверками, доля объема биржи
+VOLUME_DRIFT_TOLERANCE = 0.02
+# статусы ордера Arkham, после которых он уже не исполнится
+FINAL_STATUSES = ("closed", "cancelled")
+
 class VolumePumpBot:
     def __init__(
             self, 
-            api: ArkhamAPI, 
+            api: AsyncArkhamAPI, 
             symbols: dict, 
             spot_target_volume: float, 
             perp_target_volume: float, 
@@ -20,7 +36,22 @@ class VolumePumpBot:
             hold_time: int,
             limit_order_diff: float,
             limit_hold_time: int,
-            db_path="orders.db"
+            db_path="orders.db",
+            store: OrderStore = None,
+            market_data: MarketDataCache = None,
+            ticker_feed: StreamFeed = None,
+            order_feed: StreamFeed = None,
+            engine: OrderEngine = None,
+            account_state: AccountState = None,
+            metrics: Metrics = None,
+            selector: SymbolSelector = None,
+            on_order_placed=None,
+            fee_rates: dict = None,
+            max_positions: int = 1,
+            position_allocation: float = 0,
+            max_position_notional: float = 0,
+            defer_fills=False,
+            cycle_delay=(40, 50)
     ):
         self.api = api
         self.symbols = symbols
@@ -34,58 +65,67 @@ class VolumePumpBot:
         self.perp_target_volume = perp_target_volume
         self.limit_order_diff= limit_order_diff
         self.limit_hold_time = limit_hold_time
-        self._setup_db()
-        logger.add("logs/bot.log", rotation="1 day", level="INFO")
-
-    def _setup_db(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''CREATE TABLE IF NOT EXISTS orders (
-                            order_id TEXT PRIMARY KEY,
-                            account_id TEXT,
-                            symbol TEXT,
-                            side TEXT,
-                            size REAL,
-                            open_price REAL,
-                            status TEXT,
-                            created_at TIMESTAMP,
-                            closed_at TIMESTAMP,
-                            check_count INTEGER DEFAULT 0)''')
-        conn.commit()
-        conn.close()
-
-    def _save_order(self, order_id, account_id, symbol, side, size, open_price):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''INSERT INTO orders (order_id, account_id, symbol, side, size, open_price, status, created_at) 
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', 
-                        (order_id, account_id, symbol, side, size, open_price, "open", datetime.now()))
-        conn.commit()
-        conn.close()
-        logger.info(f"Сохранен ордер {order_id} для {account_id}: {side} {size} {symbol} по цене {open_price}")
-
-    def _update_order(self, order_id, status, closed_at=None):
+        self.market_data = market_data
+        self.cycle_delay = cycle_delay
+        self.spot_volume = 0
+        self.perp_volume = 0
+        self.finished = False
+        self.ticker_events = ticker_feed.subscribe_tickers(symbols) if ticker_feed else None
+        self.store = store or OrderStore(db_path)
+        self.engine = engine or OrderEngine(limit_hold_time=limit_hold_time)
+        self.account = account_state or AccountState(api)
+        self.metrics = metrics
+        self.selector = selector
+        self.on_order_placed = on_order_placed
+        self.fee_rates = {**DEFAULT_FEE_RATES, **(fee_rates or {})}
+        # несколько позиций в разных символах одновременно; 0 - баланс делится поровну между ними
+        self.max_positions = max_positions
+        self.position_allocation = position_allocation or 0.95 / max_positions
+        self.max_position_notional = max_position_notional
+        self._positions = {}
+        # под CycleScheduler цикл не ждет исполнения: ордер отдается движку, а слот аккаунта
+        # возвращается в расписание по задачам ожидания ордеров из take_awaiting
+        self.defer_fills = defer_fills
+        self._awaiting = []
+        # последний ответ биржи по объему и поправка к локальным итогам (сделки до базы или мимо бота)
+        self._remote_volume = None
+        self._volume_offset = None
+        if order_feed is not None:
+            self.engine.attach_feed(api, order_feed)
+            order_feed.on_orders(self.account.on_order_event)
+        # контекст аккаунта уже привязан в клиенте, второй bound-логгер на бота не нужен
+        self.log = api.log
+
+    def _set_phase(self, phase):
+        if self.metrics is not None:
+            self.metrics.set_phase(self.api.alias, phase)
+
+    async def _save_order(self, order_id, account_id, symbol, side, size, open_price):
+        log = self.log.bind(symbol=symbol)
+        await self.store.save_order(order_id, account_id, symbol, side, size, open_price)
+        log.info(f"Сохранен ордер {order_id}: {side} {size} {symbol} по цене {open_price}")
+
+    async def _update_order(self, order_id, status, closed_at=None):
         """Обновление статуса ордера."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''UPDATE orders 
-                        SET status = ?, closed_at = ? 
-                        WHERE order_id = ?''', 
-                        (status, closed_at, order_id))
-        conn.commit()
-        conn.close()
-        logger.info(f"Обновлен ордер {order_id}: статус {status}")
-
-    def _get_open_orders(self, account_id):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM orders WHERE account_id = ? AND status = 'open'", (account_id,))
-        open_orders = cursor.fetchall()
-        conn.close()
-        return open_orders
-
-    def _calculate_limit_price(self, current_price, side, rounding_step=0.01):
-        """Рассчитать цену лимитного ордера с учетом шага цены."""
+        await self.store.update_order(order_id, status, closed_at)
+        self.log.info(f"Обновлен ордер {order_id}: статус {status}")
+
+    async def _get_open_orders(self, account_id):
+        return await self.store.get_open_orders(account_id)
+
+    async def _get_market_price(self, symbol):
+        """Цена из общего кэша, если он подключен, иначе прямой запрос."""
+        if self.market_data is not None:
+            return await self.market_data.get_price(symbol)
+        return await self.api.get_market_price(symbol)
+
+    def _instrument(self, symbol):
+        """Шаги пары с биржи; без кэша инструментов - rounding_step из настроек как лот."""
+        instrument = self.api.instruments.get(symbol) if self.api.instruments is not None else None
+        return instrument or Instrument(symbol, DEFAULT_TICK, self.symbols[symbol]["rounding_step"])
+
+    def _calculate_limit_price(self, current_price, side, symbol):
+        """Рассчитать цену лимитного ордера с учетом шага цены пары."""
         adjustment = current_price * self.limit_order_diff
         if side == "buy":
             limit_price = current_price - adjustment
@@ -94,182 +134,488 @@ class VolumePumpBot:
         else:
             limit_price = current_price
 
-        # Округление до кратного шага цены
-        return round(limit_price - (limit_price % rounding_step), 2)
+        # Округление до кратного шага цены: покупка вниз, продажа вверх
+        return float(self._instrument(symbol).price(limit_price, side))
+
+
+    async def _reprice(self, symbol, side):
+        """Новая лимитная цена для перевыставления зависшего ордера."""
+        current_price = await self._get_market_price(symbol)
+        if current_price is None:
+            return None
+        return self._calculate_limit_price(current_price, side, symbol)
+
+    async def _on_replace(self, old_order, new_order):
+        """Позиция в базе должна ссылаться на актуальный ордер на покупку."""
+        if new_order.side == "buy":
+            await self.store.replace_order(old_order.order_id, new_order.order_id, new_order.price)
 
+    async def _record_fill(self, order):
+        """Исполнение ордера движка - в таблицу fills и дневные итоги."""
+        await self._store_fill(order.order_id, order.symbol, order.side, order.filled_size, order.avg_price or order.price, order.order_type)
+
+    async def _store_fill(self, order_id, symbol, side, size, price, order_type):
+        if not price:
+            self.log.bind(symbol=symbol).warning(f"Нет цены исполнения ордера {order_id}, объем не учтен")
+            return
+        liquidity = "taker" if order_type == "market" else "maker"
+        fee = size * price * self.fee_rates[liquidity]
+        await self.store.record_fill(order_id, self.api.api_key, symbol, side, size, price, fee, liquidity)
+
+    async def _submit_order(self, symbol, side, size, price, type, position_id=None):
+        """create_order с записью ордера в pending_orders до отправки. Строка удаляется, когда ответ биржи
+        записан в orders; если ответа нет, ее по clientOrderId разбирает _resolve_pending следующего цикла."""
+        client_order_id = str(uuid.uuid4())
+        await self.store.save_pending(client_order_id, self.api.api_key, symbol, side, size, price, position_id)
+        response = await self.api.create_order(price=price, size=size, side=side, symbol=symbol, type=type, client_order_id=client_order_id)
+        return client_order_id, response
+
+    async def _resolve_pending(self, symbol=None, defer=False):
+        """Ордера из pending_orders: найденный на бирже становится позицией (вход) или закрывает ее исполненной частью (продажа),
+        еще живой - ждем как обычно, ненайденный удаляем. False, если исход какого-то ордера все еще неизвестен.
+
+        Без symbol пропускаем символы с работающей задачей позиции: там ордер может быть еще в пути.
+        """
+        resolved = True
+        for client_order_id, pending_symbol, side, size, price, position_id in await self.store.get_pending(self.api.api_key):
+            if pending_symbol != symbol and (symbol is not None or pending_symbol in self._positions):
+                continue
+            log = self.log.bind(symbol=pending_symbol)
+            found = await self.api.get_order_by_client_id(client_order_id)
+            if found is None:
+                resolved = False
+                continue
+            if found == ORDER_NOT_FOUND:
+                log.info(f"Ордер {client_order_id} ({side} {size} {pending_symbol}) не дошел до биржи")
+                await self.store.delete_pending(client_order_id)
+                continue
 
-    async def _wait_until_filled(self, order_id=None, symbol=None, size=None,  side=None):
-        start_time = datetime.now()
-        while True:
+            order_id = found["orderId"]
+            filled = float(found.get("executedSize") or 0)
+            order_price = float(found.get("avgPrice") or 0) or float(found.get("price") or 0) or price
+            live = found.get("status") not in FINAL_STATUSES and filled < float(found.get("size") or size)
+            log.warning(f"Ордер {client_order_id} без ответа биржи найден: {order_id}, статус {found.get('status')}, исполнено {filled}")
+            if not live and filled <= 0:
+                await self.store.delete_pending(client_order_id)
+                continue
+
+            if side == "buy":
+                await self.store.open_pending(client_order_id, order_id, self.api.api_key, pending_symbol, size if live else filled, price if live else order_price)
+            else:
+                if not live:
+                    await self._close_position_row(position_id, size, size - filled)
+                await self.store.delete_pending(client_order_id)
+            if live:
+                # как после обычного выставления: до исполнения позиция не управляется
+                await self._wait_until_filled(
+                    order_id, pending_symbol, size, side=side, price=price, order_type=found.get("type") or "limitGtc",
+                    position_id=position_id, defer=defer
+                )
+            else:
+                await self._store_fill(order_id, pending_symbol, side, filled, order_price, found.get("type"))
+        return resolved
+
+    async def _volume(self):
+        """Объем для сравнения с целями: локальные итоги плюс поправка по последнему ответу биржи.
+
+        Статистика биржи запрашивается редко (TTL volume в AccountState); после каждого нового ответа
+        поправка пересчитывается, а ее скачок означает сделки, которых нет в локальных итогах.
+        """
+        local = await self.store.get_volume(self.api.api_key)
+        remote = await self.account.volume()
+        if remote is not None and remote is not self._remote_volume:
+            offset = tuple(r - l for r, l in zip(remote, local))
+            if self._volume_offset is not None:
+                drift = (offset[0] - self._volume_offset[0]) + (offset[1] - self._volume_offset[1])
+                if abs(drift) > VOLUME_DRIFT_TOLERANCE * max(remote[0] + remote[1], 1.0):
+                    self.log.warning(f"Объем на бирже расходится с локальными итогами на {drift:.2f} USDT, поправка обновлена")
+            self._remote_volume, self._volume_offset = remote, offset
+        if self._volume_offset is None:
+            return None
+        return tuple(l + o for l, o in zip(local, self._volume_offset))
+
+    async def _wait_until_filled(self, order_id, symbol, size, side, price=None, order_type="limitGtc", position_id=None, defer=False):
+        """Передать ордер движку и дождаться исполнения или отмены. С defer - не ждать, а оставить задачу
+        в take_awaiting: итог запишет колбэк, когда движок завершит ордер. position_id - позиция, которую закрывает продажа."""
+        order = self.engine.track(
+            self.api, order_id, symbol, side, size, price,
+            order_type=order_type,
+            reprice=self._reprice if order_type != "market" else None,
+            on_replace=self._on_replace,
+            on_fill=self._record_fill
+        )
+        self.log.bind(symbol=symbol).info("Ожидание заполнения ордера...")
+        self._set_phase("waiting_fill")
+        started = time.monotonic()
+        if defer:
+            settled = asyncio.ensure_future(self._settle_order(order, position_id, size))
+            self._awaiting.append(settled)
+            settled.add_done_callback(lambda task: self._on_settled(task, symbol, side, order_type, started))
+            return None
+        return self._order_finished(await self._settle_order(order, position_id, size), symbol, side, order_type, started)
+
+    async def _settle_order(self, order, position_id=None, size=None):
+        """Дождаться конечного состояния ордера в движке и привести к нему позицию в базе."""
+        order = await self.engine.wait(order)
+        # не исполнен только остаток последнего ордера цепочки перевыставлений
+        unfilled = 0 if order.state == OrderState.FILLED else order.size - order.filled_size
+        if order.side == "buy" and order.state == OrderState.CANCELLED:
+            # строка позиции уже переехала на последний ордер цепочки
+            await self.store.reduce_order(order.order_id, unfilled, OrderState.CANCELLED)
+            self.log.bind(symbol=order.symbol).info(f"Вход {order.order_id} снят, позиция уменьшена на {unfilled}")
+        elif order.side == "sell" and position_id is not None:
+            await self._close_position_row(position_id, size, unfilled)
+        return order
+
+    async def _close_position_row(self, position_id, size, unfilled):
+        """Продажа size завершена: позиция закрывается, если продано все, иначе уменьшается на проданное
+        (снятая продажа без исполнений оставляет позицию открытой)."""
+        if unfilled <= SIZE_EPSILON:
+            await self._update_order(position_id, "closed", closed_at=datetime.now())
+        elif size - unfilled > SIZE_EPSILON:
+            await self.store.reduce_order(position_id, size - unfilled, "closed", datetime.now())
+            self.log.info(f"Позиция {position_id} закрыта частично: продано {size - unfilled}")
+
+    def _on_settled(self, task, symbol, side, order_type, started):
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.log.bind(symbol=symbol).error(f"Не удалось записать итог ордера: {task.exception()}")
+            return
+        self._order_finished(task.result(), symbol, side, order_type, started)
+
+    def _order_finished(self, order, symbol, side, order_type, started):
+        log = self.log.bind(symbol=symbol)
+        if self.metrics is not None:
+            self.metrics.observe_order(self.api.alias, side, order.state, time.monotonic() - started, order.requotes)
+        if self.selector is not None and order_type != "market":
+            self.selector.record_order(symbol, time.monotonic() - started, order.state == OrderState.FILLED)
+        # без стрима ордеров о своих исполнениях узнаем только здесь; объем уже в локальных итогах
+        self.account.invalidate("balances", "open_orders")
+        if order.state == OrderState.FILLED:
+            log.info(f"Ордер {order.order_id} для {symbol} исполнен")
+        else:
+            log.warning(f"Ордер {order.order_id} для {symbol} завершен со статусом {order.state}")
+        return order
+
+    def take_awaiting(self):
+        """Задачи ордеров, отданных движку в этом цикле без ожидания (defer_fills)."""
+        awaiting, self._awaiting = self._awaiting, []
+        return awaiting
+
+    async def _adopt_resting_orders(self):
+        """Ордера на бирже, о которых движок не знает (например, после перезапуска), берем под наблюдение и ждем
+        (с defer_fills - оставляем их задачи в take_awaiting).
+
+        Символы с работающей задачей позиции пропускаем: ее ордер может быть уже выставлен, но еще не передан движку.
+        """
+        resting = await self.account.open_orders()
+        orders = [
+            self.engine.track(
+                self.api, item["orderId"], item.get("symbol"), item.get("side"),
+                float(item.get("size") or 0), float(item.get("price") or 0),
+                client_order_id=item.get("clientOrderId"),
+                reprice=self._reprice if item.get("symbol") in self.symbols else None,
+                on_replace=self._on_replace,
+                on_fill=self._record_fill
+            )
+            for item in resting or []
+            if not self.engine.is_tracked(item.get("orderId")) and item.get("symbol") not in self._positions
+        ]
+        if orders:
+            self.log.info(f"Найдено {len(orders)} открытых ордеров на бирже, ожидание заполнения...")
+            self._set_phase("waiting_fill")
+            # продажа закрывает самую старую открытую позицию своего символа
+            positions = {}
+            for row in sorted(await self._get_open_orders(account_id=self.api.api_key), key=lambda row: row[7], reverse=True):
+                if row[3] == "buy":
+                    positions[row[2]] = row[0]
+            settled = [
+                asyncio.ensure_future(self._settle_order(order, positions.get(order.symbol) if order.side == "sell" else None, order.size))
+                for order in orders
+            ]
+            if self.defer_fills:
+                self._awaiting.extend(settled)
+            else:
+                await asyncio.gather(*settled)
+
+    async def _idle(self, seconds):
+        """Пауза между циклами; со стримом тикеров просыпаемся раньше, если цена дошла до тейк-профита."""
+        if self.ticker_events is None:
+            await asyncio.sleep(seconds)
+            return
+
+        targets = {}
+        for order in await self._get_open_orders(account_id=self.api.api_key):
+            symbol, side, open_price = order[2], order[3], order[5]
+            if side == "buy":
+                targets[symbol] = min(targets.get(symbol, float("inf")), open_price * (1 + self.slippage))
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + seconds
+        while (remaining := deadline - loop.time()) > 0:
             try:
-                open_orders = self.api.get_open_orders()
-                if not open_orders:
-                    logger.info(f"Нет открытых ордеров")
-                    break
-
-                elapsed_time = (datetime.now() - start_time).total_seconds()
-                if elapsed_time >= self.limit_hold_time:
-                    logger.warning(f"Ордер {order_id} для {symbol} не заполнился за {self.limit_hold_time} секунд. Переустановка ордера.")
-                    self.api.cancel_orders()
-                    
-                    current_price = self.api.get_market_price(symbol)
-                    new_price = self._calculate_limit_price(current_price, side, self.symbols[symbol]["rounding_step"])
-                    new_order = self.api.create_order(price=new_price, size=size, side=side, symbol=symbol, type="limitGtc")
-
-                    if new_order and "orderId" in new_order:
-                        order_id = new_order["orderId"]
-                        start_time = datetime.now()
-                    else:
-                        logger.error(f"Не удалось создать новый ордер для {symbol}.")
-                        break
-                logger.info("Ожидание заполнения ордера...")
-                await asyncio.sleep(5)
-
-            except Exception as e:
-                logger.error(f"Ошибка при ожидании заполнения ордера для {symbol}: {e}")
-                await asyncio.sleep(10)
-
-
-    async def open_position(self, symbol):
+                ticker = await asyncio.wait_for(self.ticker_events.get(), remaining)
+            except asyncio.TimeoutError:
+                return
+            target = targets.get(ticker.get("symbol"))
+            if target and float(ticker.get("price") or 0) >= target:
+                self.log.bind(symbol=ticker["symbol"]).info(f"Цена {ticker['price']} достигла тейк-профита, проверяем позиции")
+                return
+
+    async def open_position(self, symbol, defer=False):
         """Открытие позиции на весь доступный баланс с лимитным ордером."""
-        balance = self.api.get_balance_for_symbol("USDT")
+        log = self.log.bind(symbol=symbol)
+        balance = await self.account.balance("USDT")
         if balance is None or balance <= 0:
-            logger.error("Недостаточно средств на балансе USDT.")
+            log.error("Недостаточно средств на балансе USDT.")
             return
 
-        current_price = self.api.get_market_price(symbol)
+        current_price = await self._get_market_price(symbol)
         if current_price is None:
-            logger.error(f"Не удалось получить цену для {symbol}.")
+            log.error(f"Не удалось получить цену для {symbol}.")
             return
 
-        size = (balance * 0.95 * self.leverage / current_price) if self.is_perpetual else (balance * 0.95 / current_price)
-        size = round(size - (size % self.symbols[symbol]["rounding_step"]), 10)
+        # залог позиции - доля всего баланса, но не больше свободного: параллельные позиции делят один счет
+        total = await self.account.balance("USDT", field="balance") or balance
+        margin = min(balance * 0.95, total * self.position_allocation)
+        notional = margin * self.leverage if self.is_perpetual else margin
+        if self.max_position_notional:
+            notional = min(notional, self.max_position_notional)
+        size = float(self._instrument(symbol).size(notional / current_price))
 
-        limit_price = self._calculate_limit_price(current_price, side="buy", rounding_step=self.symbols[symbol]["rounding_step"])
-        response = self.api.create_order(price=limit_price, size=size, side="buy", symbol=symbol, type="limitGtc")
+        limit_price = self._calculate_limit_price(current_price, side="buy", symbol=symbol)
+        client_order_id, response = await self._submit_order(symbol, "buy", size, limit_price, "limitGtc")
 
         if response and "orderId" in response:
             order_id = response["orderId"]
-            self._save_order(order_id, self.api.api_key, symbol, "buy", size, limit_price)
-            await self._wait_until_filled(order_id, symbol, size, side="buy")
+            if self.on_order_placed is not None:
+                self.on_order_placed(self)
+            await self._save_order(order_id, self.api.api_key, symbol, "buy", size, limit_price)
+            await self.store.delete_pending(client_order_id)
+            await self._wait_until_filled(order_id, symbol, size, side="buy", price=limit_price, defer=defer)
         else:
-            logger.error(f"Ошибка при открытии позиции для {symbol}.")
+            log.error(f"Ошибка при открытии позиции для {symbol}.")
 
 
-    async def close_position_limit(self, order_id, symbol, size):
+    async def close_position_limit(self, order_id, symbol, size, defer=False):
         """Закрытие позиции лимитным ордером с небольшим увеличением цены."""
-        current_price = self.api.get_market_price(symbol)
+        log = self.log.bind(symbol=symbol)
+        current_price = await self._get_market_price(symbol)
         if current_price is None:
-            logger.error(f"Не удалось получить цену для {symbol}.")
+            log.error(f"Не удалось получить цену для {symbol}.")
             return
 
-        limit_price = self._calculate_limit_price(current_price, side="sell", rounding_step=self.symbols[symbol]["rounding_step"])
-        response = self.api.create_order(price=limit_price, size=size, side="sell", symbol=symbol, type="limitGtc")
+        limit_price = self._calculate_limit_price(current_price, side="sell", symbol=symbol)
+        size = float(self._instrument(symbol).size(size))
+        client_order_id, response = await self._submit_order(symbol, "sell", size, limit_price, "limitGtc", position_id=order_id)
 
-        if response:
-            self._update_order(order_id, "closed", closed_at=datetime.now())
-            await self._wait_until_filled(order_id, symbol, size, side="sell")
+        if response and "orderId" in response:
+            await self.store.delete_pending(client_order_id)
+            # позиция закрывается исполнением продажи: снятая продажа (например, при остановке) оставляет ее открытой
+            await self._wait_until_filled(response["orderId"], symbol, size, side="sell", price=limit_price, position_id=order_id, defer=defer)
         else:
-            logger.error(f"Ошибка при закрытии позиции для {symbol}.")
+            log.error(f"Ошибка при закрытии позиции для {symbol}.")
 
 
-    async def close_position_by_market(self, order_id, symbol, size):
+    async def close_position_by_market(self, order_id, symbol, size, defer=False):
         """Закрытие позиции (продажа)."""
-        current_price = self.api.get_market_price(symbol)
+        log = self.log.bind(symbol=symbol)
+        current_price = await self._get_market_price(symbol)
         if current_price is None:
-            logger.error(f"Не удалось получить цену для {symbol}.")
+            log.error(f"Не удалось получить цену для {symbol}.")
             return
+
+        size = float(self._instrument(symbol).size(size))
+        client_order_id, response = await self._submit_order(symbol, "sell", size, current_price, "market", position_id=order_id)
         
-        response = self.api.create_order(price=current_price, size=size, side="sell", symbol=symbol, type="market")
-        
-        if response:
-            self._update_order(order_id, "closed", closed_at=datetime.now())
-            await self._wait_until_filled(order_id, symbol, size, side="sell")
+        if response and "orderId" in response:
+            await self.store.delete_pending(client_order_id)
+            # цена маркета заранее неизвестна - для учета объема берем текущую, если биржа не пришлет avgPrice
+            await self._wait_until_filled(
+                response["orderId"], symbol, size, side="sell", price=current_price, order_type="market", position_id=order_id, defer=defer
+            )
         else:
-            logger.error(f"Ошибка при закрытии позиции для {symbol}.")
+            log.error(f"Ошибка при закрытии позиции для {symbol}.")
+
+    async def _manage_position(self, order, defer=False):
+        """Проверка одной позиции: тейк-профит, после hold_time - безубыток или принудительное закрытие."""
+        order_id, account_id, symbol, side, size, open_price, status, created_at, closed_at, check_count = order
+        log = self.log.bind(symbol=symbol)
+
+        created_at = datetime.strptime(created_at.split(".")[0], "%Y-%m-%d %H:%M:%S")
+        hold_time = datetime.now() - created_at
+        current_price = await self._get_market_price(symbol)
+        if not defer:
+            # в планировщике паузу между проверками держит расписание, а не воркер
+            await asyncio.sleep(2)
 
-    async def manage_positions(self):
-        open_orders = self._get_open_orders(account_id=self.api.api_key)
+        if not current_price:
+            log.error(f"Не удалось получить текущую цену для {symbol}.")
+            return
 
-        for order in open_orders:
-            order_id, account_id, symbol, side, size, open_price, status, created_at, closed_at, check_count = order
+        if current_price >= open_price*(1 + self.slippage):
+            log.info(f"Текущая цена больше цены открытия на {self.slippage} - закрываем позицию")
+            await self.close_position_limit(order_id, symbol, size, defer)
+            return
 
-            if side != "buy":
-                continue
+        if hold_time >= timedelta(minutes=self.hold_time):
+            if current_price >= open_price:
+                await self.close_position_limit(order_id, symbol, size, defer)
+                return
 
-            created_at = datetime.strptime(created_at.split(".")[0], "%Y-%m-%d %H:%M:%S")
-            hold_time = datetime.now() - created_at
-            current_price = self.api.get_market_price(symbol)
-            await asyncio.sleep(2)
+            if check_count >= self.max_check_price:
+                log.warning(f"Принудительное закрытие {symbol}, цена: {current_price}")
+                await self.close_position_limit(order_id, symbol, size, defer)
+            else:
+                await self.store.increment_check_count(order_id)
 
-            if not current_price:
-                logger.error(f"{account_id}: Не удалось получить текущую цену для {symbol}.")
-                continue
+                log.info(f"Цена для {symbol} ниже точки входа. Проверка #{check_count + 1}.")
 
-            if current_price >= open_price*(1 + self.slippage):
-                logger.info(f"Текущая цена больше цены открытия на {self.slippage} - закрываем позицию")
-                await self.close_position_limit(order_id, symbol, size)
-                continue
+    async def manage_positions(self):
+        open_orders = await self._get_open_orders(account_id=self.api.api_key)
 
-            if hold_time >= timedelta(minutes=self.hold_time):
-                if current_price >= open_price:
-                    await self.close_position_limit(order_id, symbol, size)
+        for order in open_orders:
+            if order[3] != "buy":
+                continue
+            await self._manage_position(order, self.defer_fills)
+
+    async def _position_rows(self, symbol):
+        return [row for row in await self._get_open_orders(account_id=self.api.api_key) if row[2] == symbol and row[3] == "buy"]
+
+    async def _position_loop(self, symbol):
+        """Жизненный цикл одной позиции в многосимвольном режиме: вход, удержание и выход независимо от остальных."""
+        log = self.log.bind(symbol=symbol)
+        try:
+            if await self._resolve_pending(symbol) and not await self._position_rows(symbol):
+                await self.open_position(symbol)
+            while await self._position_rows(symbol):
+                await asyncio.sleep(random.randint(*self.cycle_delay))
+                # пока исход прошлой продажи неизвестен, вторую не выставляем
+                if not await self._resolve_pending(symbol):
                     continue
-
-                if check_count >= self.max_check_price:
-                    logger.warning(f"{account_id}: Принудительное закрытие {symbol}, цена: {current_price}")
-                    await self.close_position_limit(order_id, symbol, size)
+                for row in await self._position_rows(symbol):
+                    await self._manage_position(row)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log.error(f"Произошла ошибка сети: {e}")
+        except Exception as e:
+            log.error(f"Неизвестная ошибка позиции: {e}")
+
+    def _spawn_position(self, symbol):
+        task = asyncio.ensure_future(self._position_loop(symbol))
+        self._positions[symbol] = task
+        task.add_done_callback(lambda _: self._positions.pop(symbol, None))
+
+    async def _start_positions(self, open_orders):
+        """Задача на каждую позицию из базы и новые позиции в свободных символах, пока есть слоты."""
+        for symbol in {row[2] for row in open_orders if row[3] == "buy"} - self._positions.keys():
+            self._spawn_position(symbol)
+
+        opened = []
+        while len(self._positions) < self.max_positions:
+            if self.selector is not None:
+                symbol = await self.selector.choose(exclude=self._positions.keys())
+            else:
+                free = [symbol for symbol in self.symbols if symbol not in self._positions]
+                symbol = random.choice(free) if free else None
+            if symbol is None:
+                break
+            self._spawn_position(symbol)
+            opened.append(symbol)
+        if opened:
+            self.log.info(f"Новые позиции: {', '.join(opened)}; всего {len(self._positions)}/{self.max_positions}")
+
+    async def close(self):
+        """Остановить задачи позиций многосимвольного режима."""
+        tasks = list(self._positions.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run_cycle(self):
+        """Один цикл бота. Возвращает паузу до следующего цикла в секундах или None, если объем набран."""
+        try:
+            self._set_phase("account_state")
+            # балансы, открытые ордера и объем - одним параллельным раундом, свежие поля берутся из кэша
+            await self.account.refresh()
+            if not await self._resolve_pending(defer=self.defer_fills):
+                # найденный позже ордер стал бы второй позицией или второй продажей
+                self.log.warning("Исход выставленных ранее ордеров неизвестен, новые ордера пока не выставляем")
+                self._set_phase("error_backoff")
+                return 10
+            await self._adopt_resting_orders()
+            if self._awaiting:
+                # цикл продолжится, когда движок завершит найденные ордера
+                return 0
+
+            volume = await self._volume()
+            if volume is None:
+                self.log.error("Не удалось получить объем торгов.")
+                self._set_phase("error_backoff")
+                return 10
+            spot_volume, perp_volume, spot_fees, perp_fees = volume
+            self.spot_volume, self.perp_volume = spot_volume, perp_volume
+            if self.metrics is not None:
+                self.metrics.set_volume(self.api.alias, spot_volume, perp_volume, self.spot_target_volume, self.perp_target_volume)
+
+            target_reached = perp_volume >= self.perp_target_volume if self.is_perpetual else spot_volume >= self.spot_target_volume
+            if target_reached and self._positions:
+                # новые позиции уже не открываем, ждем закрытия текущих
+                self._set_phase("finishing")
+                return random.randint(*self.cycle_delay)
+
+            if spot_volume >= self.spot_target_volume and not self.is_perpetual:
+                self.log.info(f"Целевой объем по споту {self.spot_target_volume} достигнут!")
+                self.finished = True
+                self._set_phase("finished")
+                return None
+
+            if perp_volume >= self.perp_target_volume and self.is_perpetual:
+                self.log.info(f"Целевой объем по фьючам {self.spot_target_volume} достигнут!")
+                self.finished = True
+                self._set_phase("finished")
+                return None
+
+            open_orders = await self._get_open_orders(account_id=self.api.api_key)
+
+            if self.max_positions > 1:
+                self._set_phase("managing")
+                await self._start_positions(open_orders)
+            elif not open_orders:
+                self.log.info(f"Spot volume: {spot_volume}")
+                self.log.info(f"Spot fees: {spot_fees}")
+
+                self.log.info(f"PERP volume: {perp_volume}")
+                self.log.info(f"PERP fees: {perp_fees}")
+                if self.selector is not None:
+                    symbol = await self.selector.choose()
                 else:
-                    conn = sqlite3.connect(self.db_path)
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        '''UPDATE orders SET check_count = check_count + 1 WHERE order_id = ?''',
-                        (order_id,)
-                    )
-                    conn.commit()
-                    conn.close()
-
-                    logger.info(f"{account_id}: Цена для {symbol} ниже точки входа. Проверка #{check_count + 1}.")
-
-    async def run(self):
-        """Запуск бота с учетом рандомной задержки."""
-        while True:
-            try:
-                if self.api.get_open_orders():
-                    self._wait_until_filled()
-
-                spot_volume, perp_volume, spot_fees, perp_fees = self.api.get_trading_volume()
-                
-
-                if spot_volume >= self.spot_target_volume and not self.is_perpetual:
-                    logger.info(f"Целевой объем по споту {self.spot_target_volume} достигнут!")
-                    break
-
-                if perp_volume >= self.perp_target_volume and self.is_perpetual:
-                    logger.info(f"Целевой объем по фьючам {self.spot_target_volume} достигнут!")
-                    break
-
-                open_orders = self._get_open_orders(account_id=self.api.api_key)
-
-                if not open_orders:
-                    logger.info(f"Spot volume: {spot_volume}")
-                    logger.info(f"Spot fees: {spot_fees}")
-
-                    logger.info(f"PERP volume: {perp_volume}")
-                    logger.info(f"PERP fees: {perp_fees}")
                     symbol = random.choice(list(self.symbols.keys()))
-                    await self.open_position(symbol)
+                self._set_phase("opening")
+                await self.open_position(symbol, self.defer_fills)
+                if not self.defer_fills:
                     await asyncio.sleep(2)
-                else:
-                    await self.manage_positions()
+            else:
+                self._set_phase("managing")
+                await self.manage_positions()
 
-                await asyncio.sleep(random.randint(40, 50))
+            self._set_phase("waiting_fill" if self._awaiting else "idle")
+            return random.randint(*self.cycle_delay)
 
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Произошла ошибка сети: {e}")
-                await asyncio.sleep(10)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.log.error(f"Произошла ошибка сети: {e}")
+            self._set_phase("error_backoff")
+            return 10
 
-            except Exception as e:
-                logger.error(f"Неизвестная ошибка: {e}")
-                await asyncio.sleep(10)
+        except Exception as e:
+            self.log.error(f"Неизвестная ошибка: {e}")
+            self._set_phase("error_backoff")
+            return 10
 
+    async def run(self):
+        """Запуск бота с учетом рандомной задержки."""
+        try:
+            while (delay := await self.run_cycle()) is not None:
+                await self._idle(delay)
+        finally:
+            await self.close()
@@ -1,6 +1,47 @@
+import re
 import csv
+import base64
+import binascii
 from chardet import detect
 
+# ключ: (тип, минимум, максимум); None - без ограничения
+REQUIRED_CONFIG = {
+    "hold_time": ((int, float), 0, None),
+    "spot_target_volume": ((int, float), 0, None),
+    "perp_target_volume": ((int, float), 0, None),
+    "max_check_price": (int, 0, None),
+    "slippage": ((int, float), 0, 1),
+    "is_perpetual": ((int, bool), 0, 1),
+    "leverage": ((int, float), 1, None),
+    "limit_order_diff": ((int, float), 0, 1),
+    "limit_hold_time": ((int, float), 0.001, None)
+}
+
+OPTIONAL_CONFIG = {
+    "http_pool_limit": (int, 1, None),
+    "http_timeout": ((int, float), 0.001, None),
+    "price_cache_ttl": ((int, float), 0, None),
+    "max_retries": (int, 0, None),
+    "order_timeout": ((int, float), 0.001, None),
+    "order_attempts": (int, 1, None),
+    "order_hedge_percentile": ((int, float), 0, 99.9),
+    "workers": (int, 1, None),
+    "scheduler_workers": (int, 0, None),
+    "scheduler_max_queued": (int, 0, None),
+    "metrics_port": (int, 0, 65535),
+    "metrics_account_histograms": ((int, bool), 0, 1),
+    "startup_ramp_seconds": ((int, float), 0, None),
+    "startup_burst": (int, 1, None),
+    "reconcile_on_start": ((int, bool), 0, 1),
+    "reconcile_concurrency": (int, 1, None),
+    "slow_callback_ms": ((int, float), 1, None),
+    "max_positions": (int, 1, None),
+    "position_allocation": ((int, float), 0, 1),
+    "max_position_notional": ((int, float), 0, None)
+}
+
+PROXY_RE = re.compile(r"^(?:[^:@/\s]+:[^@/\s]*@)?[\w.-]+:\d{1,5}$")
+
 def detect_encoding(file_path, sample_size=4096):
     """Определение кодировки файла по первым байтам."""
     try:
@@ -19,13 +60,76 @@ def load_account_info(file_path='accounts.csv'):
 
     with open(file_path, mode='r', encoding=encoding) as file:
         reader = csv.DictReader(file)
-        for row in reader:
+        for number, row in enumerate(reader, start=1):
             api_key = row.get('api_key')
             api_secret = row.get('api_secret')
             proxy = row.get('proxy')
             accounts.append({
+                # псевдоним для логов и метрик, чтобы не светить ключ
+                'alias': row.get('alias') or f"acc{number}",
                 'api_key': api_key,
                 'api_secret': api_secret,
                 'proxy': proxy
             })
-    return accounts
\ No newline at end of file
+    return accounts
+
+
+def _check_value(errors, key, value, spec):
+    types, low, high = spec
+    types = types if isinstance(types, tuple) else (types,)
+    # bool - подкласс int, но там, где ждем число, это ошибка
+    if (isinstance(value, bool) and bool not in types) or not isinstance(value, types):
+        errors.append(f"{key}: ожидается число, получено {value!r}")
+    elif (low is not None and value < low) or (high is not None and value > high):
+        errors.append(f"{key}: {value} вне допустимого диапазона [{low}, {high if high is not None else '∞'}]")
+
+
+def validate_config(config):
+    """Проверка config.json один раз при старте; все ошибки сразу одним ValueError."""
+    errors = []
+    for key, spec in REQUIRED_CONFIG.items():
+        if key not in config:
+            errors.append(f"{key}: обязательный параметр отсутствует")
+        else:
+            _check_value(errors, key, config[key], spec)
+    for key, spec in OPTIONAL_CONFIG.items():
+        if key in config:
+            _check_value(errors, key, config[key], spec)
+    allocation = config.get("position_allocation") or 0
+    positions = config.get("max_positions", 1)
+    if isinstance(allocation, (int, float)) and isinstance(positions, int) and allocation * positions > 1:
+        errors.append(f"position_allocation: {allocation} x max_positions {positions} больше всего баланса")
+    if "fee_rates" in config:
+        if not isinstance(config["fee_rates"], dict):
+            errors.append(f"fee_rates: ожидается словарь maker/taker, получено {config['fee_rates']!r}")
+        else:
+            for key, value in config["fee_rates"].items():
+                _check_value(errors, f"fee_rates.{key}", value, ((int, float), 0, 1))
+    if errors:
+        raise ValueError("Ошибки в config.json:\n  " + "\n  ".join(errors))
+    return config
+
+
+def validate_accounts(accounts):
+    """Проверка accounts.csv: пустые ключи, битые секреты, дубли и формат прокси."""
+    errors = []
+    seen = {}
+    for number, account in enumerate(accounts, start=1):
+        name = account.get("alias") or f"строка {number}"
+        if not account.get("api_key") or not account.get("api_secret"):
+            errors.append(f"{name}: не заполнены api_key/api_secret")
+            continue
+        try:
+            base64.b64decode(account["api_secret"], validate=True)
+        except (binascii.Error, ValueError):
+            errors.append(f"{name}: api_secret не в base64")
+        if account["api_key"] in seen:
+            errors.append(f"{name}: api_key повторяет {seen[account['api_key']]}")
+        seen[account["api_key"]] = name
+        if account.get("proxy") and not PROXY_RE.match(account["proxy"]):
+            errors.append(f"{name}: прокси должен быть в формате user:pass@ip:port")
+    if not accounts:
+        errors.append("нет ни одного аккаунта")
+    if errors:
+        raise ValueError("Ошибки в accounts.csv:\n  " + "\n  ".join(errors))
+    return accounts
@@ -0,0 +1,35 @@
+import pytest
+from benchmarks.mock_exchange import MockExchange
+from src.AsyncArkhamAPI import AsyncArkhamAPI
+from src.OrderStore import OrderStore
+from src.VolumePumpBot import VolumePumpBot
+
+
+@pytest.fixture
+def symbol():
+    return "ETH_USDT_PERP"
+
+
+@pytest.fixture
+def mock_exchange(symbol):
+    """Фабрика: MockExchange с одной парой и клиент к нему. Вызывать внутри event loop теста,
+    останавливать (api.close, exchange.stop) - там же."""
+    async def start(api_options=None, **options):
+        exchange = MockExchange({symbol: 2000.0}, **{"latency": 0.001, "jitter": 0, "seed": 1, **options})
+        await exchange.start()
+        api = AsyncArkhamAPI("key", "c2VjcmV0", alias="test", **(api_options or {}))
+        api.base_url = exchange.base_url
+        return exchange, api
+    return start
+
+
+@pytest.fixture
+def make_bot(symbol, tmp_path):
+    """Фабрика бота на одну пару с базой во временном каталоге; bot.store закрывает тест."""
+    def make(api, engine, **options):
+        store = OrderStore(str(tmp_path / "orders.db"))
+        return VolumePumpBot(
+            api, {symbol: {"rounding_step": 0.001}}, 240000, 1000000, 3, 0.003, 1, 2, 5, 0.0001, 30,
+            store=store, engine=engine, **options
+        )
+    return make
@@ -0,0 +1,48 @@
+import asyncio
+from src.CycleScheduler import CycleScheduler
+
+
+class FakeBot:
+    """Первый цикл "выставляет ордер" и отдает его future, второй завершает бота."""
+
+    def __init__(self):
+        self.cycles = 0
+        self.order = None
+        self._awaiting = []
+
+    async def run_cycle(self):
+        self.cycles += 1
+        if self.cycles == 1:
+            self.order = asyncio.get_running_loop().create_future()
+            self._awaiting.append(self.order)
+            return 0
+        return None
+
+    def take_awaiting(self):
+        awaiting, self._awaiting = self._awaiting, []
+        return awaiting
+
+
+def test_worker_is_not_held_while_orders_wait():
+    async def scenario():
+        scheduler = CycleScheduler(workers=1)
+        bots = [FakeBot() for _ in range(5)]
+        for bot in bots:
+            scheduler.add(bot)
+        scheduler.finish_admission()
+        task = asyncio.ensure_future(scheduler.run())
+
+        await asyncio.sleep(0.1)
+        # один воркер успел выставить ордера всех ботов: ни один не ждет исполнения на воркере
+        parked = scheduler.snapshot()
+        first_cycles = [bot.cycles for bot in bots]
+
+        for bot in bots:
+            bot.order.set_result(None)
+        await asyncio.wait_for(task, 2)
+        return parked, first_cycles, [bot.cycles for bot in bots]
+
+    parked, first_cycles, cycles = asyncio.run(scenario())
+    assert first_cycles == [1] * 5
+    assert parked["waiting"] == 5 and parked["busy"] == 0
+    assert cycles == [2] * 5
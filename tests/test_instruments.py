@@ -0,0 +1,56 @@
+from decimal import Decimal
+from src.ArkhamAPI import ArkhamAPI
+from src.InstrumentCache import Instrument, DEFAULT_TICK
+
+
+def _api(*instruments):
+    api = ArkhamAPI("key", "c2VjcmV0", alias="test")
+    # у InstrumentCache тот же get по символу
+    api.instruments = {instrument.symbol: instrument for instrument in instruments}
+    return api
+
+
+def test_price_rounds_buy_down_and_sell_up():
+    instrument = Instrument("ETH_USDT", "0.01", "0.001")
+    assert instrument.price(1999.987, "buy") == Decimal("1999.98")
+    assert instrument.price(1999.981, "sell") == Decimal("1999.99")
+    # цена уже на шаге не сдвигается ни в одну сторону
+    assert instrument.price(1999.98, "sell") == Decimal("1999.98")
+
+
+def test_size_rounds_down_to_lot():
+    instrument = Instrument("BTC_USDT", "0.1", "0.00001")
+    assert instrument.size(0.123456789) == Decimal("0.12345")
+    assert instrument.size(0.000009) == 0
+
+
+def test_min_notional():
+    instrument = Instrument("ETH_USDT", "0.01", "0.001", min_notional="5")
+    assert instrument.meets_min_notional(Decimal("2000"), Decimal("0.0025"))
+    assert not instrument.meets_min_notional(Decimal("2000"), Decimal("0.002"))
+
+
+def test_order_below_min_notional_is_rejected():
+    api = _api(Instrument("ETH_USDT", "0.01", "0.001", min_notional="5"))
+    assert api._quantize_order(2000.0, 0.002, "buy", "ETH_USDT", "limitGtc") is None
+    assert api._quantize_order(2000.0, 0.0031, "buy", "ETH_USDT", "limitGtc") == (Decimal("2000.00"), Decimal("0.003"))
+
+
+def test_price_rounded_to_zero_is_rejected():
+    # метаданных пары нет: шаг цены по умолчанию и нулевой min_notional
+    api = _api(Instrument("PEPE_USDT", DEFAULT_TICK, "1"))
+    assert api._quantize_order(0.0000091, 1000000, "buy", "PEPE_USDT", "limitGtc") is None
+    assert _api()._quantize_order(0.0, 1.0, "buy", "PEPE_USDT", "limitGtc") is None
+
+
+def test_zero_size_is_rejected():
+    api = _api(Instrument("BTC_USDT", "0.1", "0.00001"))
+    assert api._quantize_order(60000.0, 0.000001, "sell", "BTC_USDT", "market") is None
+
+
+def test_order_body_has_no_exponent():
+    instrument = Instrument("PEPE_USDT", "0.00000001", "1")
+    body = ArkhamAPI._order_body(instrument.price(0.0000091234), Decimal("0.00001"), "buy", "PEPE_USDT", "limitGtc")
+    assert body["price"] == "0.00000912"
+    assert body["size"] == "0.00001"
+    assert ArkhamAPI._order_body(1.5, 0.00001, "buy", "PEPE_USDT", "limitGtc")["size"] == "0.00001"
@@ -0,0 +1,21 @@
+from src.Metrics import Metrics
+
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.inc("arkham_orders_total", help_text="Ордера\nпо статусу", account='acc "1"\\x\nnew')
+    text = metrics.render()
+    assert 'arkham_orders_total{account="acc \\"1\\"\\\\x\\nnew"} 1.0' in text
+    assert "# HELP arkham_orders_total Ордера\\nпо статусу" in text
+
+
+def test_fill_histogram_is_not_per_account_by_default():
+    metrics = Metrics()
+    metrics.observe_order("acc1", "buy", "filled", 3.0, 0)
+    assert list(metrics._values["arkham_order_fill_seconds"]) == [(("side", "buy"),)]
+    # счетчики по аккаунту остаются
+    assert (("account", "acc1"), ("side", "buy"), ("state", "filled")) in metrics._values["arkham_orders_total"]
+
+    metrics = Metrics(account_histograms=True)
+    metrics.observe_order("acc1", "buy", "filled", 3.0, 0)
+    assert list(metrics._values["arkham_order_fill_seconds"]) == [(("account", "acc1"), ("side", "buy"))]
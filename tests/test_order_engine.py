@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+from loguru import logger
+from src.ArkhamAPI import ORDER_NOT_FOUND
+from src.OrderEngine import OrderEngine, OrderState
+
+
+class FakeAPI:
+    """Ордер уже пропал из открытых; get_order отдает то, что о нем знает биржа."""
+
+    api_key = "key"
+    log = logger.bind(account="test")
+
+    def __init__(self, order):
+        self.order = order
+
+    async def get_open_orders(self):
+        return []
+
+    async def get_order(self, order_id):
+        return self.order
+
+
+def _finish(order_item):
+    async def scenario():
+        engine = OrderEngine(poll_interval=0.01, tick=0.01)
+        fills = []
+
+        async def on_fill(order):
+            fills.append(order.filled_size)
+
+        order = engine.track(FakeAPI(order_item), 1, "ETH_USDT_PERP", "buy", 1.0, 2000.0, on_fill=on_fill)
+        order.placed_at -= 1
+        try:
+            order = await asyncio.wait_for(engine.wait(order), 2)
+            await asyncio.sleep(0.05)
+            return order, fills
+        finally:
+            await engine.close()
+
+    return asyncio.run(scenario())
+
+
+def test_missing_filled_order_is_filled():
+    order, fills = _finish({"orderId": 1, "status": "closed", "executedSize": "1.0", "avgPrice": "1999.5"})
+    assert order.state == OrderState.FILLED
+    assert order.avg_price == 1999.5
+    assert fills == [1.0]
+
+
+def test_missing_expired_order_is_not_a_fill():
+    order, fills = _finish({"orderId": 1, "status": "closed", "executedSize": "0"})
+    assert order.state == OrderState.CANCELLED
+    assert fills == []
+
+
+def test_missing_partially_filled_order_keeps_its_fill():
+    order, fills = _finish({"orderId": 1, "status": "cancelled", "executedSize": "0.4"})
+    assert order.state == OrderState.CANCELLED
+    assert fills == [0.4]
+
+
+def test_order_unknown_to_exchange_is_cancelled():
+    order, fills = _finish(ORDER_NOT_FOUND)
+    assert order.state == OrderState.CANCELLED
+    assert fills == []
+
+
+def _expire_entry(mock_exchange, make_bot, symbol, executed):
+    """Вход выставлен, а биржа снимает его, исполнив executed от размера; что осталось от позиции в базе."""
+    async def scenario():
+        exchange, api = await mock_exchange(fill_rate=0)
+        engine = OrderEngine(poll_interval=0.05, tick=0.02)
+        bot = make_bot(api, engine, defer_fills=True)
+        try:
+            await bot.open_position(symbol, defer=True)
+            (order_id, *_), = await bot.store.get_open_orders("key")
+            order = exchange.orders["key"][int(order_id)]
+            exchange.expire("key", order["orderId"], executed=str(float(order["size"]) * executed))
+            await asyncio.wait_for(asyncio.gather(*bot.take_awaiting()), 5)
+            rows = await bot.store.execute(lambda conn: conn.execute("SELECT size, status FROM orders").fetchall())
+            return float(order["size"]), rows, await bot.store.get_open_orders("key")
+        finally:
+            await engine.close()
+            await bot.store.close()
+            await api.close()
+            await exchange.stop()
+
+    return asyncio.run(scenario())
+
+
+def test_unfilled_entry_is_not_left_open(mock_exchange, make_bot, symbol):
+    size, rows, open_rows = _expire_entry(mock_exchange, make_bot, symbol, 0)
+    assert rows == [(0.0, "cancelled")]
+    # иначе manage_positions продал бы несуществующую позицию
+    assert open_rows == []
+
+
+def test_partially_filled_entry_keeps_filled_size(mock_exchange, make_bot, symbol):
+    size, rows, open_rows = _expire_entry(mock_exchange, make_bot, symbol, 0.5)
+    assert rows == [(pytest.approx(size * 0.5), "open")]
+    assert len(open_rows) == 1
@@ -0,0 +1,128 @@
+import asyncio
+from src.AsyncArkhamAPI import AsyncArkhamAPI, PLACED, REJECTED, UNKNOWN
+from src.OrderEngine import OrderEngine
+from src.RateLimiter import LatencyTracker
+
+
+async def _lookup_fails(client_order_id):
+    return None
+
+
+def _slow_exchange(mock_exchange, **options):
+    # ответ на /orders/new приходит позже срока попытки, хотя ордер уже принят
+    return mock_exchange({"order_timeout": 0.2, "order_attempts": 3}, slow_order_rate=1.0, slow_order_delay=0.5, **options)
+
+
+def test_create_order_does_not_retry_when_lookup_fails(mock_exchange, symbol):
+    async def scenario():
+        exchange, api = await _slow_exchange(mock_exchange, fill_rate=0)
+        api.get_order_by_client_id = _lookup_fails
+        try:
+            response = await api.create_order(1990.0, 0.01, "buy", symbol, "limitGtc")
+            await asyncio.sleep(0.5)
+            return response, list(exchange.by_client_id["key"])
+        finally:
+            await api.close()
+            await exchange.stop()
+
+    response, placed = asyncio.run(scenario())
+    assert response is None
+    # повтор ушел бы с тем же clientOrderId и был бы отклонен, но его не должно быть вовсе
+    assert len(placed) == 1
+
+
+def test_unknown_entry_is_resolved_on_next_cycle(mock_exchange, make_bot, symbol):
+    async def scenario():
+        exchange, api = await _slow_exchange(mock_exchange, fill_rate=10)
+        engine = OrderEngine()
+        bot = make_bot(api, engine)
+        store = bot.store
+        try:
+            api.get_order_by_client_id = _lookup_fails
+            await bot.open_position(symbol)
+            pending = await store.get_pending("key")
+            positions_before = await store.get_open_orders("key")
+
+            # биржа снова отвечает: следующий цикл находит ордер по clientOrderId
+            del api.get_order_by_client_id
+            await asyncio.sleep(0.5)
+            resolved = await bot._resolve_pending()
+            positions = await store.get_open_orders("key")
+            volume = await store.get_volume("key")
+            return pending, positions_before, resolved, positions, await store.get_pending("key"), volume, exchange.by_client_id["key"]
+        finally:
+            await engine.close()
+            await store.close()
+            await api.close()
+            await exchange.stop()
+
+    pending, positions_before, resolved, positions, pending_after, volume, placed = asyncio.run(scenario())
+    assert len(pending) == 1 and positions_before == []
+    client_order_id = pending[0][0]
+    assert resolved is True
+    assert pending_after == []
+    assert [row[0] for row in positions] == [str(placed[client_order_id]["orderId"])]
+    assert volume[1] > 0
+
+
+def _hedged(attempts):
+    """create_order, где первая попытка дольше порога хеджирования; attempts - корутины попыток по порядку.
+    Возвращает ответ, clientOrderId, которые искали по бирже, и снятые ордера."""
+    async def scenario():
+        latency = LatencyTracker(min_samples=1)
+        latency.observe(0.01)
+        api = AsyncArkhamAPI("key", "c2VjcmV0", alias="test", order_hedge_percentile=50, order_latency=latency)
+        queue = iter(attempts)
+        lookups, cancelled = [], []
+
+        async def place_once(body):
+            return await next(queue)(body)
+
+        async def lookup(client_order_id):
+            lookups.append(client_order_id)
+            return {"orderId": 1, "clientOrderId": client_order_id, "status": "booked"}
+
+        async def cancel(order_id):
+            cancelled.append(order_id)
+            return {}
+
+        api._place_once, api.get_order_by_client_id, api.cancel_order = place_once, lookup, cancel
+        try:
+            response = await api.create_order(1990.0, 0.01, "buy", "ETH_USDT_PERP", "limitGtc")
+            await asyncio.gather(*api._hedges)
+            return response, lookups, cancelled
+        finally:
+            await api.close()
+
+    return asyncio.run(scenario())
+
+
+def test_unknown_primary_outweighs_rejected_hedge():
+    async def primary(body):
+        await asyncio.sleep(0.1)
+        return UNKNOWN, "TimeoutError"
+
+    async def hedge(body):
+        # баланс уже занят ордером первой попытки
+        return REJECTED, "400 - insufficient balance"
+
+    response, lookups, cancelled = _hedged([primary, hedge])
+    assert response == {"orderId": 1, "clientOrderId": lookups[0]}
+    assert len(lookups) == 1
+
+
+def test_both_hedged_attempts_placed_at_once():
+    released = None
+
+    async def attempt(order_id):
+        nonlocal released
+        if released is None:
+            released = asyncio.Event()
+            asyncio.get_running_loop().call_later(0.1, released.set)
+        await released.wait()
+        return PLACED, {"orderId": order_id, "clientOrderId": "c"}
+
+    response, lookups, cancelled = _hedged([lambda body: attempt(1), lambda body: attempt(2)])
+    # лишний ордер снимается, какая бы из попыток ни вернулась первой
+    assert sorted([response["orderId"], *cancelled]) == [1, 2]
+    assert lookups == []
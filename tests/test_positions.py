@@ -0,0 +1,90 @@
+import asyncio
+from src.OrderEngine import OrderEngine
+
+
+async def _open(exchange, bot, symbol):
+    """Вход выставлен и исполнен; строка позиции в базе."""
+    await bot.open_position(symbol, defer=True)
+    (order_id, *_), = await bot.store.get_open_orders("key")
+    exchange._fill("key", exchange.orders["key"][int(order_id)])
+    await asyncio.wait_for(asyncio.gather(*bot.take_awaiting()), 5)
+    return (await bot.store.get_open_orders("key"))[0]
+
+
+def _close(mock_exchange, make_bot, symbol, finish):
+    """Позиция открыта, продажа выставлена, дальше finish(exchange, api, engine, bot) завершает ее."""
+    async def scenario():
+        exchange, api = await mock_exchange(fill_rate=0)
+        engine = OrderEngine(poll_interval=0.05, tick=0.02)
+        bot = make_bot(api, engine, defer_fills=True)
+        try:
+            position = await _open(exchange, bot, symbol)
+            await bot.close_position_limit(position[0], symbol, position[4], defer=True)
+            resting = await bot.store.get_open_orders("key")
+            await finish(exchange, api, engine, bot)
+            return position, resting, await bot.store.get_open_orders("key")
+        finally:
+            await engine.close()
+            await bot.store.close()
+            await api.close()
+            await exchange.stop()
+
+    return asyncio.run(scenario())
+
+
+def test_position_closes_when_sell_fills(mock_exchange, make_bot, symbol):
+    async def fill(exchange, api, engine, bot):
+        (sell,) = exchange.orders["key"].values()
+        exchange._fill("key", sell)
+        await asyncio.wait_for(asyncio.gather(*bot.take_awaiting()), 5)
+
+    position, resting, after = _close(mock_exchange, make_bot, symbol, fill)
+    # пока продажа стоит в стакане, позиция остается открытой
+    assert resting == [position]
+    assert after == []
+
+
+def test_sell_cancelled_on_shutdown_keeps_position(mock_exchange, make_bot, symbol):
+    async def shutdown(exchange, api, engine, bot):
+        # порядок Fleet.shutdown: движок остановлен, затем снимаются все ордера аккаунта
+        await engine.close()
+        await api.cancel_orders()
+
+    position, resting, after = _close(mock_exchange, make_bot, symbol, shutdown)
+    assert after == [position]
+
+
+def test_partially_filled_sell_reduces_position(mock_exchange, make_bot, symbol):
+    async def expire(exchange, api, engine, bot):
+        (sell,) = exchange.orders["key"].values()
+        exchange.expire("key", sell["orderId"], executed=str(float(sell["size"]) * 0.25))
+        await asyncio.wait_for(asyncio.gather(*bot.take_awaiting()), 5)
+
+    position, resting, after = _close(mock_exchange, make_bot, symbol, expire)
+    (row,) = after
+    assert abs(row[4] - position[4] * 0.75) < 1e-9
+
+
+def test_position_loop_skips_cancelled_entry(mock_exchange, make_bot, symbol):
+    async def scenario():
+        exchange, api = await mock_exchange(fill_rate=0)
+        engine = OrderEngine(poll_interval=0.05, tick=0.02)
+        bot = make_bot(api, engine, max_positions=2, cycle_delay=(0, 0))
+        try:
+            loop = asyncio.ensure_future(bot._position_loop(symbol))
+            while not exchange.orders["key"]:
+                await asyncio.sleep(0.02)
+            (entry,) = exchange.orders["key"].values()
+            exchange.expire("key", entry["orderId"])
+            await asyncio.wait_for(loop, 5)
+            return [order["side"] for order in exchange.placed["key"].values()], await bot.store.get_open_orders("key")
+        finally:
+            await engine.close()
+            await bot.store.close()
+            await api.close()
+            await exchange.stop()
+
+    sides, open_rows = asyncio.run(scenario())
+    # снятый вход - не позиция: задача завершается, ничего не продав
+    assert sides == ["buy"]
+    assert open_rows == []
@@ -0,0 +1,24 @@
+import asyncio
+from aiohttp.test_utils import make_mocked_request
+from src.Profiler import Profiler
+
+
+def _start(profiler, query):
+    async def scenario():
+        response = await profiler._handle_cpu_start(make_mocked_request("POST", f"/debug/cpu/start?{query}"))
+        running = profiler.cpu.running
+        profiler.stop_cpu()
+        return response.status, running
+    return asyncio.run(scenario())
+
+
+def test_cpu_start_rejects_bad_parameters(tmp_path):
+    profiler = Profiler(str(tmp_path))
+    for query in ("interval=abc", "slow_ms=fast", "interval=-1", "interval=nan", "slow_ms=inf"):
+        assert _start(profiler, query) == (400, False), query
+
+
+def test_cpu_start_accepts_numbers(tmp_path):
+    profiler = Profiler(str(tmp_path))
+    assert _start(profiler, "interval=0.01&slow_ms=50") == (200, True)
+    assert profiler.slow.threshold == 0.05
@@ -0,0 +1,92 @@
+import asyncio
+from loguru import logger
+from src.OrderStore import OrderStore
+from src.Reconciler import Reconciler
+
+SPOT = "ETH_USDT"
+NOW_US = 1_800_000_000_000_000
+
+
+class FakeAPI:
+    """Состояние аккаунта для сверки; balances и fills - как в ответах Arkham."""
+
+    def __init__(self, api_key, open_orders=(), balances=(), fills=()):
+        self.api_key = api_key
+        self.alias = api_key
+        self.log = logger.bind(account=api_key)
+        self.state = list(open_orders), list(balances), list(fills)
+
+    async def get_open_orders(self):
+        return self.state[0]
+
+    async def get_balances(self):
+        return self.state[1]
+
+    async def get_fills(self, limit):
+        return self.state[2]
+
+    async def close(self):
+        pass
+
+
+def _row(order_id, size=1.0, created_at="2020-01-01 00:00:00"):
+    return (order_id, "key", SPOT, "buy", size, 2000.0, "open", created_at, None, 0)
+
+
+def _fill(order_id, side="buy", size="1.0", time=NOW_US):
+    return {"orderId": order_id, "symbol": SPOT, "side": side, "size": size, "price": "2000", "time": time}
+
+
+def _diff(api, rows=(), known=(), latest=None):
+    async def scenario():
+        reconciler = Reconciler(None, lambda account: account, [SPOT])
+        _, state = await reconciler._fetch(api)
+        return reconciler._diff(api, state, list(rows), set(known), latest)
+    return asyncio.run(scenario())
+
+
+def test_position_closed():
+    # вход исполнен, а монет на балансе уже нет
+    api = FakeAPI("key", balances=[{"symbol": "ETH", "balance": "0"}], fills=[_fill(1)])
+    report, updates, inserts = _diff(api, rows=[_row("1")], known={"1"})
+    assert [item["kind"] for item in report] == ["position_closed"]
+    assert [(status, order_id) for status, _, order_id in updates] == [("closed", "1")]
+    assert inserts == []
+
+
+def test_entry_not_found():
+    api = FakeAPI("key", balances=[{"symbol": "ETH", "balance": "0"}])
+    report, updates, inserts = _diff(api, rows=[_row("2")], known={"2"})
+    assert [item["kind"] for item in report] == ["entry_not_found"]
+    assert [(status, order_id) for status, _, order_id in updates] == [("cancelled", "2")]
+
+
+def test_fill_not_in_db():
+    # бот упал между ответом биржи и записью: покупка новее последней строки аккаунта
+    api = FakeAPI("key", balances=[{"symbol": "ETH", "balance": "1.0"}], fills=[_fill(3)])
+    report, updates, inserts = _diff(api, latest="2020-01-01 00:00:00")
+    assert [item["kind"] for item in report] == ["fill_not_in_db"]
+    assert inserts == [("3", "key", SPOT, "buy", 1.0, 2000.0)]
+    assert updates == []
+
+
+def test_malformed_account_is_unavailable(tmp_path):
+    async def scenario():
+        store = OrderStore(str(tmp_path / "orders.db"))
+        apis = {
+            "broken": FakeAPI("broken", balances=[{"symbol": "ETH", "balance": "0"}], fills=[_fill(4, size="n/a")]),
+            "bad_item": FakeAPI("bad_item", open_orders=[{"symbol": SPOT}]),
+            "key": FakeAPI("key", balances=[{"symbol": "ETH", "balance": "0"}]),
+        }
+        await store.save_order("5", "key", SPOT, "buy", 1.0, 2000.0)
+        try:
+            report = await Reconciler(store, apis.get, [SPOT]).run(list(apis))
+            return report, await store.get_open_orders("key")
+        finally:
+            await store.close()
+
+    report, open_rows = asyncio.run(scenario())
+    kinds = {item["account"]: item["kind"] for item in report}
+    assert kinds == {"broken": "unavailable", "bad_item": "unavailable", "key": "entry_not_found"}
+    # остальные аккаунты сверены как обычно
+    assert open_rows == []
@@ -0,0 +1,123 @@
+import asyncio
+from src.MarketDataCache import MarketDataCache
+from src.OrderEngine import OrderEngine, OrderState
+from src.StreamFeed import StreamFeed
+
+
+async def _wait_for(condition, timeout=5):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.02)
+
+
+def test_tickers_resume_after_reconnect(mock_exchange, symbol):
+    async def scenario():
+        exchange, api = await mock_exchange(fill_rate=0)
+        cache = MarketDataCache(api, ttl=1)
+        feed = StreamFeed(api, ws_url=exchange.ws_url, market_data=cache, max_reconnect_delay=1)
+        tickers = feed.subscribe_tickers([symbol])
+        feed.start()
+        try:
+            await asyncio.wait_for(feed.connected.wait(), 5)
+            assert (await asyncio.wait_for(tickers.get(), 5))["symbol"] == symbol
+
+            await exchange.drop_streams()
+            await _wait_for(lambda: not feed.connected.is_set())
+            # после переподключения подписки восстанавливаются без участия подписчиков
+            await asyncio.wait_for(feed.connected.wait(), 5)
+            while not tickers.empty():
+                tickers.get_nowait()
+            ticker = await asyncio.wait_for(tickers.get(), 5)
+            return exchange.ws_connections, ticker, cache.get_cached_ticker(symbol)
+        finally:
+            await feed.close()
+            await api.close()
+            await exchange.stop()
+
+    connections, ticker, cached = asyncio.run(scenario())
+    assert connections == 2
+    assert ticker["symbol"] == symbol
+    assert cached is not None
+
+
+def test_repeated_ticker_subscription_is_sent_once(mock_exchange, symbol):
+    async def scenario():
+        exchange, api = await mock_exchange(fill_rate=0)
+        feed = StreamFeed(api, ws_url=exchange.ws_url)
+        first = feed.subscribe_tickers([symbol])
+        feed.start()
+        try:
+            await asyncio.wait_for(feed.connected.wait(), 5)
+            await asyncio.wait_for(first.get(), 5)
+            # боты, допущенные позже, подписываются на уже открытую подписку
+            later = [feed.subscribe_tickers([symbol]) for _ in range(5)]
+            cached = [queue.get_nowait()["symbol"] for queue in later]
+            await asyncio.sleep(0.2)
+            return cached, exchange.ws_subscribes
+        finally:
+            await feed.close()
+            await api.close()
+            await exchange.stop()
+
+    cached, subscribes = asyncio.run(scenario())
+    assert cached == [symbol] * 5
+    assert subscribes == 1
+
+
+def test_order_fill_arrives_over_stream(mock_exchange, symbol):
+    async def scenario():
+        exchange, api = await mock_exchange(fill_rate=0)
+        # со стримом опрос раз в limit_hold_time: за время теста он сработает только при старте
+        engine = OrderEngine(limit_hold_time=60, poll_interval=0.05, tick=0.02)
+        feed = StreamFeed(api, ws_url=exchange.ws_url, authenticated=True)
+        engine.attach_feed(api, feed)
+        feed.start()
+        try:
+            await asyncio.wait_for(feed.connected.wait(), 5)
+            response = await api.create_order(1990.0, 0.01, "buy", symbol, "limitGtc")
+            order = engine.track(api, response["orderId"], symbol, "buy", 0.01, 1990.0)
+            await asyncio.sleep(0.2)
+            polls = exchange.requests["/orders"]
+            exchange._fill("key", exchange.orders["key"][response["orderId"]])
+            order = await asyncio.wait_for(engine.wait(order), 5)
+            return order, polls, exchange.requests["/orders"], exchange.requests["/orders/{id}"]
+        finally:
+            await engine.close()
+            await feed.close()
+            await api.close()
+            await exchange.stop()
+
+    order, polls_before, polls_after, lookups = asyncio.run(scenario())
+    assert order.state == OrderState.FILLED
+    assert order.avg_price == 1990.0
+    assert polls_after == polls_before and lookups == 0
+
+
+def test_engine_polls_while_stream_is_down(mock_exchange, symbol):
+    async def scenario():
+        exchange, api = await mock_exchange(fill_rate=0)
+        exchange.ws_enabled = False
+        engine = OrderEngine(limit_hold_time=60, poll_interval=0.05, tick=0.02)
+        feed = StreamFeed(api, ws_url=exchange.ws_url, authenticated=True)
+        engine.attach_feed(api, feed)
+        feed.start()
+        try:
+            response = await api.create_order(1990.0, 0.01, "buy", symbol, "limitGtc")
+            order = engine.track(api, response["orderId"], symbol, "buy", 0.01, 1990.0)
+            await asyncio.sleep(0.2)
+            exchange._fill("key", exchange.orders["key"][response["orderId"]])
+            order = await asyncio.wait_for(engine.wait(order), 5)
+            return order, feed.connected.is_set(), exchange.requests["/orders"]
+        finally:
+            await engine.close()
+            await feed.close()
+            await api.close()
+            await exchange.stop()
+
+    order, connected, polls = asyncio.run(scenario())
+    assert not connected
+    assert order.state == OrderState.FILLED
+    # без стрима ордер сверяется опросом раз в poll_interval
+    assert polls >= 3